@@ -0,0 +1,144 @@
+from bisect import bisect_right
+from cpdgen.pattern import AbstractPattern, Address, Size, Codeplug, SparseRepeat, BlockRepeat, FixedRepeat, \
+    ElementPattern, UnionPattern
+from cpdgen.layout import repeat_limit, repeat_stride, pattern_size, pattern_label, child_limit, top_level_limits
+
+
+class AddressMatch:
+    """ A field found in the address index. The path lists all patterns from the top-level element down to
+        the field, the indices hold the repetition index of each repeat along the path. """
+
+    __slots__ = ("_path", "_indices", "_start")
+
+    def __init__(self, path: tuple, indices: tuple, start: int):
+        self._path = path
+        self._indices = indices
+        self._start = start
+
+    def get_pattern(self) -> AbstractPattern:
+        return self._path[-1]
+
+    def get_path(self) -> tuple:
+        return self._path
+
+    def get_indices(self) -> tuple:
+        return self._indices
+
+    def get_address(self) -> Address:
+        return Address.from_bits(self._start)
+
+    def get_size(self) -> Size:
+        return Size.from_bits(pattern_size(self._path[-1]))
+
+    def format_path(self) -> str:
+        parts, indices = [], iter(self._indices)
+        for pattern in self._path:
+            if isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+                parts.append("{}[{}]".format(pattern_label(pattern), next(indices)))
+            else:
+                parts.append(pattern_label(pattern))
+        return ".".join(parts)
+
+
+class IndexNode:
+    """ Compiled layout of a pattern. Containers keep the offsets of their children sorted, together with
+        the running maximum of their ends, such that the children overlapping an address or range are
+        found by bisection. Repeats keep their stride and count, repetitions are never materialized. The count
+        of unbounded repeats is derived from the bits available to them, i.e., up to the next top-level
+        element. The last unbounded repeat has no count and extends infinitely. """
+
+    __slots__ = ("pattern", "offset", "size", "stride", "count", "repeat", "children", "starts", "ends")
+
+    def __init__(self, pattern, offset: int):
+        self.pattern = pattern
+        self.offset = offset
+        self.size = 0
+        self.stride = 0
+        self.count = 0
+        self.repeat = False
+        self.children = []
+        self.starts = []
+        self.ends = []
+
+    @staticmethod
+    def compile(pattern, offset: int = 0, limit: int|None = None):
+        node = IndexNode(pattern, offset)
+        if isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+            node.repeat = True
+            node.stride = repeat_stride(pattern)
+            node.count = repeat_limit(pattern, limit)
+            node.children = [IndexNode.compile(pattern.get_child(), 0, child_limit(pattern))]
+            if node.count is None:
+                node.size = float("inf")
+            else:
+                node.size = max(node.count - 1, 0)*node.stride + node.children[0].size
+        elif isinstance(pattern, (Codeplug, ElementPattern, UnionPattern)):
+            if not isinstance(pattern, Codeplug):
+                node.size = pattern_size(pattern)
+                limits = [None]*len(pattern)
+            else:
+                limits = top_level_limits(pattern)
+            node.children = sorted((IndexNode.compile(child, child.get_address().bits(), limit)
+                                    for child, limit in zip(pattern, limits)), key=lambda n: n.offset)
+            node.starts = [child.offset for child in node.children]
+            end = None
+            for child in node.children:
+                end = child.offset + child.size if end is None else max(end, child.offset + child.size)
+                node.ends.append(end)
+        else:
+            node.size = pattern_size(pattern)
+        return node
+
+    def is_leaf(self) -> bool:
+        return 0 == len(self.children)
+
+    def find(self, start: int, end: int, base: int, path: tuple, indices: tuple):
+        """ Yields all leaves overlapping the range [start, end), relative to this node. """
+        if not self.children:
+            yield AddressMatch(path, indices, base)
+            return
+        if self.repeat:
+            child = self.children[0]
+            count = self.count if self.count is not None else float("inf")
+            first = max(0, (start - child.size)//self.stride + 1) if self.stride else 0
+            last = int(min(count - 1, (end - 1)//self.stride)) if self.stride else 0
+            for i in range(first, last+1):
+                offset = i*self.stride
+                if offset < end and offset + child.size > start:
+                    yield from child.find(start - offset, end - offset, base + offset,
+                                          path + (child.pattern,), indices + (i,))
+            return
+        k = bisect_right(self.ends, start)
+        while k < len(self.children) and self.starts[k] < end:
+            child = self.children[k]
+            if child.offset + child.size > start:
+                yield from child.find(start - child.offset, end - child.offset, base + child.offset,
+                                      path + (child.pattern,), indices)
+            k += 1
+
+
+class AddressIndex:
+    """ Index over the absolute addresses of all fields of a codeplug, supporting point and range queries in
+        logarithmic time w.r.t. the number of elements. """
+
+    def __init__(self, codeplug: Codeplug):
+        self._codeplug = codeplug
+        self._root = IndexNode.compile(codeplug)
+
+    def get_codeplug(self) -> Codeplug:
+        return self._codeplug
+
+    def lookup(self, address: Address) -> list[AddressMatch]:
+        """ Returns all fields covering the given address. Usually, this is a single field, but members of
+            unions or overlapping elements yield several matches. """
+        return self.lookup_bits(address.bits())
+
+    def lookup_bits(self, bits: int) -> list[AddressMatch]:
+        return list(self._root.find(bits, bits+1, 0, (), ()))
+
+    def query(self, address: Address, size: Size):
+        """ Yields all fields overlapping the given address range, in address order. """
+        return self.query_bits(address.bits(), address.bits() + size.bits())
+
+    def query_bits(self, start: int, end: int):
+        return self._root.find(start, end, 0, (), ())
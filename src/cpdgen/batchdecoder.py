@@ -0,0 +1,238 @@
+from cpdgen.pattern import AbstractPattern, Address, FixedRepeat, ElementPattern, UnionPattern, IntegerPattern, \
+    EnumPattern, StringPattern, UnusedDataPattern, UnknownDataPattern, address_bits
+from cpdgen.layout import pattern_size, unique_keys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Column:
+    """ A single field of a fixed layout, at a bit offset relative to the record. """
+
+    DIRECT = 0
+    BITS = 1
+    BCD = 2
+    STRING = 3
+    UNICODE = 4
+    ENUM = 5
+
+    __slots__ = ("name", "kind", "offset", "width", "pattern")
+
+    def __init__(self, name: str, kind: int, offset: int, width: int, pattern: AbstractPattern):
+        self.name = name
+        self.kind = kind
+        self.offset = offset
+        self.width = width
+        self.pattern = pattern
+
+    def is_little(self) -> bool:
+        if isinstance(self.pattern, IntegerPattern):
+            return IntegerPattern.LITTLE == self.pattern.get_endian()
+        return True
+
+    def is_aligned(self) -> bool:
+        return 0 == self.offset % 8 and 0 == self.width % 8
+
+    def raw_format(self) -> str:
+        """ NumPy format of the bytes covering this column. """
+        n = self.width >> 3
+        if Column.DIRECT == self.kind:
+            signed = IntegerPattern.SIGNED == self.pattern.get_format()
+            return "{}{}{}".format("<" if self.is_little() else ">", "i" if signed else "u", n)
+        if Column.STRING == self.kind or Column.UNICODE == self.kind:
+            return "V{}".format(n)
+        return "({},)u1".format(((self.offset + self.width + 7) >> 3) - (self.offset >> 3))
+
+    def result_format(self) -> str:
+        if Column.DIRECT == self.kind:
+            return self.raw_format().replace("<", "=").replace(">", "=")
+        if Column.STRING == self.kind or Column.UNICODE == self.kind:
+            # NumPy strings drop trailing NULs, which are part of the value if the fill is not NUL.
+            if "\0" != string_fill(self.pattern):
+                return "O"
+            return "U{}".format(self.width >> (3 if Column.STRING == self.kind else 4))
+        if Column.BCD == self.kind:
+            return "f8"
+        if Column.ENUM == self.kind:
+            return "O"
+        if isinstance(self.pattern, IntegerPattern) and IntegerPattern.SIGNED == self.pattern.get_format():
+            return "i8"
+        return "u8"
+
+
+def column_kind(pattern: AbstractPattern, offset: int) -> int|None:
+    width = pattern.get_size().bits()
+    if isinstance(pattern, IntegerPattern):
+        if IntegerPattern.BCD == pattern.get_format():
+            return Column.BCD
+        if 0 == offset % 8 and width in (8, 16, 32, 64):
+            return Column.DIRECT
+        return Column.BITS
+    if isinstance(pattern, EnumPattern):
+        return Column.ENUM
+    if isinstance(pattern, StringPattern):
+        if offset % 8:
+            raise ValueError("Cannot batch decode unaligned string '{}'.".format(pattern.meta().get_name()))
+        return Column.UNICODE if StringPattern.UNICODE == pattern.get_format() else Column.STRING
+    if isinstance(pattern, (UnusedDataPattern, UnknownDataPattern)):
+        return None
+    raise ValueError("Cannot batch decode pattern of type '{}', layout is not fixed.".format(type(pattern).__name__))
+
+
+def collect_columns(pattern: AbstractPattern, offset: int, prefix: str, columns: list):
+    """ Flattens a fixed layout into columns. Nested fixed repeats are expanded, naming their repetitions
+        by index. """
+    if isinstance(pattern, (ElementPattern, UnionPattern)):
+        for key, child in zip(unique_keys(pattern), pattern):
+            collect_columns(child, offset + address_bits(child), prefix + key + ".", columns)
+    elif isinstance(pattern, FixedRepeat):
+        stride = pattern_size(pattern.get_child())
+        for i in range(pattern.get_n()):
+            collect_columns(pattern.get_child(), offset + i*stride, "{}{}.".format(prefix, i), columns)
+    else:
+        kind, width = column_kind(pattern, offset), pattern.get_size().bits()
+        if kind in (Column.BITS, Column.BCD, Column.ENUM) and ((offset + width + 7) >> 3) - (offset >> 3) > 8:
+            raise ValueError("Cannot batch decode '{}', it spans more than 8 bytes.".format(prefix[:-1]))
+        if kind is not None:
+            columns.append(Column(prefix[:-1], kind, offset, width, pattern))
+
+
+def combine(span, little: bool):
+    """ Combines the bytes of each row into an unsigned 64-bit integer. """
+    value = numpy.zeros(span.shape[:-1], dtype=numpy.uint64)
+    for k in (reversed(range(span.shape[-1])) if little else range(span.shape[-1])):
+        value = (value << numpy.uint64(8)) | span[..., k].astype(numpy.uint64)
+    return value
+
+
+def extract_bits(column: Column, span):
+    """ Extracts the unsigned value of a column from its covering bytes. The bits are read MSB first, multiple
+        bytes of little-endian columns are reordered afterwards, like the decoder does. """
+    if column.is_aligned():
+        return combine(span, column.is_little())
+    end = (column.offset + column.width + 7) >> 3
+    shift = numpy.uint64((end << 3) - column.offset - column.width)
+    value = (combine(span, False) >> shift) & numpy.uint64((1 << column.width) - 1)
+    if column.is_little() and 0 == column.width % 8 and column.width > 8:
+        value = value.byteswap() >> numpy.uint64(64 - column.width)
+    return value
+
+
+def bcd_values(raw, digits: int):
+    """ Converts BCD digits into values. Values with invalid digits are NaN, where the Decoder returns None. """
+    value = numpy.zeros(raw.shape, dtype=numpy.float64)
+    valid = numpy.ones(raw.shape, dtype=bool)
+    for k in reversed(range(digits)):
+        digit = ((raw >> numpy.uint64(4*k)) & numpy.uint64(0xf)).astype(numpy.float64)
+        valid &= digit < 10
+        value = value*10 + digit
+    value[~valid] = numpy.nan
+    return value
+
+
+def string_fill(pattern: StringPattern) -> str:
+    """ The fill character, stripped from the end of strings like the Decoder does. """
+    if StringPattern.UNICODE == pattern.get_format():
+        return chr(pattern.get_fill())
+    return chr(pattern.get_fill() & 0xff)
+
+
+def string_values(pattern: StringPattern, raw):
+    """ Decodes the raw bytes of string fields like the Decoder, i.e., only trailing fill characters are
+        removed. Strings filled with NUL are decoded by NumPy, all others one by one into objects. """
+    fill = string_fill(pattern)
+    if StringPattern.UNICODE == pattern.get_format():
+        encoding, errors = "utf-16-le", "surrogatepass"
+    else:
+        encoding, errors = "latin-1", "strict"
+        if "\0" == fill:
+            return numpy.char.decode(raw.view("S{}".format(raw.dtype.itemsize)), encoding)
+    values = [bytes(v).decode(encoding, errors).rstrip(fill) for v in raw.ravel()]
+    dtype = "U{}".format(raw.dtype.itemsize >> 1) if "\0" == fill else "O"
+    return numpy.array(values, dtype=dtype).reshape(raw.shape)
+
+
+def enum_names(pattern: EnumPattern, raw):
+    """ Maps the values of an enum to the names of their items, like the Decoder. Values without matching
+        item are kept. Each distinct value is looked up once. """
+    names = {item.value: item.get_name() for item in pattern}
+    values, inverse = numpy.unique(raw, return_inverse=True)
+    lookup = numpy.array([names.get(int(value), int(value)) for value in values], dtype=object)
+    return lookup[inverse].reshape(raw.shape)
+
+
+class BatchDecoder:
+    """ Decodes a fixed-layout element or fixed repeat from many images at once using NumPy. The layout is
+        translated into a structured dtype, hence all images are decoded by a single view on their stacked
+        bytes. Bit-fields and BCD integers are extracted by vectorized post-processing. The result is a
+        structured array with one row per image (and one column per repetition of a top-level fixed repeat),
+        with a field per pattern, named by its path. Values match those of the Decoder: enums are the names of
+        their items (object fields), BCD integers are floats, where invalid values are NaN instead of None. Strings
+        padded with another character than NUL are object fields, as NumPy strings drop trailing NULs. Unused
+        and unknown data is skipped. """
+
+    def __init__(self, pattern: ElementPattern|UnionPattern|FixedRepeat):
+        if numpy is None:
+            raise ImportError("Batch decoding requires NumPy, install the 'numpy' extra.")
+        self._pattern = pattern
+        self._shape = ()
+        record = pattern
+        if isinstance(pattern, FixedRepeat):
+            self._shape = (pattern.get_n(),)
+            record = pattern.get_child()
+        self._size = pattern_size(record)
+        if self._size % 8:
+            raise ValueError("Cannot batch decode records of {} bits, size is not a multiple of bytes.".format(
+                self._size))
+        self._columns = []
+        collect_columns(record, 0, "", self._columns)
+        self._raw_dtype = numpy.dtype({
+            "names": ["f{}".format(i) for i in range(len(self._columns))],
+            "formats": [column.raw_format() for column in self._columns],
+            "offsets": [column.offset >> 3 for column in self._columns],
+            "itemsize": self._size >> 3})
+        self._dtype = numpy.dtype([(column.name, column.result_format()) for column in self._columns])
+
+    def get_pattern(self) -> AbstractPattern:
+        return self._pattern
+
+    def get_dtype(self):
+        return self._dtype
+
+    def get_raw_dtype(self):
+        return self._raw_dtype
+
+    def decode(self, images, address: Address = None):
+        """ Decodes the pattern from each of the given images. The address defaults to the address of the
+            pattern. """
+        start = (address if address is not None else self._pattern.get_address()).bits()
+        if start % 8:
+            raise ValueError("Cannot batch decode at unaligned address {}.".format(Address.from_bits(start)))
+        start >>= 3
+        end = start + (pattern_size(self._pattern) >> 3)
+        data = []
+        for i, image in enumerate(images):
+            if len(image) < end:
+                raise ValueError("Image {} is too short, expected at least {} bytes.".format(i, end))
+            data.append(memoryview(image)[start:end])
+        raw = numpy.frombuffer(b"".join(data), dtype=self._raw_dtype).reshape((len(data),) + self._shape)
+        result = numpy.empty(raw.shape, dtype=self._dtype)
+        for i, column in enumerate(self._columns):
+            values = raw["f{}".format(i)]
+            if Column.DIRECT == column.kind:
+                result[column.name] = values
+            elif Column.STRING == column.kind or Column.UNICODE == column.kind:
+                result[column.name] = string_values(column.pattern, values)
+            elif Column.BCD == column.kind:
+                result[column.name] = bcd_values(extract_bits(column, values), column.width >> 2)
+            elif Column.ENUM == column.kind:
+                result[column.name] = enum_names(column.pattern, extract_bits(column, values))
+            elif "i8" == column.result_format():
+                raw_value = extract_bits(column, values).astype(numpy.int64)
+                sign = 1 << (column.width - 1)
+                result[column.name] = (raw_value ^ sign) - sign
+            else:
+                result[column.name] = extract_bits(column, values)
+        return result
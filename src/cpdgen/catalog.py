@@ -1,12 +1,17 @@
+from bisect import insort
 from datetime import date
 from cpdgen.pattern import Codeplug
 
 
 class Firmware:
-    def __init__(self, name: str = None, released: date = None, codeplug: Codeplug = None):
+    """ A firmware revision of a model. The codeplug is either given directly or loaded on demand by
+        calling the given loader the first time it is needed. """
+
+    def __init__(self, name: str = None, released: date = None, codeplug: Codeplug = None, loader=None):
         self._name = name
         self._released = released
         self._codeplug = codeplug
+        self._loader = loader
 
     def __lt__(self, other):
         if self.has_released() is None or other.has_released() is None:
@@ -14,7 +19,7 @@ class Firmware:
         return self.get_name() < other.get_name()
 
     def is_valid(self) -> bool:
-        return bool(self._name) and bool(self._codeplug)
+        return bool(self._name) and bool(self.get_codeplug())
 
     def get_name(self):
         return self._name
@@ -31,11 +36,22 @@ class Firmware:
     def set_released(self, released: date):
         self._released = released
 
+    def is_loaded(self) -> bool:
+        return self._loader is None
+
     def get_codeplug(self):
+        if self._loader is not None:
+            loader, self._loader = self._loader, None
+            self._codeplug = loader()
         return self._codeplug
 
     def set_codeplug(self, codeplug: Codeplug):
         self._codeplug = codeplug
+        self._loader = None
+
+    def set_codeplug_loader(self, loader):
+        self._codeplug = None
+        self._loader = loader
 
 
 class Model:
@@ -48,6 +64,7 @@ class Model:
         self._versions = []
         self._table = {}
         self._latest = None
+        self._deferred = False
 
     def __len__(self):
         return len(self._versions)
@@ -57,10 +74,14 @@ class Model:
 
     def __getitem__(self, item):
         if isinstance(item, int):
+            if self._deferred:
+                self.finalize()
             return self._versions[item]
         return self._table[item]
 
     def __iter__(self):
+        if self._deferred:
+            self.finalize()
         return iter(self._versions)
 
     def is_valid(self) -> bool:
@@ -99,10 +120,21 @@ class Model:
     def add(self, firmware: Firmware):
         if self._latest is None or self._latest < firmware:
             self._latest = firmware
-        self._versions.append(firmware)
-        self._versions.sort()
+        if self._deferred:
+            self._versions.append(firmware)
+        else:
+            insort(self._versions, firmware)
         self._table[firmware.get_name()] = firmware
 
+    def defer_sort(self):
+        """ Subsequently added firmwares are appended and sorted once by finalize(), or on first access. """
+        self._deferred = True
+
+    def finalize(self):
+        if self._deferred:
+            self._versions.sort()
+            self._deferred = False
+
 
 class Catalog:
     def __init__(self):
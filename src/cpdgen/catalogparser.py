@@ -1,14 +1,28 @@
+import hashlib
 import os.path
 import xml.sax.handler
 from xml.sax.handler import ContentHandler
 from cpdgen.catalog import Catalog, Model, Firmware
 from datetime import date
-from xml.sax import parse, SAXParseException, make_parser
-from cpdgen.patternparser import PatternHandler
+from xml.sax import SAXParseException, make_parser
+from cpdgen.patternparser import load_codeplug
+from cpdgen.codeplugcache import CodeplugCache
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from functools import partial
 from logging import info, error
 from urllib.parse import urlsplit
 
 
+def load_digested_codeplug(filepath: str, cache: CodeplugCache = None, parser: str = "expat"):
+    """ Reads the file at the given path once and returns the digest of its content together with the parsed
+        codeplug. Dispatched to worker processes, such that the main process does not need to read the
+        file again for interning. """
+    with open(filepath, "rb") as file:
+        content = file.read()
+    return hashlib.sha256(content).digest(), load_codeplug(filepath, cache, parser, content)
+
+
 class CatalogHandler(ContentHandler):
     PREFIXES = {"https://static.dm3mat.de/schema/anytone-emu-catalog.dtd": "",
                 "https://static.dm3mat.de/schema/anytone-emu-codeplug.dtd": "",
@@ -24,9 +38,20 @@ class CatalogHandler(ContentHandler):
     def prefix(uri):
         return CatalogHandler.PREFIXES.get(uri, "")
 
-    def __init__(self, context: str):
+    def __init__(self, context: str, jobs: int = 1, cache: CodeplugCache = None, lazy: bool = False,
+                 parser: str = "expat"):
         super().__init__()
         self._context = context
+        self._jobs = jobs
+        self._cache = cache
+        self._lazy = lazy
+        self._parser = parser
+        self._pending = []
+        # Parsed codeplugs by content digest, shared between firmwares.
+        self._interned = {}
+        # Recorded event streams of included files by absolute path, and the stack of files being included.
+        self._includes = {}
+        self._including = []
         self._stack = []
         self._buffer = ""
         self._capture = False
@@ -51,22 +76,77 @@ class CatalogHandler(ContentHandler):
 
     def startDocument(self):
         self._stack.clear()
+        self._pending.clear()
+        self._including.clear()
         self._stack.append(Catalog())
         super().startDocument()
 
     def endDocument(self):
         assert 1 == len(self._stack)
+        self.loadPending()
+        for model in self._stack[-1]:
+            model.finalize()
         super().endDocument()
 
-    def startElementNS(self, name, qname: str, attrs):
+    def loadPending(self):
+        """ Parses all codeplugs collected in parallel mode using a pool of worker processes and
+            attaches the valid firmwares to their models in catalog order. Each file is read and hashed
+            once, by its worker, and files with identical content share a single codeplug instance. """
+        if not self._pending:
+            return
+        filepaths = list(dict.fromkeys(os.path.abspath(filepath) for _, _, filepath in self._pending))
+        info("Load {} codeplugs using {} processes ...".format(len(filepaths), self._jobs))
+        digests = {}
+        with ProcessPoolExecutor(max_workers=self._jobs) as pool:
+            results = pool.map(load_digested_codeplug, filepaths, repeat(self._cache), repeat(self._parser))
+            for filepath, (digest, codeplug) in zip(filepaths, results):
+                digests[filepath] = digest
+                self._interned.setdefault(digest, codeplug)
+        for model, firmware, filepath in self._pending:
+            firmware.set_codeplug(self._interned[digests[os.path.abspath(filepath)]])
+            if firmware.is_valid():
+                model.add(firmware)
+        self._pending.clear()
+
+    def loadCodeplug(self, filepath: str):
+        """ Loads the codeplug at the given path. Firmwares referencing files with identical content
+            share a single codeplug instance. """
+        with open(filepath, "rb") as file:
+            content = file.read()
+        digest = hashlib.sha256(content).digest()
+        if digest not in self._interned:
+            info("Load codeplug from '{}' ...".format(filepath))
+            self._interned[digest] = load_codeplug(filepath, self._cache, self._parser, content)
+        return self._interned[digest]
+
+    # Dispatch tables, mapping (uri, localname) pairs to the start and end methods. These are populated
+    # once per class, as tags are encountered.
+    _startMethods = {}
+    _endMethods = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._startMethods, cls._endMethods = {}, {}
+
+    @classmethod
+    def resolve(cls, name):
         uri, localname = name
-        meth = getattr(self, f"start{CatalogHandler.prefix(uri)}{CatalogHandler.normalizeName(localname)}Element")
-        meth(attrs)
+        normalized = f"{cls.prefix(uri)}{cls.normalizeName(localname)}"
+        start = cls._startMethods[name] = getattr(cls, f"start{normalized}Element")
+        end = cls._endMethods[name] = getattr(cls, f"end{normalized}Element")
+        return start, end
+
+    def startElementNS(self, name, qname: str, attrs):
+        meth = self._startMethods.get(name)
+        if meth is None:
+            meth, _ = self.resolve(name)
+        meth(self, attrs)
 
     def endElementNS(self, name, qname:str):
-        uri, localname = name
-        meth = getattr(self, f"end{CatalogHandler.prefix(uri)}{CatalogHandler.normalizeName(localname)}Element")
-        meth()
+        meth = self._endMethods.get(name)
+        if meth is None:
+            _, meth = self.resolve(name)
+        meth(self)
 
     def characters(self, content):
         if self._capture:
@@ -84,28 +164,41 @@ class CatalogHandler(ContentHandler):
             error(f"No href given for include statement.")
             return
         fileuri = os.path.join(self._context, attrs[(None, "href")])
-        filepath = urlsplit(fileuri, "file").path;
+        filepath = os.path.abspath(urlsplit(fileuri, "file").path)
+        if filepath in self._including:
+            error("Include cycle: {}.".format(" -> ".join(self._including + [filepath])))
+            return
         filedir = os.path.dirname(filepath)
-        handler = IncludeHandler(self)
         old_context = self._context
         self._context = filedir
+        self._including.append(filepath)
         try:
-            xmlParser = make_parser()
-            xmlParser.setContentHandler(handler)
-            xmlParser.setFeature(xml.sax.handler.feature_namespaces, True)
-            xmlParser.parse(open(filepath, "r"))
+            if filepath in self._includes:
+                # Replay recorded events, nested includes are resolved by this handler again.
+                IncludeHandler.replay(self._includes[filepath])
+            else:
+                events = []
+                xmlParser = make_parser()
+                xmlParser.setContentHandler(IncludeHandler(self, events))
+                xmlParser.setFeature(xml.sax.handler.feature_namespaces, True)
+                with open(filepath, "rb") as file:
+                    xmlParser.parse(file)
+                self._includes[filepath] = events
         except SAXParseException as e:
             error(e)
         except IOError as e:
             error(e)
         finally:
+            self._including.pop()
             self._context = old_context
 
     def endXIncludeIncludeElement(self):
         pass
 
     def startModelElement(self, attrs):
-        self.push(Model(id=attrs[(None, "id")]))
+        model = Model(id=attrs[(None, "id")])
+        model.defer_sort()
+        self.push(model)
 
     def endModelElement(self):
         obj = self.pop()
@@ -114,19 +207,24 @@ class CatalogHandler(ContentHandler):
     def startFirmwareElement(self, attrs):
         released = date.fromisoformat(attrs[(None, "released")]) if (None, "released") in attrs else None
         filepath = os.path.join(self._context, attrs[(None, "codeplug")])
-        info("Load codeplug from '{}' ...".format(filepath))
-        handler = PatternHandler()
-        codeplug = None
-        try:
-            parse(open(filepath, "r"), handler)
-            codeplug = handler.pop()
-        except SAXParseException:
-            pass
-        self.push(Firmware(attrs[(None, "name")], released, codeplug))
+        firmware = Firmware(attrs[(None, "name")], released)
+        if self._lazy:
+            # Codeplug gets parsed on first access.
+            firmware.set_codeplug_loader(partial(self.loadCodeplug, filepath))
+        elif self._jobs > 1:
+            # Defer loading, codeplugs are parsed in parallel at the end of the catalog.
+            self._pending.append((self._stack[-1], firmware, filepath))
+        else:
+            firmware.set_codeplug(self.loadCodeplug(filepath))
+        self.push(firmware)
 
     def endFirmwareElement(self):
         obj = self.pop()
-        if obj.is_valid():
+        if self._lazy:
+            self._stack[-1].add(obj)
+        elif self._jobs > 1:
+            return
+        elif obj.is_valid():
             self._stack[-1].add(obj)
 
     def startNameElement(self, attrs):
@@ -251,16 +349,44 @@ class CatalogHandler(ContentHandler):
 
 class IncludeHandler(ContentHandler):
     """ Trivial proxy for handling XInclude. This just forwards start/end
-        element calls to original handler. """
+        element calls to original handler. If a list of events is given,
+        the forwarded calls are recorded for replay. """
 
-    def __init__(self, parent : ContentHandler):
+    def __init__(self, parent : ContentHandler, events: list = None):
+        super().__init__()
         self._parent = parent
+        self._events = events
 
     def startElementNS(self, name, qname, attrs):
+        if self._events is not None:
+            self._events.append((self._parent.startElementNS, (name, qname, attrs)))
         self._parent.startElementNS(name, qname, attrs)
 
     def endElementNS(self, name, qname):
+        if self._events is not None:
+            self._events.append((self._parent.endElementNS, (name, qname)))
         self._parent.endElementNS(name, qname)
 
     def characters(self, content):
-        self._parent.characters(content)
\ No newline at end of file
+        if self._events is not None:
+            self._events.append((self._parent.characters, (content,)))
+        self._parent.characters(content)
+
+    @staticmethod
+    def replay(events: list):
+        for meth, args in events:
+            meth(*args)
+
+
+def load_catalog(filepath: str, jobs: int = 1, cache: CodeplugCache = None, lazy: bool = False,
+                 parser: str = "expat") -> Catalog:
+    """ Parses the catalog at the given path, together with the codeplugs of its firmwares. Codeplug paths are
+        relative to the catalog. """
+    filepath = os.path.abspath(filepath)
+    handler = CatalogHandler(os.path.dirname(filepath), jobs=jobs, cache=cache, lazy=lazy, parser=parser)
+    xml_parser = make_parser()
+    xml_parser.setContentHandler(handler)
+    xml_parser.setFeature(xml.sax.handler.feature_namespaces, True)
+    with open(filepath, "rb") as file:
+        xml_parser.parse(file)
+    return handler.pop()
@@ -1,38 +1,167 @@
+import mmap
 import os.path
 import sys
-import xml.sax.handler
 
-from cpdgen.catalogparser import CatalogHandler
-from xml.sax import make_parser
+from cpdgen.catalogparser import load_catalog
+from cpdgen.codeplugcache import CodeplugCache
+from cpdgen.patternparser import PARSERS
 from cpdgen.documentgenerator import DocumentGenerator
 from argparse import ArgumentParser
 from cpdgen.htmlgenerator import HTMLGenerator
 from cpdgen.typstgenerator import TypstGenerator
 from cpdgen.differencegenerator import DifferenceGenerator
+from cpdgen.historygenerator import HistoryGenerator
 from cpdgen.indexer import Indexer
+from cpdgen.layoutcheck import check_layout
+from cpdgen.exporter import record_tables, export_records, write_jsonl, write_csv
+from cpdgen.imagediff import ImageDiff
+from cpdgen.hexdump import HexDump
+from cpdgen.imageview import map_image
+from cpdgen.validator import image_files, validate_files
+from cpdgen.layout import pattern_label
 from logging import info
 
 
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "codeplug-doc-gen")
+
+
 def generate_documentation(catalog, multi_document=False):
     docgen = DocumentGenerator(single_document=not multi_document)
     docgen.processCatalog(catalog)
     return docgen.documents()
 
 
+def find_firmware(catalog, codeplug):
+    """ Resolves a codeplug given as MODEL_ID/VERSION_NAME to the firmware of the catalog. """
+    model_id, version = map(lambda s: s.strip(), codeplug.split("/"))
+    if model_id not in catalog or version not in catalog[model_id]:
+        raise KeyError(f"Cannot find device {model_id} (version {version}).")
+    firmware = catalog[model_id][version]
+    if not firmware.is_valid():
+        raise ValueError(f"Cannot load codeplug of device {model_id} (version {version}).")
+    return firmware
+
+
 def generate_difference(catalog, orig, dest, multi_document=False):
-    orig_id, orig_version = map(lambda s: s.strip(), orig.split("/"))
-    dest_id, dest_version = map(lambda s: s.strip(), dest.split("/"))
-    info(f"Compare code-plug {orig_id} (version {orig_version}) vs. {orig_id} (version {orig_version})")
-    if orig_id not in catalog or orig_version not in catalog[orig_id]:
-        raise KeyError(f"Cannot find device {orig_id} (version {orig_version}).")
-    if dest_id not in catalog or dest_version not in catalog[dest_id]:
-        raise KeyError(f"Cannot find device {dest_id} (version {orig_version}).")
+    info(f"Compare code-plug {orig} vs. {dest}")
+    orig_firmware, dest_firmware = find_firmware(catalog, orig), find_firmware(catalog, dest)
     diff_generator = DifferenceGenerator()
-    diff_generator.process(catalog[orig_id][orig_version].get_codeplug(),
-                           catalog[dest_id][dest_version].get_codeplug())
+    diff_generator.process(orig_firmware.get_codeplug(), dest_firmware.get_codeplug())
     return diff_generator.documents()
 
 
+def generate_history(catalog, model_id, table=None):
+    info(f"Trace history of {model_id}")
+    if model_id not in catalog:
+        raise KeyError(f"Cannot find device {model_id}.")
+    history_generator = HistoryGenerator()
+    history_generator.process(catalog[model_id])
+    if "-" == table:
+        history_generator.write_table(sys.stdout)
+    elif table is not None:
+        with open(table, "w", newline="") as file:
+            history_generator.write_table(file)
+    return history_generator.documents()
+
+
+def export_images(catalog, codeplug, images, record=None, csv=False, short_names=False, all_records=False,
+                  file=sys.stdout):
+    """ Streams the decoded records of the given images as JSON Lines or CSV. For CSV, a single record table
+        must be selected. """
+    tables = record_tables(find_firmware(catalog, codeplug).get_codeplug(), short_names)
+    if record is not None:
+        tables = [table for table in tables if record in (table.get_path(), table.get_path().split(".")[0])]
+        if not tables:
+            raise KeyError(f"Cannot find record {record} in codeplug {codeplug}.")
+    records = export_records(tables, images, not all_records)
+    if not csv:
+        write_jsonl(records, file)
+    elif 1 == len(tables):
+        write_csv(records, tables[0], file)
+    else:
+        raise ValueError("Select a record for CSV export, one of: {}".format(
+            ", ".join(table.get_path() for table in tables)))
+
+
+def validate_images(catalog, codeplug, paths, jobs=1, all_records=False, file=sys.stdout) -> bool:
+    """ Validates the given images, or all images within the given directories, against the constraints of the
+        codeplug. Prints all violations. Returns False if any image violates a constraint. """
+    filenames = image_files(paths)
+    invalid = 0
+    for filename, violations in validate_files(find_firmware(catalog, codeplug).get_codeplug(), filenames,
+                                               jobs, not all_records):
+        if not violations:
+            continue
+        invalid += 1
+        print(f"{filename}: {len(violations)} violations", file=file)
+        for violation in violations:
+            print(f"  {violation}", file=file)
+    print(f"{len(filenames) - invalid} of {len(filenames)} images valid", file=file)
+    return 0 == invalid
+
+
+def diff_images(catalog, codeplug, orig, dest, file=sys.stdout) -> int:
+    """ Prints the fields differing between the two images. Returns the number of changes. """
+    image_diff = ImageDiff(find_firmware(catalog, codeplug).get_codeplug())
+    images = [map_image(orig), map_image(dest)]
+    bufs = [memoryview(image) for image in images]
+    changes = 0
+    try:
+        for change in image_diff.compare(*bufs):
+            print(change, file=file)
+            changes += 1
+    finally:
+        for buf, image in zip(bufs, images):
+            buf.release()
+            if isinstance(image, mmap.mmap):
+                image.close()
+    return changes
+
+
+def dump_image(catalog, codeplug, image, as_html=False, file=sys.stdout):
+    """ Writes an annotated hex dump of the image, as plain text or HTML. """
+    dump = HexDump(find_firmware(catalog, codeplug).get_codeplug())
+    mapped = map_image(image)
+    buf = memoryview(mapped)
+    try:
+        if as_html:
+            dump.write_html(buf, file, title=f"{codeplug}: {os.path.basename(image)}")
+        else:
+            dump.write_text(buf, file)
+    finally:
+        buf.release()
+        if isinstance(mapped, mmap.mmap):
+            mapped.close()
+
+
+def check_layouts(catalog, codeplugs=None) -> bool:
+    """ Checks the layouts of the given codeplugs or of all codeplugs in the catalog. Prints all issues and
+        the documentation coverage. Returns False if any layout has overlaps. """
+    if codeplugs:
+        firmwares = [(codeplug, find_firmware(catalog, codeplug)) for codeplug in codeplugs]
+    else:
+        firmwares = [(f"{model.get_id()}/{firmware.get_name()}", firmware)
+                     for model in catalog for firmware in model if firmware.is_valid()]
+    okay, checked = True, {}
+    for name, firmware in firmwares:
+        codeplug = firmware.get_codeplug()
+        if id(codeplug) in checked:
+            print(f"{name}: identical to {checked[id(codeplug)]}")
+            continue
+        checked[id(codeplug)] = name
+        report = check_layout(codeplug)
+        okay &= not report.has_overlaps()
+        print(f"{name}: {len(report.overlaps())} overlaps, {len(report.gaps())} gaps")
+        for issue in report:
+            print(f"  {issue}")
+        for pattern, documented, total in report.coverage():
+            if total:
+                print(f"  {pattern.get_address()} {pattern_label(pattern)}: {100*documented/total:.1f}% documented")
+    return okay
+
+
 def main_cli():
     parser = ArgumentParser(
         prog="codeplug-doc-gen",
@@ -42,28 +171,69 @@ def main_cli():
     parser.add_argument("-f", "--format", default="html", choices=["html", "typst"])
     parser.add_argument("-M", "--multi-document", action="store_true")
     parser.add_argument("-o", "--output", default=".")
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--cache-dir", default=default_cache_dir())
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--parser", default="expat", choices=PARSERS)
     parser.add_argument("catalog")
     generate_parser = subparsers.add_parser("generate")
     diff_parser = subparsers.add_parser("diff")
     diff_parser.add_argument("orig")
     diff_parser.add_argument("dest")
+    check_parser = subparsers.add_parser("check")
+    check_parser.add_argument("codeplugs", nargs="*")
+    history_parser = subparsers.add_parser("history")
+    history_parser.add_argument("--table")
+    history_parser.add_argument("model")
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("--csv", action="store_true")
+    export_parser.add_argument("--record")
+    export_parser.add_argument("--short-names", action="store_true")
+    export_parser.add_argument("--all", action="store_true")
+    export_parser.add_argument("codeplug")
+    export_parser.add_argument("images", nargs="+")
+    bindiff_parser = subparsers.add_parser("bindiff")
+    bindiff_parser.add_argument("codeplug")
+    bindiff_parser.add_argument("orig")
+    bindiff_parser.add_argument("dest")
+    dump_parser = subparsers.add_parser("dump")
+    dump_parser.add_argument("--html", action="store_true")
+    dump_parser.add_argument("codeplug")
+    dump_parser.add_argument("image")
+    validate_parser = subparsers.add_parser("validate")
+    validate_parser.add_argument("--all", action="store_true")
+    validate_parser.add_argument("codeplug")
+    validate_parser.add_argument("images", nargs="+")
     args = parser.parse_args()
 
     abs_path = os.path.abspath(args.catalog)
     info("Read catalog from {} ...".format(abs_path))
 
-    base_path = os.path.dirname(abs_path)
-    catalog_handler = CatalogHandler(base_path)
-    xmlParser = make_parser()
-    xmlParser.setContentHandler(catalog_handler)
-    xmlParser.setFeature(xml.sax.handler.feature_namespaces, True)
-    xmlParser.parse(open(abs_path, "r"))
-    cat = catalog_handler.pop()
+    cache = None if args.no_cache else CodeplugCache(args.cache_dir)
+    # Only load the codeplugs needed on demand, if the command selects some.
+    lazy = (args.command in ("diff", "history", "export", "validate", "bindiff", "dump")) or ("check" == args.command and bool(args.codeplugs))
+    cat = load_catalog(abs_path, jobs=args.jobs, cache=cache, lazy=lazy, parser=args.parser)
+
+    if "check" == args.command:
+        sys.exit(0 if check_layouts(cat, args.codeplugs) else 1)
+    if "export" == args.command:
+        export_images(cat, args.codeplug, args.images, args.record, args.csv, args.short_names, args.all)
+        return
+    if "validate" == args.command:
+        sys.exit(0 if validate_images(cat, args.codeplug, args.images, args.jobs, args.all) else 1)
+    if "bindiff" == args.command:
+        diff_images(cat, args.codeplug, args.orig, args.dest)
+        return
+    if "dump" == args.command:
+        dump_image(cat, args.codeplug, args.image, args.html)
+        return
 
     if "generate" == args.command:
         documents = generate_documentation(cat, args.multi_document)
     elif "diff" == args.command:
         documents = generate_difference(cat, args.orig, args.dest)
+    elif "history" == args.command:
+        documents = generate_history(cat, args.model, args.table)
     else:
         raise Exception("Unknown command {}".format(args.command))
 
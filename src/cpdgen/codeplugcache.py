@@ -0,0 +1,120 @@
+import hashlib
+import os
+import pickle
+from logging import warning
+from cpdgen.pattern import Codeplug
+
+
+class CodeplugCache:
+    """ Persistent on-disk cache of parsed codeplugs. Entries are keyed by the path and content of the
+        codeplug definition file as well as the cache version. The latter must be incremented whenever
+        the pattern model changes. If the cache grows beyond the maximum size, the least recently used
+        entries are removed. The size of the cache is scanned once and then tracked as entries are added,
+        hence the directory is only rescanned when the tracked size exceeds the limit. """
+
+    VERSION = 6
+    SUFFIX = ".pickle"
+
+    def __init__(self, path: str, max_size: int = 256*1024*1024):
+        self._path = os.path.abspath(path)
+        self._max_size = max_size
+        # Total size of the cached entries, None until the directory got scanned.
+        self._size = None
+        os.makedirs(self._path, exist_ok=True)
+
+    def get_path(self) -> str:
+        return self._path
+
+    def get_max_size(self) -> int:
+        return self._max_size
+
+    def get_size(self) -> int:
+        """ Total size of the cached entries in bytes. Entries written by other processes are only accounted
+            for on the next scan. """
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self.entries())
+        return self._size
+
+    @staticmethod
+    def key(filepath: str, content: bytes) -> str:
+        digest = hashlib.sha256()
+        digest.update("{}\0{}\0".format(CodeplugCache.VERSION, os.path.abspath(filepath)).encode())
+        digest.update(content)
+        return digest.hexdigest()
+
+    def filename(self, key: str) -> str:
+        return os.path.join(self._path, key + CodeplugCache.SUFFIX)
+
+    def get(self, key: str) -> Codeplug|None:
+        filename = self.filename(key)
+        try:
+            with open(filename, "rb") as file:
+                codeplug = pickle.load(file)
+            # Mark entry as recently used.
+            os.utime(filename)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            warning("Cannot read cached codeplug '{}': {}".format(filename, e))
+            return None
+        if not isinstance(codeplug, Codeplug):
+            return None
+        return codeplug
+
+    def put(self, key: str, codeplug: Codeplug):
+        filename = self.filename(key)
+        # Write to a temporary file first, as several processes may populate the cache concurrently.
+        tmpname = "{}.{}.tmp".format(filename, os.getpid())
+        try:
+            with open(tmpname, "wb") as file:
+                pickle.dump(codeplug, file, protocol=pickle.HIGHEST_PROTOCOL)
+                size = file.tell()
+            total = self.get_size()
+            if os.path.exists(filename):
+                total -= os.path.getsize(filename)
+            os.replace(tmpname, filename)
+        except OSError as e:
+            warning("Cannot write cached codeplug '{}': {}".format(filename, e))
+            return
+        self._size = total + size
+        if self._size > self._max_size:
+            self.evict()
+
+    def entries(self) -> list:
+        """ Lists the cached entries as (mtime, size, path). """
+        entries = []
+        with os.scandir(self._path) as it:
+            for entry in it:
+                if not entry.name.endswith(CodeplugCache.SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """ Rescans the cache and removes the least recently used entries, until it fits the maximum size. """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        self._size = total
+        if total <= self._max_size:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._size = total
+
+    def clear(self):
+        with os.scandir(self._path) as it:
+            for entry in it:
+                if entry.name.endswith(CodeplugCache.SUFFIX):
+                    os.remove(entry.path)
+        self._size = 0
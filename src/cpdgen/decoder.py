@@ -0,0 +1,204 @@
+from struct import Struct
+from cpdgen.pattern import AbstractPattern, Codeplug, SparseRepeat, BlockRepeat, FixedRepeat, ElementPattern, \
+    UnionPattern, IntegerPattern, EnumPattern, StringPattern, UnusedDataPattern, UnknownDataPattern, address_bits
+from cpdgen.layout import repeat_limit, repeat_stride, pattern_size, unique_keys, child_limit, repetitions, \
+    top_level_limits
+
+
+# Struct format characters of unsigned integers by byte width.
+STRUCT_CODES = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+# Enums declare no byte order. Like integers without an endian attribute, they are little endian.
+ENUM_ENDIAN = IntegerPattern.LITTLE
+
+
+def bcd_value(digits: str) -> int|None:
+    """ Value of the given BCD digits, as obtained from hex(). Returns None if any nibble is not a decimal
+        digit, e.g., for erased memory. """
+    if digits.isdigit():
+        return int(digits)
+    return None
+
+
+def bits_reader(width: int):
+    """ Reader extracting an unsigned bit-field of the given width at an arbitrary bit offset. Bits are
+        counted from the most significant bit of the first byte. """
+    mask = (1 << width) - 1
+
+    def read(buf, bits):
+        first, last = bits >> 3, (bits + width + 7) >> 3
+        return (int.from_bytes(buf[first:last], "big") >> ((last << 3) - bits - width)) & mask
+    return read
+
+
+def bytes_reader(width: int, aligned: bool):
+    """ Reader returning the raw bytes of a field. Unaligned fields are shifted into whole bytes first. """
+    n = (width + 7) >> 3
+    if aligned and 0 == width % 8:
+        def read(buf, bits):
+            first = bits >> 3
+            return bytes(buf[first:first+n])
+        return read
+    raw = bits_reader(width)
+    return lambda buf, bits: raw(buf, bits).to_bytes(n, "big")
+
+
+def swap_bytes(width: int):
+    """ Reverses the byte order of an integer of the given width in bits, a multiple of 8. """
+    n = width >> 3
+    return lambda value: int.from_bytes(value.to_bytes(n, "big"), "little")
+
+
+def unsigned_reader(width: int, endian: int, aligned: bool):
+    """ Reader of an unsigned integer. Byte-aligned fields use precompiled struct unpackers, or
+        int.from_bytes() for unusual widths, all others are extracted bit-wise. The byte order does not
+        depend on the alignment: unaligned little-endian fields of whole bytes get their bytes swapped after
+        extraction. Fields of other widths have no byte order and are read most significant bit first. """
+    if not aligned or width % 8:
+        raw = bits_reader(width)
+        if IntegerPattern.LITTLE != endian or width % 8 or width <= 8:
+            return raw
+        swap = swap_bytes(width)
+        return lambda buf, bits: swap(raw(buf, bits))
+    n = width >> 3
+    order = "little" if IntegerPattern.LITTLE == endian else "big"
+    if n in STRUCT_CODES:
+        unpack = Struct(("<" if "little" == order else ">") + STRUCT_CODES[n]).unpack_from
+        return lambda buf, bits: unpack(buf, bits >> 3)[0]
+
+    def read(buf, bits):
+        first = bits >> 3
+        return int.from_bytes(buf[first:first+n], order)
+    return read
+
+
+def integer_reader(pattern: IntegerPattern, aligned: bool):
+    width = pattern.get_size().bits()
+    if IntegerPattern.SIGNED == pattern.get_format():
+        if aligned and 0 == width % 8 and (width >> 3) in STRUCT_CODES:
+            unpack = Struct(("<" if IntegerPattern.LITTLE == pattern.get_endian() else ">")
+                            + STRUCT_CODES[width >> 3].lower()).unpack_from
+            return lambda buf, bits: unpack(buf, bits >> 3)[0]
+        raw, sign = unsigned_reader(width, pattern.get_endian(), aligned), 1 << (width-1)
+
+        def read(buf, bits):
+            value = raw(buf, bits)
+            return (value ^ sign) - sign
+        return read
+    if IntegerPattern.BCD == pattern.get_format():
+        if aligned and 0 == width % 8 and IntegerPattern.LITTLE == pattern.get_endian():
+            raw = bytes_reader(width, aligned)
+            return lambda buf, bits: bcd_value(raw(buf, bits)[::-1].hex())
+        raw, digits = unsigned_reader(width, pattern.get_endian(), False), "0{}x".format(width >> 2)
+        return lambda buf, bits: bcd_value(format(raw(buf, bits), digits))
+    return unsigned_reader(width, pattern.get_endian(), aligned)
+
+
+def enum_reader(pattern: EnumPattern, aligned: bool):
+    """ Reader returning the name of the enum item, or the plain value if there is no matching item. """
+    names = {item.value: item.get_name() for item in pattern}
+    raw = unsigned_reader(pattern.get_size().bits(), ENUM_ENDIAN, aligned)
+
+    def read(buf, bits):
+        value = raw(buf, bits)
+        return names.get(value, value)
+    return read
+
+
+def string_reader(pattern: StringPattern, aligned: bool):
+    """ Reader returning the string with trailing fill characters removed. Bytes outside of ASCII, e.g., of
+        erased memory, are decoded as Latin-1 and lone UTF-16 surrogates are kept, such that the Encoder
+        restores them exactly. """
+    raw = bytes_reader(pattern.get_size().bits(), aligned)
+    if StringPattern.UNICODE == pattern.get_format():
+        fill = chr(pattern.get_fill())
+        return lambda buf, bits: raw(buf, bits).decode("utf-16-le", errors="surrogatepass").rstrip(fill)
+    fill = bytes([pattern.get_fill() & 0xff])
+    return lambda buf, bits: raw(buf, bits).rstrip(fill).decode("latin-1")
+
+
+def data_reader(pattern: UnusedDataPattern|UnknownDataPattern, aligned: bool):
+    """ Reader of unused and unknown data. Returns bytes, or an integer for sub-byte fields. """
+    width = pattern.get_size().bits()
+    if width < 8:
+        return bits_reader(width)
+    return bytes_reader(width, aligned)
+
+
+def record_reader(pattern: ElementPattern|UnionPattern, phase: int|None):
+    ops = tuple((key, address_bits(child), compile_reader(child, shift_phase(phase, address_bits(child))))
+                for key, child in zip(unique_keys(pattern), pattern))
+
+    def read(buf, bits):
+        return {key: reader(buf, bits + offset) for key, offset, reader in ops}
+    return read
+
+
+def repeat_reader(pattern: SparseRepeat|BlockRepeat|FixedRepeat, phase: int|None, limit: int|None):
+    """ Reader returning a list of all repetitions, truncated to those completely contained in the image. """
+    count, stride, size = repeat_limit(pattern, limit), repeat_stride(pattern), pattern_size(pattern.get_child())
+    reader = compile_reader(pattern.get_child(), phase if 0 == stride % 8 else None, child_limit(pattern))
+
+    def read(buf, bits):
+        return [reader(buf, bits + i*stride) for i in range(repetitions(count, stride, size, len(buf)*8 - bits))]
+    return read
+
+
+def minimum_size(pattern: AbstractPattern) -> int:
+    """ Minimum number of bits of the pattern, that must be contained in an image to decode it. Repeats
+        are truncated, hence only the first repetition is needed. """
+    if isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+        return pattern_size(pattern.get_child())
+    return pattern_size(pattern)
+
+
+def shift_phase(phase: int|None, offset: int) -> int|None:
+    """ Bit offset within a byte, if known at compile time. """
+    return None if phase is None else (phase + offset) % 8
+
+
+def compile_reader(pattern: AbstractPattern, phase: int|None = 0, limit: int|None = None):
+    """ Compiles the given pattern into a reader function taking the image and the absolute bit offset of
+        the pattern. The phase is the offset of the pattern within a byte if known at compile time, only
+        then byte-aligned fields can use the fast byte-wise readers. The limit is the number of bits
+        available to the pattern, if known, which bounds unbounded repeats. """
+    aligned = 0 == phase
+    if isinstance(pattern, IntegerPattern):
+        return integer_reader(pattern, aligned)
+    if isinstance(pattern, EnumPattern):
+        return enum_reader(pattern, aligned)
+    if isinstance(pattern, StringPattern):
+        return string_reader(pattern, aligned)
+    if isinstance(pattern, (UnusedDataPattern, UnknownDataPattern)):
+        return data_reader(pattern, aligned)
+    if isinstance(pattern, (ElementPattern, UnionPattern)):
+        return record_reader(pattern, phase)
+    if isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+        return repeat_reader(pattern, phase, limit)
+    raise TypeError("Unhandled pattern type '{}'.".format(type(pattern)))
+
+
+class Decoder:
+    """ Decodes binary codeplug images. The codeplug is compiled once into a tree of reader closures with
+        precomputed offsets and unpackers. Decoding an image then only calls these readers, without
+        inspecting the pattern tree again. Elements decode into dicts keyed by the pattern names, repeats
+        into lists. Top-level elements not contained in the image are skipped. Unbounded repeats extend up
+        to the next top-level element or the end of the image. """
+
+    def __init__(self, codeplug: Codeplug):
+        self._codeplug = codeplug
+        self._plan = tuple((key, address_bits(pattern), minimum_size(pattern),
+                            compile_reader(pattern, address_bits(pattern) % 8, limit))
+                           for key, pattern, limit in zip(unique_keys(codeplug), codeplug,
+                                                          top_level_limits(codeplug)))
+
+    def get_codeplug(self) -> Codeplug:
+        return self._codeplug
+
+    def decode(self, image: bytes|bytearray|memoryview) -> dict:
+        length, result = len(image)*8, {}
+        for key, offset, size, reader in self._plan:
+            if offset + size > length:
+                continue
+            result[key] = reader(image, offset)
+        return result
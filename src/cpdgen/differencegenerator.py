@@ -37,12 +37,24 @@ class DifferenceGenerator:
             sub_title = f"Versions {orig.meta().get_version()} vs. {dest.meta().get_version()}"
         self._documents = [Document(title=title, sub_title=sub_title)]
         self._stack = [self._documents[-1]]
-        self._compare_children(orig, dest)
+        if orig.get_fingerprint() != dest.get_fingerprint():
+            self._compare_children(orig, dest)
 
     def _compare_children(self, orig:ElementPattern|Codeplug, dest:ElementPattern|Codeplug):
+        # Children of elements are placed contiguously, hence an inserted or removed field shifts all following
+        # siblings. Moves are only detected between top-level patterns, which are placed independently.
+        moves = self._match_moves(orig, dest) if isinstance(orig, Codeplug) else {}
+        moved = set(id(right) for right in moves.values())
         difference: bool = False
         i,j = 0,0
         while i<len(orig) or j<len(dest):
+            if j < len(dest) and id(dest[j]) in moved:
+                j += 1
+                continue
+            if i < len(orig) and id(orig[i]) in moves:
+                difference |= self._move(orig[i], moves[id(orig[i])])
+                i += 1
+                continue
             if i == len(orig):
                 difference |= self._insert(dest[j])
                 j += 1
@@ -65,6 +77,36 @@ class DifferenceGenerator:
                 i += 1; j += 1
         return difference
 
+    def _match_moves(self, orig:Codeplug, dest:Codeplug) -> dict:
+        """ Matches removed and inserted top-level patterns, that are actually moved. Children are matched by their
+            fingerprint first, then by type and name. Returns a dict mapping the id of the original to the
+            moved child. """
+        left_addresses = set(left.get_address() for left in orig)
+        right_addresses = set(right.get_address() for right in dest)
+        removed = [left for left in orig if left.get_address() not in right_addresses]
+        inserted = [right for right in dest if right.get_address() not in left_addresses]
+        moves = {}
+        if not removed or not inserted:
+            return moves
+        by_fingerprint, by_name = {}, {}
+        for right in inserted:
+            by_fingerprint.setdefault(right.get_fingerprint(), []).append(right)
+        for left in removed:
+            candidates = by_fingerprint.get(left.get_fingerprint())
+            if candidates:
+                moves[id(left)] = candidates.pop(0)
+        matched = set(id(right) for right in moves.values())
+        for right in inserted:
+            if id(right) not in matched and right.meta().get_name():
+                by_name.setdefault((type(right), right.meta().get_name()), []).append(right)
+        for left in removed:
+            if id(left) in moves or not left.meta().get_name():
+                continue
+            candidates = by_name.get((type(left), left.meta().get_name()))
+            if candidates:
+                moves[id(left)] = candidates.pop(0)
+        return moves
+
     def _delete(self, left:AbstractPattern):
         sec = Section(title=f"Remove {left.meta().get_name()}")
         self.back().add(sec)
@@ -81,6 +123,16 @@ class DifferenceGenerator:
             p.add(f"Insert element at address {right.get_address()}.")
         return True
 
+    def _move(self, left:AbstractPattern, right:AbstractPattern):
+        sec = Section(title=f"Move {left.meta().get_name()}")
+        self.back().add(sec)
+        p = Paragraph(); sec.add(p)
+        p.add(f"Moved from address {left.get_address()} to {right.get_address()}.")
+        self.push(sec)
+        self._compare(left, right)
+        self.pop()
+        return True
+
     def _replace(self, left:AbstractPattern, right:AbstractPattern):
         sec = Section(title=f"Replace {left.meta().get_name()} with {right.meta().get_name()}")
         self.back().add(sec)
@@ -94,7 +146,9 @@ class DifferenceGenerator:
 
     def _compare(self, left:AbstractPattern, right:AbstractPattern):
         assert type(left) == type(right)
-        assert left.get_address() == right.get_address()
+        # Identical subtrees have equal fingerprints, skip them without building any sections.
+        if left.get_fingerprint() == right.get_fingerprint():
+            return False
         difference = False
         if isinstance(left, SparseRepeat):
             difference |= self._compare_sparse_repeat(left, right)
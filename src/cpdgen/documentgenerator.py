@@ -14,6 +14,8 @@ class DocumentGenerator:
         self._root_document.set_id("index")
         self._documents: list[Document] = [self._root_document]
         self._stack: list[DocumentSegment|Document] = [self._root_document]
+        # Rendered codeplugs by identity. Firmwares sharing a codeplug reference the first rendering.
+        self._codeplugs: dict[int, Section|Document] = {}
 
     def push(self, segment: Document|DocumentSegment):
         if isinstance(segment, Document):
@@ -80,16 +82,22 @@ class DocumentGenerator:
 
         for firmware in model:
             if firmware.is_valid():
-                if not self._single_document:
-                    doc = Document()
-                    doc.set_id(f"{model.get_id()}_{firmware.get_name()}")
-                    doc.set_subtitle(f"Version {firmware.get_name()}")
-                    self.push(doc)
-                cp_sec = self.processCodeplug(firmware.get_codeplug())
+                codeplug = firmware.get_codeplug()
+                if id(codeplug) in self._codeplugs:
+                    # Identical codeplug has already been documented, reference it.
+                    cp_sec = self._codeplugs[id(codeplug)]
+                else:
+                    if not self._single_document:
+                        doc = Document()
+                        doc.set_id(f"{model.get_id()}_{firmware.get_name()}")
+                        doc.set_subtitle(f"Version {firmware.get_name()}")
+                        self.push(doc)
+                    cp_sec = self.processCodeplug(codeplug)
+                    self._codeplugs[id(codeplug)] = cp_sec
+                    if not self._single_document:
+                        self.pop()
                 table.add_row(Reference(cp_sec, firmware.get_name()),
                               str(firmware.get_released()) if firmware.has_released() else "Unknown")
-                if not self._single_document:
-                    self.pop()
 
         return self.pop()
 
@@ -0,0 +1,254 @@
+from struct import Struct
+from cpdgen.pattern import AbstractPattern, Codeplug, SparseRepeat, BlockRepeat, FixedRepeat, ElementPattern, \
+    UnionPattern, IntegerPattern, EnumPattern, StringPattern, UnusedDataPattern, UnknownDataPattern, address_bits
+from cpdgen.layout import repeat_limit, repeat_stride, pattern_size, pattern_label, unique_keys, child_limit, \
+    repetitions, top_level_limits
+from cpdgen.decoder import STRUCT_CODES, ENUM_ENDIAN, shift_phase, swap_bytes
+
+
+def bits_writer(width: int):
+    """ Writer of an unsigned bit-field of the given width at an arbitrary bit offset. The surrounding bits
+        are preserved. """
+    mask = (1 << width) - 1
+
+    def write(buf, bits, value):
+        first, last = bits >> 3, (bits + width + 7) >> 3
+        shift = (last << 3) - bits - width
+        span = int.from_bytes(buf[first:last], "big") & ~(mask << shift)
+        buf[first:last] = (span | (value << shift)).to_bytes(last - first, "big")
+    return write
+
+
+def bytes_writer(width: int, aligned: bool):
+    """ Writer of raw bytes. The value must have exactly the size of the field. """
+    n = (width + 7) >> 3
+    if aligned and 0 == width % 8:
+        def write(buf, bits, value):
+            first = bits >> 3
+            buf[first:first+n] = value
+        return write
+    raw = bits_writer(width)
+    return lambda buf, bits, value: raw(buf, bits, int.from_bytes(value, "big"))
+
+
+def unsigned_writer(width: int, endian: int, aligned: bool, signed: bool = False):
+    """ Writer of an integer. Byte-aligned fields use precompiled struct packers, or int.to_bytes() for
+        unusual widths, all others are written bit-wise, with the bytes of little-endian fields swapped
+        like the decoder does. """
+    if not aligned or width % 8:
+        raw, mask = bits_writer(width), (1 << width) - 1
+        if IntegerPattern.LITTLE == endian and 0 == width % 8 and width > 8:
+            swap = swap_bytes(width)
+            return lambda buf, bits, value: raw(buf, bits, swap(value & mask))
+        if not signed:
+            return raw
+        return lambda buf, bits, value: raw(buf, bits, value & mask)
+    n = width >> 3
+    order = "little" if IntegerPattern.LITTLE == endian else "big"
+    if n in STRUCT_CODES:
+        code = STRUCT_CODES[n].lower() if signed else STRUCT_CODES[n]
+        pack = Struct(("<" if "little" == order else ">") + code).pack_into
+        return lambda buf, bits, value: pack(buf, bits >> 3, value)
+
+    def write(buf, bits, value):
+        first = bits >> 3
+        buf[first:first+n] = value.to_bytes(n, order, signed=signed)
+    return write
+
+
+def checked(pattern: AbstractPattern, lower: int, upper: int, write, convert=None):
+    """ Writer, that rejects values outside of [lower, upper] and converts valid ones before scheduling the
+        write. """
+    def check(ops, length, bits, value):
+        if not lower <= value <= upper:
+            raise ValueError("Value {} of '{}' out of range [{}, {}].".format(
+                value, pattern_label(pattern), lower, upper))
+        ops.append((write, bits, value if convert is None else convert(value)))
+    return check
+
+
+def integer_writer(pattern: IntegerPattern, aligned: bool):
+    width, endian, fmt = pattern.get_size().bits(), pattern.get_endian(), pattern.get_format()
+    if IntegerPattern.SIGNED == fmt:
+        lower, upper = -(1 << (width-1)), (1 << (width-1)) - 1
+    elif IntegerPattern.BCD == fmt:
+        lower, upper = 0, 10**(width >> 2) - 1
+    else:
+        lower, upper = 0, (1 << width) - 1
+    if pattern.get_range()[0] is not None:
+        lower = max(lower, pattern.get_range()[0])
+    if pattern.get_range()[1] is not None:
+        upper = min(upper, pattern.get_range()[1])
+    if IntegerPattern.BCD == fmt:
+        raw, digits = unsigned_writer(width, endian, aligned), "0{}d".format(width >> 2)
+        check = checked(pattern, lower, upper, raw, lambda value: int(format(value, digits), 16))
+        # None, like decoded from invalid digits, erases the number
+        erased = (1 << width) - 1
+
+        def write(ops, length, bits, value):
+            if value is None:
+                ops.append((raw, bits, erased))
+            else:
+                check(ops, length, bits, value)
+        return write
+    return checked(pattern, lower, upper, unsigned_writer(width, endian, aligned, IntegerPattern.SIGNED == fmt))
+
+
+def enum_writer(pattern: EnumPattern, aligned: bool):
+    """ Writer accepting the name of an enum item, or any value fitting the field, like decoded for values
+        without matching item. """
+    values = {item.get_name(): item.value for item in pattern}
+    width = pattern.get_size().bits()
+    raw = unsigned_writer(width, ENUM_ENDIAN, aligned)
+
+    def write(ops, length, bits, value):
+        if isinstance(value, int) and 0 <= value < (1 << width):
+            ops.append((raw, bits, value))
+        elif value in values:
+            ops.append((raw, bits, values[value]))
+        else:
+            raise ValueError("Invalid value {!r} of enum '{}'.".format(value, pattern_label(pattern)))
+    return write
+
+
+def string_writer(pattern: StringPattern, aligned: bool):
+    """ Writer of strings, padding them with the fill character. Takes strings like decoded, i.e., 8-bit
+        strings may contain Latin-1 characters. """
+    raw, n = bytes_writer(pattern.get_size().bits(), aligned), pattern.get_size().bits() >> 3
+    if StringPattern.UNICODE == pattern.get_format():
+        encoding, errors, fill = "utf-16-le", "surrogatepass", pattern.get_fill().to_bytes(2, "little")
+    else:
+        encoding, errors, fill = "latin-1", "strict", bytes([pattern.get_fill() & 0xff])
+
+    def write(ops, length, bits, value):
+        data = value.encode(encoding, errors)
+        if len(data) > n:
+            raise ValueError("String {!r} of '{}' exceeds {} bytes.".format(value, pattern_label(pattern), n))
+        ops.append((raw, bits, data + fill*((n - len(data)) // len(fill))))
+    return write
+
+
+def data_writer(pattern: UnusedDataPattern|UnknownDataPattern, aligned: bool):
+    """ Writer of unused and unknown data. Takes bytes, or an integer for sub-byte fields, like decoded. """
+    width = pattern.get_size().bits()
+    if width < 8:
+        return checked(pattern, 0, (1 << width) - 1, bits_writer(width))
+    raw, n = bytes_writer(width, aligned), (width + 7) >> 3
+
+    def write(ops, length, bits, value):
+        if len(value) != n:
+            raise ValueError("Data of '{}' must be {} bytes, got {}.".format(pattern_label(pattern), n, len(value)))
+        ops.append((raw, bits, value))
+    return write
+
+
+def record_writer(pattern: ElementPattern|UnionPattern|Codeplug, phase: int|None):
+    """ Writer taking a dict of the fields to set by key. Fields must be contained in the image, repeats
+        check their repetitions themselves. """
+    limits = top_level_limits(pattern) if isinstance(pattern, Codeplug) else [None]*len(pattern)
+    fields = {}
+    for key, child, limit in zip(unique_keys(pattern), pattern, limits):
+        repeat = isinstance(child, (SparseRepeat, BlockRepeat, FixedRepeat))
+        fields[key] = (address_bits(child), 0 if repeat else pattern_size(child),
+                       compile_writer(child, shift_phase(phase, address_bits(child)), limit))
+
+    def write(ops, length, bits, values: dict):
+        for key, value in values.items():
+            if key not in fields:
+                raise KeyError("Unknown field '{}' in '{}'.".format(key, pattern_label(pattern)))
+            offset, size, writer = fields[key]
+            if bits + offset + size > length:
+                raise IndexError("Field '{}' of '{}' exceeds the image.".format(key, pattern_label(pattern)))
+            writer(ops, length, bits + offset, value)
+    return write
+
+
+def repeat_writer(pattern: SparseRepeat|BlockRepeat|FixedRepeat, phase: int|None, limit: int|None):
+    """ Writer taking a list of all repetitions, or a dict of the repetitions to set by index. Repetitions
+        must be contained in the image. """
+    count, stride, size = repeat_limit(pattern, limit), repeat_stride(pattern), pattern_size(pattern.get_child())
+    writer = compile_writer(pattern.get_child(), phase if 0 == stride % 8 else None, child_limit(pattern))
+
+    def write(ops, length, bits, values: list|dict):
+        n = repetitions(count, stride, size, length - bits)
+        for i, value in (values.items() if isinstance(values, dict) else enumerate(values)):
+            if not 0 <= i < n:
+                raise IndexError("Repetition {} of '{}' out of range.".format(i, pattern_label(pattern)))
+            writer(ops, length, bits + i*stride, value)
+    return write
+
+
+def compile_writer(pattern: AbstractPattern, phase: int|None = 0, limit: int|None = None):
+    """ Compiles the given pattern into a writer function taking a list of write operations, the length of
+        the image in bits, the absolute bit offset of the pattern and the value to write. Values are
+        structured like the results of the Decoder. Writers only validate and convert the values, the
+        resulting raw writes are appended to the list as (write, bits, value) and applied by the Encoder. """
+    aligned = 0 == phase
+    if isinstance(pattern, IntegerPattern):
+        return integer_writer(pattern, aligned)
+    if isinstance(pattern, EnumPattern):
+        return enum_writer(pattern, aligned)
+    if isinstance(pattern, StringPattern):
+        return string_writer(pattern, aligned)
+    if isinstance(pattern, (UnusedDataPattern, UnknownDataPattern)):
+        return data_writer(pattern, aligned)
+    if isinstance(pattern, (ElementPattern, UnionPattern)):
+        return record_writer(pattern, phase)
+    if isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+        return repeat_writer(pattern, phase, limit)
+    raise TypeError("Unhandled pattern type '{}'.".format(type(pattern)))
+
+
+class Encoder:
+    """ Encodes values into binary codeplug images, the inverse of the Decoder. The codeplug is compiled once
+        into writer closures. Values are given as nested dicts and lists like decoded, where only the given
+        fields are written, in place. All values are validated against the ranges and enum items of the
+        fields before the first one is written. """
+
+    def __init__(self, codeplug: Codeplug):
+        self._codeplug = codeplug
+        self._size = max((address_bits(pattern) + pattern_size(pattern) for pattern in codeplug), default=0)
+        self._writer = record_writer(codeplug, 0)
+        self._template = None
+
+    def get_codeplug(self) -> Codeplug:
+        return self._codeplug
+
+    def get_image_size(self) -> int:
+        """ Size of an image covering the entire layout, in bytes. """
+        return (self._size + 7) >> 3
+
+    def create(self) -> bytearray:
+        """ Creates an empty image covering the entire layout, with unused data set to its content. """
+        if self._template is None:
+            template = bytearray(self.get_image_size())
+            for pattern, limit in zip(self._codeplug, top_level_limits(self._codeplug)):
+                fill_unused(pattern, address_bits(pattern), template, limit)
+            self._template = bytes(template)
+        return bytearray(self._template)
+
+    def encode(self, values: dict, image: bytearray = None) -> bytearray:
+        """ Writes the values into the given image, or into a new one. All values are validated and converted
+            first, then written directly into the image. Hence, the image is left untouched on errors. """
+        if image is None:
+            image = self.create()
+        ops = []
+        self._writer(ops, len(image)*8, 0, values)
+        for write, bits, value in ops:
+            write(image, bits, value)
+        return image
+
+
+def fill_unused(pattern: AbstractPattern, bits: int, image: bytearray, limit: int|None = None):
+    """ Writes the content of all byte-aligned unused data patterns. """
+    if isinstance(pattern, UnusedDataPattern):
+        content = bytes(pattern.get_content())
+        if 0 == bits % 8 and len(content) == pattern.get_size().bits() >> 3:
+            image[bits >> 3:(bits >> 3) + len(content)] = content
+    elif isinstance(pattern, (ElementPattern, UnionPattern)):
+        for child in pattern:
+            fill_unused(child, bits + address_bits(child), image)
+    elif isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+        stride, size = repeat_stride(pattern), pattern_size(pattern.get_child())
+        for i in range(repetitions(repeat_limit(pattern, limit), stride, size, len(image)*8 - bits)):
+            fill_unused(pattern.get_child(), bits + i*stride, image, child_limit(pattern))
@@ -0,0 +1,135 @@
+import csv
+import json
+import mmap
+from cpdgen.pattern import AbstractPattern, Codeplug, SparseRepeat, BlockRepeat, FixedRepeat, ElementPattern, \
+    UnionPattern, address_bits
+from cpdgen.layout import repeat_limit, repeat_stride, pattern_size, pattern_key, unique_keys, child_limit, \
+    repetitions, top_level_limits
+from cpdgen.decoder import compile_reader
+from cpdgen.imageview import map_image
+
+
+def flatten(value, prefix: str, row: dict):
+    """ Flattens decoded records into columns, joining keys and repetition indices with dots. """
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flatten(item, f"{prefix}.{key}" if prefix else key, row)
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            flatten(item, f"{prefix}.{i}" if prefix else str(i), row)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        row[prefix] = bytes(value).hex()
+    else:
+        row[prefix] = value
+
+
+def short_names(pattern: AbstractPattern, names: dict):
+    """ Collects the short names of all patterns within a record, keyed by their regular key. """
+    if pattern.has_meta() and pattern.meta().has_short_name():
+        names[pattern_key(pattern)] = pattern.meta().get_short_name()
+    if isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+        short_names(pattern.get_child(), names)
+    elif isinstance(pattern, (ElementPattern, UnionPattern)):
+        for child in pattern:
+            short_names(child, names)
+
+
+class RecordTable:
+    """ All records of a top-level pattern. For repeats, the records are the entries of the innermost repeat,
+        for other patterns, there is a single record per image. Records are decoded one at a time. """
+
+    def __init__(self, pattern: AbstractPattern, key: str, use_short_names: bool = False, limit: int = None):
+        self._base = address_bits(pattern)
+        self._repeats: list[tuple[int|None, int, int]] = []
+        path = [key]
+        while isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+            self._repeats.append((repeat_limit(pattern, limit), repeat_stride(pattern),
+                                  pattern_size(pattern.get_child())))
+            limit = child_limit(pattern)
+            pattern = pattern.get_child()
+            path.append(unique_keys([pattern])[0])
+        self._path = ".".join(path)
+        self._pattern = pattern
+        self._size = pattern_size(pattern)
+        self._phase = self._base % 8 if all(0 == stride % 8 for _, stride, _ in self._repeats) else None
+        self._reader = compile_reader(pattern, self._phase)
+        self._names = {}
+        if use_short_names:
+            short_names(pattern, self._names)
+        # Derive the columns from an empty record.
+        self._columns = list(self.row(bytes((self._size + 15) >> 3), self._phase or 0).keys())
+
+    def get_path(self) -> str:
+        return self._path
+
+    def get_pattern(self) -> AbstractPattern:
+        return self._pattern
+
+    def columns(self) -> list[str]:
+        return self._columns
+
+    def row(self, buf, bits: int) -> dict:
+        row = {}
+        flatten(self._reader(buf, bits), "", row)
+        if self._names:
+            row = {".".join(self._names.get(part, part) for part in column.split(".")): value
+                   for column, value in row.items()}
+        return row
+
+    def records(self, buf, skip_empty: bool = True):
+        """ Yields the indices and the flattened row of each record contained in the image. Records that are
+            entirely 00h or FFh are skipped, unless requested. """
+        length = len(buf)*8
+        nbytes = self._size >> 3
+        empty = (bytes(nbytes), b"\xff"*nbytes)
+        aligned = 0 == self._size % 8 and 0 == self._base % 8 and self._phase is not None
+        for indices, bits in self._locations(0, self._base, (), length):
+            if bits + self._size > length:
+                continue
+            if skip_empty and aligned and buf[bits >> 3:(bits >> 3) + nbytes] in empty:
+                continue
+            yield indices, self.row(buf, bits)
+
+    def _locations(self, level: int, bits: int, indices: tuple, length: int):
+        """ Yields the indices and offsets of all records within the repeats from the given level on,
+            truncated to the image. """
+        if level == len(self._repeats):
+            yield indices, bits
+            return
+        count, stride, size = self._repeats[level]
+        for i in range(repetitions(count, stride, size, length - bits)):
+            yield from self._locations(level + 1, bits + i*stride, indices + (i,), length)
+
+
+def record_tables(codeplug: Codeplug, use_short_names: bool = False) -> list[RecordTable]:
+    return [RecordTable(pattern, key, use_short_names, limit)
+            for key, pattern, limit in zip(unique_keys(codeplug), codeplug, top_level_limits(codeplug))]
+
+
+def export_records(tables: list[RecordTable], filenames, skip_empty: bool = True):
+    """ Generates the records of all tables for each image file. Images are memory-mapped and processed one
+        after the other, hence memory usage is independent of the number and size of the images. """
+    for filename in filenames:
+        image = map_image(filename)
+        buf = memoryview(image)
+        try:
+            for table in tables:
+                for indices, row in table.records(buf, skip_empty):
+                    yield filename, table, indices, row
+        finally:
+            buf.release()
+            if isinstance(image, mmap.mmap):
+                image.close()
+
+
+def write_jsonl(records, file):
+    for filename, table, indices, row in records:
+        file.write(json.dumps({"image": filename, "record": table.get_path(), "index": list(indices), **row}))
+        file.write("\n")
+
+
+def write_csv(records, table: RecordTable, file):
+    writer = csv.writer(file)
+    writer.writerow(["image", "index"] + table.columns())
+    for filename, _, indices, row in records:
+        writer.writerow([filename, ".".join(map(str, indices))] + [row.get(column) for column in table.columns()])
@@ -0,0 +1,249 @@
+import html
+from cpdgen.pattern import AbstractPattern, Codeplug, SparseRepeat, BlockRepeat, FixedRepeat, ElementPattern, \
+    UnionPattern, UnusedDataPattern, address_bits
+from cpdgen.layout import repeat_limit, repeat_stride, pattern_size, unique_keys, child_limit, repetitions, \
+    top_level_limits
+
+
+class Span:
+    """ Range of bits of an image covered by a field, by unused data, by an empty repetition or by no pattern
+        at all. Spans of the same collapsible kind directly following each other are merged. """
+
+    FIELD = 0
+    UNUSED = 1
+    EMPTY = 2
+    UNMAPPED = 3
+
+    __slots__ = ("start", "end", "path", "kind", "collapsible", "fill", "count", "ordinal")
+
+    def __init__(self, start: int, end: int, path: str|None, kind: int, collapsible: bool = False,
+                 fill: int = None):
+        self.start = start
+        self.end = end
+        self.path = path
+        self.kind = kind
+        self.collapsible = collapsible
+        # Repeated byte of collapsible unmapped spans, spans of different fill are not merged.
+        self.fill = fill
+        self.count = 1
+        self.ordinal = 0
+
+    def label(self) -> str:
+        if Span.UNMAPPED == self.kind:
+            return "(unmapped)"
+        label = self.path + (" (empty)" if Span.EMPTY == self.kind else "")
+        if self.count > 1:
+            label += " and {} more".format(self.count - 1)
+        return label
+
+
+def pattern_spans(pattern: AbstractPattern, bits: int, path: str, buf, length: int, limit: int|None = None):
+    """ Yields the spans of the leaves of the pattern located at the given bit offset, in address order.
+        Repetitions not completely contained in the image are omitted, byte-aligned repetitions, that are
+        entirely 00h or FFh, are yielded as a single empty span. The limit bounds unbounded repeats. """
+    if isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+        child = pattern.get_child()
+        count, stride, size = repeat_limit(pattern, limit), repeat_stride(pattern), pattern_size(child)
+        key = unique_keys([child])[0]
+        nbytes = size >> 3
+        empty = (bytes(nbytes), b"\xff"*nbytes)
+        aligned = 0 == bits % 8 and 0 == stride % 8 and 0 == size % 8
+        for i in range(repetitions(count, stride, size, length - bits)):
+            offset = bits + i*stride
+            if aligned and buf[offset >> 3:(offset >> 3) + nbytes] in empty:
+                yield Span(offset, offset + size, "{}[{}]".format(path, i), Span.EMPTY, True)
+            else:
+                yield from pattern_spans(child, offset, "{}[{}].{}".format(path, i, key), buf, length,
+                                         child_limit(pattern))
+    elif isinstance(pattern, Codeplug):
+        for key, child, limit in zip(unique_keys(pattern), pattern, top_level_limits(pattern)):
+            yield from pattern_spans(child, address_bits(child), key, buf, length, limit)
+    elif isinstance(pattern, (ElementPattern, UnionPattern)):
+        children = sorted(zip(unique_keys(pattern), pattern), key=lambda item: address_bits(item[1]))
+        for key, child in children:
+            yield from pattern_spans(child, bits + address_bits(child), f"{path}.{key}" if path else key, buf,
+                                     length)
+    elif isinstance(pattern, UnusedDataPattern):
+        yield Span(bits, bits + pattern_size(pattern), path, Span.UNUSED, True)
+    else:
+        yield Span(bits, bits + pattern_size(pattern), path, Span.FIELD)
+
+
+def uniform_runs(buf, start: int, end: int, width: int, lines: int = 4096):
+    """ Splits the bytes from start to end at line boundaries into pieces and yields each as (start, end,
+        fill), where fill is the repeated byte of pieces holding a single byte value, or None. Chunks of the
+        given number of lines are checked at once, only non-uniform chunks are split into lines. """
+    pos = start
+    while pos < end:
+        stop = min(end, (pos // width + lines)*width)
+        data = bytes(buf[pos:stop])
+        if data.count(data[:1]) == len(data):
+            yield pos, stop, data[0]
+        else:
+            line = pos
+            while line < stop:
+                line_end = min(stop, (line // width + 1)*width)
+                row = data[line - pos:line_end - pos]
+                yield line, line_end, row[0] if row.count(row[:1]) == len(row) else None
+                line = line_end
+        pos = stop
+
+
+class DumpLine:
+    """ A line of the dump. Either holds the data of the line together with the spans covering its bytes,
+        given as runs of (byte count, span), and the labels of the fields starting within the line, or the
+        number of lines skipped within a collapsible span. """
+
+    __slots__ = ("address", "data", "runs", "labels", "skipped", "span")
+
+    def __init__(self, address: int, data: bytes = b"", runs: list = None, labels: list = None, skipped: int = 0,
+                 span: Span = None):
+        self.address = address
+        self.data = data
+        self.runs = runs or []
+        self.labels = labels or []
+        self.skipped = skipped
+        self.span = span
+
+
+class HexDump:
+    """ Annotated hex dump of a codeplug image. The layout is walked in address order alongside the image and
+        the dump is generated line by line, hence arbitrarily large images can be dumped with constant
+        memory. Like the compressed element maps, long runs of unused data, empty repetitions and uniform
+        unmapped bytes are collapsed: only their first line is shown, followed by the number of lines
+        skipped. """
+
+    def __init__(self, codeplug: Codeplug, width: int = 16):
+        self._codeplug = codeplug
+        self._width = width
+
+    def get_codeplug(self) -> Codeplug:
+        return self._codeplug
+
+    def _spans(self, buf):
+        """ Yields spans covering the entire image without overlaps. Overlapping patterns (e.g., members of
+            unions) are truncated, gaps are filled with unmapped spans. """
+        length, last, ordinal = len(buf)*8, None, 0
+        for span in self._covering(buf, length):
+            if last is not None and span.collapsible and last.collapsible and span.kind == last.kind \
+                    and span.fill == last.fill and last.end == span.start:
+                last.end = span.end
+                last.count += 1
+                continue
+            if last is not None:
+                yield last
+            ordinal += 1
+            span.ordinal = ordinal
+            last = span
+        if last is not None:
+            yield last
+
+    def _covering(self, buf, length: int):
+        pos = 0
+        for span in pattern_spans(self._codeplug, 0, "", buf, length):
+            if span.end <= pos or span.start >= length:
+                continue
+            if span.start > pos:
+                yield from self._unmapped(buf, pos, span.start)
+            span.start, span.end = max(span.start, pos), min(span.end, length)
+            pos = span.end
+            yield span
+        if pos < length:
+            yield from self._unmapped(buf, pos, length)
+
+    def _unmapped(self, buf, start: int, end: int):
+        """ Yields the unmapped spans of the given range. Byte-aligned ranges are split into runs of lines, where
+            runs holding a single repeated byte are collapsible. The image is read in chunks of lines, hence
+            large unmapped regions are checked with constant memory. """
+        if start % 8 or end % 8:
+            yield Span(start, end, None, Span.UNMAPPED)
+            return
+        width, first, last = self._width, start >> 3, end >> 3
+        run_start, run_fill = first, None
+        for pos, _, fill in uniform_runs(buf, first, last, width):
+            if pos > run_start and fill != run_fill:
+                yield Span(run_start << 3, pos << 3, None, Span.UNMAPPED, run_fill is not None, run_fill)
+                run_start = pos
+            run_fill = fill
+        yield Span(run_start << 3, end, None, Span.UNMAPPED, run_fill is not None, run_fill)
+
+    def lines(self, buf):
+        """ Yields the lines of the dump of the given image. """
+        nbytes, width = len(buf), self._width
+        spans = self._spans(buf)
+        span = next(spans, None)
+        pos = 0
+        while pos < nbytes:
+            end = min(pos + width, nbytes)
+            runs, labels, first = [], [], span
+            while span is not None and span.start < end*8:
+                if span.start >= pos*8 and Span.UNMAPPED != span.kind:
+                    labels.append(span.label())
+                # Bytes whose first bit lies within the span
+                owned = min((span.end + 7) >> 3, end) - max((span.start + 7) >> 3, pos)
+                if owned > 0:
+                    runs.append((owned, span))
+                if span.end > end*8:
+                    break
+                span = next(spans, None)
+            yield DumpLine(pos, bytes(buf[pos:end]), runs, labels)
+            # Collapse the following lines, if this line is covered entirely by a collapsible span
+            collapse = span is first and span is not None and span.collapsible and span.start <= pos*8
+            pos = end
+            if collapse:
+                skipped = ((span.end >> 3) - pos)//width
+                if skipped > 0:
+                    yield DumpLine(pos, skipped=skipped, span=span)
+                    pos += skipped*width
+
+    def write_text(self, buf, file):
+        """ Writes the dump as plain text, listing the fields starting within each line. """
+        width = self._width
+        for line in self.lines(buf):
+            if line.skipped:
+                file.write("*         {} lines of {}\n".format(line.skipped, line.span.label()))
+                continue
+            hex_part = " ".join("{:02x}".format(b) for b in line.data).ljust(3*width - 1)
+            text = "".join(chr(b) if 0x20 <= b < 0x7f else "." for b in line.data).ljust(width)
+            file.write("{:08x}  {}  {}  {}".format(line.address, hex_part, text, ", ".join(line.labels)).rstrip())
+            file.write("\n")
+
+    def write_html(self, buf, file, title: str = None):
+        """ Writes the dump as a stand-alone HTML page. Bytes are colored by the kind of their span, adjacent
+            fields alternate in color, the path of each field is shown as tooltip. """
+        title = html.escape(title or self._codeplug.meta().get_name() or "Image")
+        file.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{title}</title><style>\n"
+                   f"{HTML_STYLE}</style></head><body>\n<h1>{title}</h1>\n<pre>\n")
+        for line in self.lines(buf):
+            if line.skipped:
+                file.write('<span class="s">*         {} lines of {}</span>\n'.format(
+                    line.skipped, html.escape(line.span.label())))
+                continue
+            file.write('<span class="a">{:08x}</span>  '.format(line.address))
+            offset = 0
+            for count, span in line.runs:
+                data = " ".join("{:02x}".format(b) for b in line.data[offset:offset+count])
+                if Span.FIELD == span.kind:
+                    css = "f{}".format(span.ordinal % 2)
+                else:
+                    css = ("f0", "u", "e", "n")[span.kind]
+                file.write('<span class="{}" title="{}">{}</span> '.format(css, html.escape(span.label()), data))
+                offset += count
+            file.write("   "*(self._width - len(line.data)))
+            text = "".join(chr(b) if 0x20 <= b < 0x7f else "." for b in line.data)
+            file.write(' {}  <span class="l">{}</span>\n'.format(html.escape(text.ljust(self._width)),
+                                                              html.escape(", ".join(line.labels))))
+        file.write("</pre>\n</body></html>\n")
+
+
+HTML_STYLE = """body { font-family: sans-serif; }
+pre { font-family: monospace; line-height: 1.4; }
+.a { color: #888888; }
+.f0 { background-color: #dde8f7; }
+.f1 { background-color: #f7e8cc; }
+.u { background-color: #eeeeee; color: #888888; }
+.e { color: #aaaaaa; }
+.n { color: #cc3333; }
+.s { color: #888888; font-style: italic; }
+.l { color: #336633; }
+"""
@@ -0,0 +1,164 @@
+import csv
+from logging import warning
+from cpdgen.catalog import Model, Firmware
+from cpdgen.document import Document, Paragraph, Section, Table
+from cpdgen.pattern import AbstractPattern, Codeplug, SparseRepeat, BlockRepeat, FixedRepeat, ElementPattern, \
+    UnionPattern
+from cpdgen.layout import unique_keys
+
+
+class FieldHistory:
+    """ Timeline of a single field across the firmware revisions of a model. """
+
+    INTRODUCED = 1
+    CHANGED = 2
+    REMOVED = 3
+
+    __slots__ = ("_path", "_pattern", "_events")
+
+    def __init__(self, path: str, pattern: AbstractPattern):
+        self._path = path
+        self._pattern = pattern
+        self._events: list[tuple[int, str]] = []
+
+    def add(self, kind: int, version: str, pattern: AbstractPattern = None):
+        self._events.append((kind, version))
+        if pattern is not None:
+            self._pattern = pattern
+
+    def get_path(self) -> str:
+        return self._path
+
+    def get_pattern(self) -> AbstractPattern:
+        """ The most recent revision of the field. """
+        return self._pattern
+
+    def get_events(self) -> list[tuple[int, str]]:
+        return self._events
+
+    def versions(self, kind: int) -> list[str]:
+        return [version for k, version in self._events if k == kind]
+
+    def introduced(self) -> list[str]:
+        return self.versions(FieldHistory.INTRODUCED)
+
+    def changed(self) -> list[str]:
+        return self.versions(FieldHistory.CHANGED)
+
+    def removed(self) -> list[str]:
+        return self.versions(FieldHistory.REMOVED)
+
+
+def child_patterns(pattern: AbstractPattern|Codeplug) -> list[tuple[str, AbstractPattern]]:
+    if isinstance(pattern, (Codeplug, ElementPattern, UnionPattern)):
+        return list(zip(unique_keys(pattern), pattern))
+    if isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+        return [(unique_keys([pattern.get_child()])[0], pattern.get_child())]
+    return []
+
+
+class HistoryGenerator:
+    """ Walks all firmware revisions of a model in release order and records, when each field was introduced,
+        changed and removed. Fields are the leaves of the pattern tree, identified by their path of names.
+        The layout of the previous revision is kept as a map from paths to fingerprints, hence subtrees
+        unchanged w.r.t. the previous revision are skipped entirely and each revision only costs in
+        proportion to its changes. """
+
+    def __init__(self):
+        self._documents: list[Document] = []
+        self._fields: dict[str, FieldHistory] = {}
+        self._nodes: dict[str, tuple] = {}
+        self._versions: list[str] = []
+
+    def documents(self) -> list[Document]:
+        return self._documents
+
+    def fields(self) -> list[FieldHistory]:
+        return list(self._fields.values())
+
+    def versions(self) -> list[str]:
+        return self._versions
+
+    @staticmethod
+    def release_order(model: Model) -> list[Firmware]:
+        firmwares = list(model)
+        if all(firmware.has_released() for firmware in firmwares):
+            firmwares.sort(key=lambda firmware: firmware.get_released())
+        return firmwares
+
+    def process(self, model: Model):
+        self._fields, self._nodes, self._versions = {}, {}, []
+        previous = None
+        for firmware in HistoryGenerator.release_order(model):
+            if not firmware.is_valid():
+                warning(f"Skip version {firmware.get_name()} of {model.get_id()}, cannot load codeplug.")
+                continue
+            self._versions.append(firmware.get_name())
+            codeplug = firmware.get_codeplug()
+            # Revisions sharing the codeplug definition are identical.
+            if codeplug is previous:
+                continue
+            previous = codeplug
+            self._walk(codeplug, "", None, firmware.get_name())
+        self._documents = [self._document(model)]
+
+    def _walk(self, pattern: AbstractPattern|Codeplug, path: str, address, version: str):
+        signature = (address, pattern.get_fingerprint())
+        prev = self._nodes.get(path)
+        if prev is not None and prev[0] == signature:
+            return
+        children = child_patterns(pattern)
+        if not children:
+            if prev is not None and prev[1] is not None:
+                self._remove(path, version)
+                prev = None
+            self._nodes[path] = (signature, None)
+            if path not in self._fields:
+                self._fields[path] = FieldHistory(path, pattern)
+            kind = FieldHistory.INTRODUCED if prev is None else FieldHistory.CHANGED
+            self._fields[path].add(kind, version, pattern)
+            return
+        paths = tuple(f"{path}.{key}" if path else key for key, _ in children)
+        if prev is not None:
+            if prev[1] is None:
+                self._remove(path, version)
+            else:
+                for removed in set(prev[1]).difference(paths):
+                    self._remove(removed, version)
+        self._nodes[path] = (signature, paths)
+        for child_path, (_, child) in zip(paths, children):
+            self._walk(child, child_path, child.get_address().bits() if child.has_address() else None, version)
+
+    def _remove(self, path: str, version: str):
+        _, paths = self._nodes.pop(path)
+        if paths is None:
+            self._fields[path].add(FieldHistory.REMOVED, version)
+            return
+        for child_path in paths:
+            self._remove(child_path, version)
+
+    def _document(self, model: Model) -> Document:
+        sub_title = None
+        if self._versions:
+            sub_title = f"Versions {self._versions[0]} to {self._versions[-1]}"
+        document = Document(title=f"History of {model.get_name()}", sub_title=sub_title)
+        document.set_id(f"{model.get_id()}_history")
+        sec = Section(title="Field history")
+        document.add(sec)
+        p = Paragraph(); sec.add(p)
+        p.add(f"Timeline of all fields across {len(self._versions)} versions.")
+        table = Table(4)
+        table.set_header("Field", "Introduced", "Changed", "Removed")
+        for field in self._fields.values():
+            table.add_row(field.get_path(), ", ".join(field.introduced()), ", ".join(field.changed()),
+                          ", ".join(field.removed()))
+        sec.add(table)
+        return document
+
+    def write_table(self, file):
+        """ Writes the history as CSV, one row per field. Multiple versions are separated by spaces. """
+        writer = csv.writer(file)
+        writer.writerow(("field", "introduced", "changed", "removed"))
+        for field in self._fields.values():
+            writer.writerow((field.get_path(), " ".join(field.introduced()), " ".join(field.changed()),
+                             " ".join(field.removed())))
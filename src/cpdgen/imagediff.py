@@ -0,0 +1,138 @@
+from cpdgen.pattern import Address, Size, Codeplug
+from cpdgen.addressindex import AddressIndex, AddressMatch
+from cpdgen.decoder import compile_reader
+
+
+# Translation table mapping each non-zero byte to 01h.
+NONZERO = bytes([0] + [1]*255)
+
+
+def changed_ranges(orig, dest, chunk: int = 0x10000):
+    """ Yields the byte ranges [start, end) differing between the two images. Chunks are compared as a whole
+        and only differing chunks are scanned for the exact ranges, by XOR-ing them as integers and searching
+        the result. Ranges spanning several chunks are merged. If the images differ in size, the excess of
+        the larger one is a changed range. """
+    orig, dest = memoryview(orig), memoryview(dest)
+    length = min(len(orig), len(dest))
+    current = None
+    for first in range(0, length, chunk):
+        a, b = orig[first:first+chunk].tobytes(), dest[first:first+chunk].tobytes()
+        if a == b:
+            continue
+        diff = (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).to_bytes(len(a), "big").translate(NONZERO)
+        start = diff.find(1)
+        while start >= 0:
+            end = diff.find(0, start)
+            end = len(diff) if end < 0 else end
+            if current is not None and current[1] == first + start:
+                current = (current[0], first + end)
+            else:
+                if current is not None:
+                    yield current
+                current = (first + start, first + end)
+            start = diff.find(1, end)
+    if len(orig) != len(dest):
+        if current is not None and current[1] == length:
+            current = (current[0], max(len(orig), len(dest)))
+        else:
+            if current is not None:
+                yield current
+            current = (length, max(len(orig), len(dest)))
+    if current is not None:
+        yield current
+
+
+class FieldChange:
+    """ A field, that differs between two images, together with its decoded values. Changed bytes not covered
+        by any field are reported as changes without match, holding the raw bytes. """
+
+    __slots__ = ("_match", "_bits", "_size", "_old", "_new")
+
+    def __init__(self, match: AddressMatch|None, bits: int, size: int, old, new):
+        self._match = match
+        self._bits = bits
+        self._size = size
+        self._old = old
+        self._new = new
+
+    def __str__(self):
+        return "{} {}: {!r} -> {!r}".format(self.get_address(), self.get_path(), self._old, self._new)
+
+    def has_match(self) -> bool:
+        return self._match is not None
+
+    def get_match(self) -> AddressMatch|None:
+        return self._match
+
+    def get_address(self) -> Address:
+        return Address.from_bits(self._bits)
+
+    def get_size(self) -> Size:
+        return Size.from_bits(self._size)
+
+    def get_path(self) -> str:
+        if self._match is None:
+            return "(unmapped)"
+        return self._match.format_path()
+
+    def get_old(self):
+        return self._old
+
+    def get_new(self):
+        return self._new
+
+
+class ImageDiff:
+    """ Compares two images of a codeplug and maps the changed byte ranges back to the fields and repetition
+        indices through an address index. Only fields whose decoded value actually changed are reported, as
+        a changed byte may hold several bit-fields. """
+
+    def __init__(self, codeplug: Codeplug):
+        self._index = AddressIndex(codeplug)
+        self._readers = {}
+
+    def get_codeplug(self) -> Codeplug:
+        return self._index.get_codeplug()
+
+    def _reader(self, match: AddressMatch, bits: int):
+        key = (id(match.get_pattern()), bits % 8)
+        reader = self._readers.get(key)
+        if reader is None:
+            reader = compile_reader(match.get_pattern(), bits % 8)
+            self._readers[key] = reader
+        return reader
+
+    def compare(self, orig, dest):
+        """ Yields the changes between the two images in address order. """
+        orig, dest = memoryview(orig), memoryview(dest)
+        reported = set()
+        for start, end in changed_ranges(orig, dest):
+            mapped = start
+            for match in self._index.query_bits(start*8, end*8):
+                bits, size = match.get_address().bits(), match.get_size().bits()
+                key = (bits, match.get_path())
+                # Skip fields already reported, i.e., spanning several changed ranges
+                if key in reported:
+                    continue
+                reported.add(key)
+                if mapped*8 < bits:
+                    yield from self._unmapped(orig, dest, mapped, bits >> 3)
+                mapped = max(mapped, (bits + size + 7) >> 3)
+                if (bits + size + 7) >> 3 > min(len(orig), len(dest)):
+                    yield FieldChange(match, bits, size, self._raw(orig, bits, size), self._raw(dest, bits, size))
+                    continue
+                reader = self._reader(match, bits)
+                old, new = reader(orig, bits), reader(dest, bits)
+                if old != new:
+                    yield FieldChange(match, bits, size, old, new)
+            if mapped < end:
+                yield from self._unmapped(orig, dest, mapped, end)
+
+    @staticmethod
+    def _raw(image, bits: int, size: int) -> bytes:
+        return image[bits >> 3:(bits + size + 7) >> 3].tobytes()
+
+    @staticmethod
+    def _unmapped(orig, dest, start: int, end: int):
+        if start < end:
+            yield FieldChange(None, start*8, (end - start)*8, orig[start:end].tobytes(), dest[start:end].tobytes())
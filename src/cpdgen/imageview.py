@@ -0,0 +1,218 @@
+import mmap
+from collections.abc import Mapping, Sequence
+from cpdgen.pattern import AbstractPattern, Codeplug, SparseRepeat, BlockRepeat, FixedRepeat, ElementPattern, \
+    UnionPattern, UnusedDataPattern, UnknownDataPattern, address_bits
+from cpdgen.layout import repeat_limit, repeat_stride, pattern_size, unique_keys, child_limit, repetitions, \
+    top_level_limits
+from cpdgen.decoder import compile_reader, shift_phase, minimum_size
+
+
+def map_image(filename: str) -> mmap.mmap|bytes:
+    """ Maps the given image file read-only into memory. """
+    with open(filename, "rb") as file:
+        try:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return b""
+
+
+class LazyNode:
+    """ Compiled layout of a pattern for lazy access. Nodes compile their children only on first access,
+        hence inspecting a single field of a huge codeplug only compiles the patterns along its path. """
+
+    __slots__ = ("pattern", "phase", "limit", "_reader")
+
+    def __init__(self, pattern: AbstractPattern, phase: int|None, limit: int|None = None):
+        self.pattern = pattern
+        self.phase = phase
+        self.limit = limit
+        self._reader = None
+
+    def decode(self, buf, bits: int):
+        """ Decodes the complete pattern, like the Decoder does. """
+        if self._reader is None:
+            self._reader = compile_reader(self.pattern, self.phase, self.limit)
+        return self._reader(buf, bits)
+
+    def view(self, buf, bits: int):
+        return self.decode(buf, bits)
+
+    @staticmethod
+    def compile(pattern: AbstractPattern, phase: int|None, limit: int|None = None):
+        if isinstance(pattern, (ElementPattern, UnionPattern)):
+            return RecordNode(pattern, phase)
+        if isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+            return RepeatNode(pattern, phase, limit)
+        if (isinstance(pattern, (UnusedDataPattern, UnknownDataPattern)) and 0 == phase
+                and 0 == pattern.get_size().bits() % 8):
+            return BlobNode(pattern, phase)
+        return LazyNode(pattern, phase)
+
+
+class BlobNode(LazyNode):
+    """ Unused and unknown data is not decoded but returned as a memoryview into the image. """
+
+    __slots__ = ()
+
+    def view(self, buf, bits: int):
+        first = bits >> 3
+        return buf[first:first + (self.pattern.get_size().bits() >> 3)]
+
+
+class RecordNode(LazyNode):
+    __slots__ = ("keys", "_offsets", "_patterns", "_nodes")
+
+    def __init__(self, pattern: ElementPattern|UnionPattern, phase: int|None):
+        super().__init__(pattern, phase)
+        self.keys = unique_keys(pattern)
+        self._patterns = dict(zip(self.keys, pattern))
+        self._nodes = {}
+
+    def child(self, key: str) -> tuple[int, LazyNode]:
+        """ Returns the relative offset and the compiled node of the child with the given key. """
+        node = self._nodes.get(key)
+        if node is None:
+            pattern = self._patterns[key]
+            node = LazyNode.compile(pattern, shift_phase(self.phase, address_bits(pattern)))
+            self._nodes[key] = node
+        return address_bits(node.pattern), node
+
+    def view(self, buf, bits: int):
+        return RecordView(self, buf, bits)
+
+
+class RepeatNode(LazyNode):
+    __slots__ = ("count", "stride", "size", "_child")
+
+    def __init__(self, pattern: SparseRepeat|BlockRepeat|FixedRepeat, phase: int|None, limit: int|None):
+        super().__init__(pattern, phase, limit)
+        self.count = repeat_limit(pattern, limit)
+        self.stride = repeat_stride(pattern)
+        self.size = pattern_size(pattern.get_child())
+        self._child = None
+
+    def child(self) -> LazyNode:
+        if self._child is None:
+            self._child = LazyNode.compile(self.pattern.get_child(), self.phase if 0 == self.stride % 8 else None,
+                                           child_limit(self.pattern))
+        return self._child
+
+    def view(self, buf, bits: int):
+        return RepeatView(self, buf, bits)
+
+
+class RecordView(Mapping):
+    """ View of an element or union within an image. Fields are decoded on access. """
+
+    __slots__ = ("_node", "_buf", "_bits")
+
+    def __init__(self, node: RecordNode, buf, bits: int):
+        self._node = node
+        self._buf = buf
+        self._bits = bits
+
+    def __getitem__(self, key: str):
+        offset, node = self._node.child(key)
+        return node.view(self._buf, self._bits + offset)
+
+    def __iter__(self):
+        return iter(self._node.keys)
+
+    def __len__(self):
+        return len(self._node.keys)
+
+    def get_pattern(self) -> AbstractPattern:
+        return self._node.pattern
+
+    def raw(self, key: str = None) -> memoryview:
+        """ Returns the bytes of the record or of one of its fields as a memoryview into the image, without
+            copying. """
+        bits, size = self._bits, pattern_size(self._node.pattern)
+        if key is not None:
+            offset, node = self._node.child(key)
+            bits, size = bits + offset, pattern_size(node.pattern)
+        if bits % 8 or size % 8:
+            raise ValueError("Cannot slice '{}', it is not byte-aligned.".format(key))
+        return self._buf[bits >> 3:(bits + size) >> 3]
+
+    def decode(self) -> dict:
+        return self._node.decode(self._buf, self._bits)
+
+
+class RepeatView(Sequence):
+    """ View of a repeat within an image. Repetitions are decoded on access, only those completely contained
+        in the image are accessible. """
+
+    __slots__ = ("_node", "_buf", "_bits", "_len")
+
+    def __init__(self, node: RepeatNode, buf, bits: int):
+        self._node = node
+        self._buf = buf
+        self._bits = bits
+        self._len = repetitions(node.count, node.stride, node.size, len(buf)*8 - bits)
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(self._len))]
+        if item < 0:
+            item += self._len
+        if not 0 <= item < self._len:
+            raise IndexError("Repetition index {} out of range.".format(item))
+        return self._node.child().view(self._buf, self._bits + item*self._node.stride)
+
+    def get_pattern(self) -> AbstractPattern:
+        return self._node.pattern
+
+    def decode(self) -> list:
+        return self._node.decode(self._buf, self._bits)
+
+
+class CodeplugImage(Mapping):
+    """ Lazy access to a binary codeplug image. Top-level elements are accessed by name and returned as
+        views, that decode fields only on access. Use open() to memory-map an image file, such that only
+        the pages actually accessed are read. """
+
+    def __init__(self, codeplug: Codeplug, image: bytes|bytearray|memoryview|mmap.mmap):
+        self._codeplug = codeplug
+        self._mmap = image if isinstance(image, mmap.mmap) else None
+        self._buf = memoryview(image)
+        length = len(self._buf)*8
+        self._elements = {key: (address_bits(pattern), LazyNode.compile(pattern, address_bits(pattern) % 8, limit))
+                          for key, pattern, limit in zip(unique_keys(codeplug), codeplug, top_level_limits(codeplug))
+                          if address_bits(pattern) + minimum_size(pattern) <= length}
+
+    @staticmethod
+    def open(codeplug: Codeplug, filename: str):
+        return CodeplugImage(codeplug, map_image(filename))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __getitem__(self, key: str):
+        offset, node = self._elements[key]
+        return node.view(self._buf, offset)
+
+    def __iter__(self):
+        return iter(self._elements)
+
+    def __len__(self):
+        return len(self._elements)
+
+    def get_codeplug(self) -> Codeplug:
+        return self._codeplug
+
+    def get_buffer(self) -> memoryview:
+        return self._buf
+
+    def close(self):
+        """ Releases the image. Memoryviews obtained from the image must be released before. """
+        self._buf.release()
+        if self._mmap is not None:
+            self._mmap.close()
@@ -0,0 +1,111 @@
+from bisect import bisect_right
+from cpdgen.pattern import AbstractPattern, FixedPattern, SparseRepeat, BlockRepeat, FixedRepeat, Codeplug, \
+    address_bits
+
+
+def repeat_count(pattern: SparseRepeat|BlockRepeat|FixedRepeat) -> int:
+    """ Number of repetitions assumed for the static layout size of a repeat. For repeats without an upper
+        bound, the minimum number of repetitions (at least one) is assumed. Tools working on images use
+        repeat_limit() instead. """
+    bound = repeat_bound(pattern)
+    if bound is not None:
+        return bound
+    return max(pattern.get_min(), 1)
+
+
+def repeat_bound(pattern: SparseRepeat|BlockRepeat|FixedRepeat) -> int|None:
+    """ Maximum number of repetitions of a repeat, None if unbounded. """
+    if isinstance(pattern, FixedRepeat):
+        return pattern.get_n()
+    if pattern.get_max() is not None:
+        return int(pattern.get_max())
+    return None
+
+
+def repeat_limit(pattern: SparseRepeat|BlockRepeat|FixedRepeat, limit: int|None) -> int|None:
+    """ Number of repetitions of a repeat, given the number of bits available to it. Unbounded repeats
+        repeat as often as they fit (but at least their minimum). Returns None for unbounded repeats without
+        a limit, these extend to the end of the image. """
+    bound = repeat_bound(pattern)
+    if bound is not None or limit is None:
+        return bound
+    return max(repetitions(None, repeat_stride(pattern), pattern_size(pattern.get_child()), limit),
+               pattern.get_min())
+
+
+def child_limit(pattern: SparseRepeat|BlockRepeat|FixedRepeat) -> int|None:
+    """ Number of bits available to the child of a repeat. This is the step of sparse repeats. """
+    if isinstance(pattern, SparseRepeat):
+        return repeat_stride(pattern)
+    return None
+
+
+def repetitions(count: int|None, stride: int, size: int, length: int) -> int:
+    """ Number of repetitions completely contained in the given number of bits. A count of None means
+        unbounded. """
+    if length < size:
+        return 0
+    if not stride:
+        return 1 if count is None else count
+    fitting = (length - size)//stride + 1
+    return fitting if count is None else min(count, fitting)
+
+
+def top_level_limits(codeplug: Codeplug) -> list[int|None]:
+    """ Number of bits available to each top-level pattern, up to the start of the next top-level pattern.
+        None for the last one, which may extend to the end of the image. """
+    starts = [address_bits(pattern) for pattern in codeplug]
+    limits = []
+    for start in starts:
+        k = bisect_right(starts, start)
+        limits.append(starts[k] - start if k < len(starts) else None)
+    return limits
+
+
+def repeat_stride(pattern: SparseRepeat|BlockRepeat|FixedRepeat) -> int:
+    """ Distance in bits between two consecutive repetitions. """
+    if isinstance(pattern, SparseRepeat):
+        return pattern.get_offset().bits()
+    return pattern_size(pattern.get_child())
+
+
+def pattern_size(pattern: AbstractPattern) -> int:
+    """ Size of the given pattern in bits, including all repetitions of repeats. """
+    if isinstance(pattern, FixedPattern):
+        return pattern.get_size().bits()
+    if isinstance(pattern, SparseRepeat):
+        count = repeat_count(pattern)
+        return (count-1)*repeat_stride(pattern) + pattern_size(pattern.get_child())
+    if isinstance(pattern, BlockRepeat):
+        return repeat_count(pattern)*pattern_size(pattern.get_child())
+    raise TypeError("Unhandled pattern type '{}'.".format(type(pattern)))
+
+
+def pattern_label(pattern: AbstractPattern) -> str:
+    if pattern.meta().get_name():
+        return pattern.meta().get_name()
+    return type(pattern).__name__
+
+
+def pattern_key(pattern: AbstractPattern) -> str:
+    """ Key of a pattern within decoded records. This is the name of the pattern or, for unnamed patterns,
+        the type and address. """
+    if pattern.meta().get_name():
+        return pattern.meta().get_name()
+    if pattern.has_address() and pattern.get_address().is_valid():
+        return "{} at {}".format(type(pattern).__name__, pattern.get_address())
+    return type(pattern).__name__
+
+
+def unique_keys(patterns) -> list[str]:
+    """ Keys of the given sibling patterns, where duplicate keys get numbered. """
+    keys, seen = [], {}
+    for pattern in patterns:
+        key = pattern_key(pattern)
+        if key in seen:
+            seen[key] += 1
+            key = "{} ({})".format(key, seen[key])
+        else:
+            seen[key] = 1
+        keys.append(key)
+    return keys
@@ -0,0 +1,203 @@
+from cpdgen.pattern import AbstractPattern, Address, Size, Codeplug, SparseRepeat, BlockRepeat, FixedRepeat, \
+    ElementPattern, UnionPattern, UnknownDataPattern
+from cpdgen.layout import repeat_count, repeat_stride, pattern_size, pattern_label
+
+
+class LayoutIssue:
+    """ An overlap or gap found in a codeplug layout. For top-level issues, the addresses are absolute,
+        for issues within a union, the addresses are relative to that union. Members smaller than their
+        union and holes within unions are gaps too. """
+
+    OVERLAP = 1
+    GAP = 2
+    SHORT_MEMBER = 3
+    HOLE = 4
+
+    def __init__(self, kind: int, start: int, end: int, first: AbstractPattern, second: AbstractPattern,
+                 context: AbstractPattern = None):
+        self._kind = kind
+        self._start = start
+        self._end = end
+        self._first = first
+        self._second = second
+        self._context = context
+
+    def __str__(self):
+        where = "" if self._context is None else " in {}".format(pattern_label(self._context))
+        if LayoutIssue.OVERLAP == self._kind:
+            return "Overlap{} at {} of size {} between {} and {}.".format(
+                where, self.get_address(), self.get_size(), pattern_label(self._first), pattern_label(self._second))
+        if LayoutIssue.SHORT_MEMBER == self._kind:
+            return "Member {}{} ends at {}, {} before the end of the union.".format(
+                pattern_label(self._first), where, self.get_address(), self.get_size())
+        if LayoutIssue.HOLE == self._kind:
+            return "Hole{} at {} of size {}, not documented by any member.".format(
+                where, self.get_address(), self.get_size())
+        return "Gap{} at {} of size {} between {} and {}.".format(
+            where, self.get_address(), self.get_size(), pattern_label(self._first), pattern_label(self._second))
+
+    def get_kind(self) -> int:
+        return self._kind
+
+    def is_overlap(self) -> bool:
+        return LayoutIssue.OVERLAP == self._kind
+
+    def get_address(self) -> Address:
+        return Address.from_bits(self._start)
+
+    def get_size(self) -> Size:
+        return Size.from_bits(self._end - self._start)
+
+    def get_first(self) -> AbstractPattern:
+        return self._first
+
+    def get_second(self) -> AbstractPattern:
+        return self._second
+
+    def get_context(self) -> AbstractPattern|None:
+        return self._context
+
+
+class LayoutReport:
+    def __init__(self, codeplug: Codeplug):
+        self._codeplug = codeplug
+        self._issues: list[LayoutIssue] = []
+        self._coverage: list[tuple[AbstractPattern, int, int]] = []
+
+    def __iter__(self):
+        return iter(self._issues)
+
+    def __len__(self):
+        return len(self._issues)
+
+    def add(self, issue: LayoutIssue):
+        self._issues.append(issue)
+
+    def get_codeplug(self) -> Codeplug:
+        return self._codeplug
+
+    def overlaps(self) -> list[LayoutIssue]:
+        return [issue for issue in self._issues if issue.is_overlap()]
+
+    def gaps(self) -> list[LayoutIssue]:
+        return [issue for issue in self._issues if not issue.is_overlap()]
+
+    def has_overlaps(self) -> bool:
+        return any(issue.is_overlap() for issue in self._issues)
+
+    def add_coverage(self, pattern: AbstractPattern, documented: int, total: int):
+        self._coverage.append((pattern, documented, total))
+
+    def coverage(self) -> list[tuple[AbstractPattern, int, int]]:
+        """ Returns the number of documented and total bits of each top-level element. Unknown data is
+            considered undocumented. """
+        return self._coverage
+
+
+def documented_bits(pattern: AbstractPattern) -> int:
+    if isinstance(pattern, UnknownDataPattern):
+        return 0
+    if isinstance(pattern, ElementPattern):
+        return sum(documented_bits(child) for child in pattern)
+    if isinstance(pattern, UnionPattern):
+        return max((documented_bits(child) for child in pattern), default=0)
+    if isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+        return repeat_count(pattern)*documented_bits(pattern.get_child())
+    return pattern_size(pattern)
+
+
+def covered_bits(pattern: AbstractPattern) -> int:
+    if isinstance(pattern, SparseRepeat):
+        return repeat_count(pattern)*covered_bits(pattern.get_child())
+    return pattern_size(pattern)
+
+
+def flatten(pattern: AbstractPattern, base: int, top: AbstractPattern, intervals: list):
+    """ Appends the absolute intervals occupied by the pattern. Only sparse repeats are expanded, all other
+        patterns occupy a single contiguous interval. """
+    if isinstance(pattern, SparseRepeat):
+        stride, child = repeat_stride(pattern), pattern.get_child()
+        for i in range(repeat_count(pattern)):
+            flatten(child, base + i*stride, top, intervals)
+    else:
+        intervals.append((base, base + pattern_size(pattern), top))
+
+
+def sweep(intervals: list, report: LayoutReport, context: AbstractPattern = None):
+    """ Sorts the intervals and reports overlaps and gaps in a single pass. Gaps between intervals of the
+        same top-level pattern (e.g., between the repetitions of a sparse repeat) are intended and not
+        reported. """
+    intervals.sort(key=lambda i: i[0])
+    end, owner = None, None
+    for start, stop, pattern in intervals:
+        if end is not None:
+            if start < end:
+                report.add(LayoutIssue(LayoutIssue.OVERLAP, start, min(stop, end), owner, pattern, context))
+            elif start > end and owner is not pattern:
+                report.add(LayoutIssue(LayoutIssue.GAP, end, start, owner, pattern, context))
+        if end is None or stop > end:
+            end, owner = stop, pattern
+
+
+def documented_intervals(pattern: AbstractPattern, base: int, intervals: list):
+    """ Appends the intervals of all documented leaves of the pattern, i.e., all but unknown data. """
+    if isinstance(pattern, UnknownDataPattern):
+        return
+    if isinstance(pattern, ElementPattern):
+        for child in pattern:
+            documented_intervals(child, base + child.get_address().bits(), intervals)
+    elif isinstance(pattern, UnionPattern):
+        for child in pattern:
+            documented_intervals(child, base, intervals)
+    elif isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+        stride, child = repeat_stride(pattern), pattern.get_child()
+        for i in range(repeat_count(pattern)):
+            documented_intervals(child, base + i*stride, intervals)
+    else:
+        intervals.append((base, base + pattern_size(pattern)))
+
+
+def check_union(pattern: UnionPattern, report: LayoutReport):
+    """ Reports members smaller than the union and holes, i.e., bits of the union documented by none of its
+        members. Addresses are relative to the union. """
+    size, intervals = pattern_size(pattern), []
+    for member in pattern:
+        if pattern_size(member) < size:
+            report.add(LayoutIssue(LayoutIssue.SHORT_MEMBER, pattern_size(member), size, member, pattern, pattern))
+        documented_intervals(member, 0, intervals)
+    intervals.sort()
+    end = 0
+    for start, stop in intervals + [(size, size)]:
+        if start > end:
+            report.add(LayoutIssue(LayoutIssue.HOLE, end, start, pattern, pattern, pattern))
+        end = max(end, stop)
+
+
+def check_unions(pattern: AbstractPattern, report: LayoutReport, visited: set):
+    """ Checks all unions once. Elements need no check, as their children are placed contiguously. """
+    if id(pattern) in visited:
+        return
+    visited.add(id(pattern))
+    if isinstance(pattern, UnionPattern):
+        check_union(pattern, report)
+    if isinstance(pattern, (ElementPattern, UnionPattern)):
+        for child in pattern:
+            check_unions(child, report, visited)
+    elif isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+        check_unions(pattern.get_child(), report, visited)
+
+
+def check_layout(codeplug: Codeplug) -> LayoutReport:
+    """ Checks the layout of the given codeplug for overlapping top-level elements, overlapping repetitions,
+        gaps between top-level elements as well as union members smaller than their union and holes within
+        unions. Also collects the documentation coverage of each top-level element. """
+    report = LayoutReport(codeplug)
+    intervals = []
+    for pattern in codeplug:
+        flatten(pattern, pattern.get_address().bits(), pattern, intervals)
+        report.add_coverage(pattern, documented_bits(pattern), covered_bits(pattern))
+    sweep(intervals, report)
+    visited = set()
+    for pattern in codeplug:
+        check_unions(pattern, report, visited)
+    return report
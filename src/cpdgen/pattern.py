@@ -1,17 +1,54 @@
 from abc import ABC, abstractmethod
+from bisect import insort
+from hashlib import blake2b
 from re import fullmatch
+from sys import intern
 
 
 class Address:
-    def __init__(self, byte: int = None, bit: int = 7):
+    """ Immutable, hashable bit address. The address is stored as the bit offset from the most significant
+        bit of byte 0. Small addresses are shared flyweights, see Address.from_bits. """
+
+    __slots__ = ("_bits",)
+
+    # Flyweight instances by bit offset, populated on demand for offsets below FLYWEIGHT_LIMIT.
+    FLYWEIGHT_LIMIT = 4096
+    _flyweights = {}
+
+    def __new__(cls, byte: int = None, bit: int = 7):
         if byte is None:
-            self._bits = None
-        else:
-            self._bits = byte*8 + 8*(bit//8) + (7-bit%8);
+            return cls.from_bits(None)
+        return cls.from_bits(byte*8 + 8*(bit//8) + (7-bit%8))
+
+    @classmethod
+    def from_bits(cls, bits: int|None):
+        obj = cls._flyweights.get(bits)
+        if obj is not None:
+            return obj
+        obj = object.__new__(cls)
+        object.__setattr__(obj, "_bits", bits)
+        if bits is not None and 0 <= bits < cls.FLYWEIGHT_LIMIT:
+            cls._flyweights[bits] = obj
+        return obj
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Address is immutable.")
+
+    def __delattr__(self, key):
+        raise AttributeError("Address is immutable.")
+
+    def __reduce__(self):
+        return Address.from_bits, (self._bits,)
 
     def __str__(self):
         return self.format(0 == self._bits % 8)
 
+    def __repr__(self):
+        return "Address.from_bits({})".format(self._bits)
+
+    def is_valid(self):
+        return self._bits is not None
+
     def is_byte_aligned(self):
         return 0 == self._bits % 8
 
@@ -21,24 +58,37 @@ class Address:
         return "{:x}h:{}".format(self._bits//8, 7 - self._bits % 8)
 
     def __add__(self, other):
-        bits = self._bits + other.bits()
-        byte, bit = bits//8, 7 - bits % 8
-        return Address(byte, bit)
+        return Address.from_bits(self._bits + other.bits())
 
-    def __lt__(self, other):
-        return self._bits < other.bits()
+    def __sub__(self, other):
+        if isinstance(other, Address):
+            return Size.from_bits(self._bits - other._bits)
+        return Address.from_bits(self._bits - other.bits())
 
-    def __le__(self, other):
-        return self._bits <= other.bits()
+    def __hash__(self):
+        return hash(self._bits)
 
     def __eq__(self, other):
-        return self._bits == other.bits()
+        if not isinstance(other, Address):
+            return NotImplemented
+        return self._bits == other._bits
+
+    def __ne__(self, other):
+        if not isinstance(other, Address):
+            return NotImplemented
+        return self._bits != other._bits
+
+    def __lt__(self, other):
+        return self._bits < other._bits
+
+    def __le__(self, other):
+        return self._bits <= other._bits
 
     def __ge__(self, other):
-        return self._bits >= other.bits()
+        return self._bits >= other._bits
 
     def __gt__(self, other):
-        return self._bits > other.bits()
+        return self._bits > other._bits
 
     @staticmethod
     def parse(string):
@@ -54,29 +104,83 @@ class Address:
 
 
 class Size:
-    def __init__(self, byte:int=None, bit:int=0):
+    """ Immutable, hashable size in bits. Small sizes are shared flyweights, see Size.from_bits. """
+
+    __slots__ = ("_bits",)
+
+    # Flyweight instances by number of bits, populated on demand for sizes below FLYWEIGHT_LIMIT.
+    FLYWEIGHT_LIMIT = 4096
+    _flyweights = {}
+
+    def __new__(cls, byte:int=None, bit:int=0):
         if None == byte:
-            self._bits = 0
-        else:
-            self._bits = byte*8 + bit;
+            return cls.from_bits(0)
+        return cls.from_bits(byte*8 + bit)
+
+    @classmethod
+    def from_bits(cls, bits: int):
+        obj = cls._flyweights.get(bits)
+        if obj is not None:
+            return obj
+        obj = object.__new__(cls)
+        object.__setattr__(obj, "_bits", bits)
+        if 0 <= bits < cls.FLYWEIGHT_LIMIT:
+            cls._flyweights[bits] = obj
+        return obj
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Size is immutable.")
+
+    def __delattr__(self, key):
+        raise AttributeError("Size is immutable.")
+
+    def __reduce__(self):
+        return Size.from_bits, (self._bits,)
 
     def __str__(self):
         if 0 == self._bits % 8:
             return "{:x}h".format(self._bits//8)
         return "{:x}h:{}".format(self._bits//8, self._bits%8)
 
+    def __repr__(self):
+        return "Size.from_bits({})".format(self._bits)
+
     def __mul__(self, other:int):
-        return Size(0, self._bits*other)
+        return Size.from_bits(self._bits*other)
+
+    __rmul__ = __mul__
 
     def __add__(self, other):
-        return Size(0, self._bits + other._bits)
+        return Size.from_bits(self._bits + other._bits)
 
-    def __le__(self, other):
-        return self._bits <= other._bits
+    def __sub__(self, other):
+        return Size.from_bits(self._bits - other._bits)
+
+    def __hash__(self):
+        return hash(self._bits)
 
     def __eq__(self, other):
+        if not isinstance(other, Size):
+            return NotImplemented
         return self._bits == other._bits
 
+    def __ne__(self, other):
+        if not isinstance(other, Size):
+            return NotImplemented
+        return self._bits != other._bits
+
+    def __lt__(self, other):
+        return self._bits < other._bits
+
+    def __le__(self, other):
+        return self._bits <= other._bits
+
+    def __ge__(self, other):
+        return self._bits >= other._bits
+
+    def __gt__(self, other):
+        return self._bits > other._bits
+
     def bits(self):
         return self._bits
 
@@ -102,19 +206,40 @@ class MetaInformation:
     FLAG_NEEDS_REVIEW = 2
     FLAG_INCOMPLETE = 3
 
-    def __init__(self):
+    __slots__ = ("_name", "_short_name", "_brief", "_description", "_firmware_version", "_flags", "_owner")
+
+    def __init__(self, owner = None):
         self._name = None
         self._short_name = None
         self._brief = None
         self._description = None
         self._firmware_version = None
         self._flags = MetaInformation.FLAG_NONE
+        # Pattern or codeplug, whose fingerprint gets invalidated on changes.
+        self._owner = owner
+
+    def set_owner(self, owner):
+        self._owner = owner
+
+    def changed(self):
+        if self._owner is not None:
+            self._owner.invalidate()
+
+    def hash_into(self, digest):
+        digest.update(self.canonical())
+
+    def canonical(self) -> bytes:
+        """ Canonical representation of the meta information, as hashed into fingerprints. """
+        return repr((self._name, self._short_name, self._brief, self._description, self._firmware_version,
+                     self._flags)).encode()
 
     def get_name(self):
         return self._name
 
     def set_name(self, name):
-        self._name = str(name)
+        # Names repeat across codeplugs and firmware revisions, share them.
+        self._name = intern(str(name))
+        self.changed()
 
     def has_short_name(self):
         return bool(self._short_name)
@@ -123,7 +248,8 @@ class MetaInformation:
         return self._short_name
 
     def set_short_name(self, name):
-        self._short_name = str(name)
+        self._short_name = intern(str(name))
+        self.changed()
 
     def has_brief(self) -> bool:
         return bool(self._brief)
@@ -133,6 +259,7 @@ class MetaInformation:
 
     def set_brief(self, description):
         self._brief = str(description)
+        self.changed()
 
     def has_description(self) -> bool:
         return bool(self._description)
@@ -142,6 +269,7 @@ class MetaInformation:
 
     def set_description(self, description):
         self._description = str(description)
+        self.changed()
 
     def has_version(self):
         return self._firmware_version is not None
@@ -151,25 +279,37 @@ class MetaInformation:
 
     def set_version(self, version):
         self._firmware_version = version
+        self.changed()
 
     def has_flag(self):
         return self._flags is not None
 
     def set_flag(self, flag: int):
         self._flags = flag
+        self.changed()
 
     def get_flag(self) -> int:
         return self._flags
 
 
+# Hashed for patterns, whose meta information has not been allocated yet. Hence, allocating it on read
+# does not change the fingerprint.
+EMPTY_META = MetaInformation().canonical()
+
+
 class AbstractPattern:
     DONE = 1
     NEEDS_REVIEW = 2
     INCOMPLETE = 3
 
+    __slots__ = ("_meta", "_address", "_parent", "_hash")
+
     def __init__(self, address:Address=None):
-        self._meta = MetaInformation()
+        # Meta information is allocated on first access.
+        self._meta = None
         self._address = address
+        self._parent = None
+        self._hash = None
 
     def has_address(self) -> bool:
         return isinstance(self._address, Address)
@@ -179,23 +319,71 @@ class AbstractPattern:
 
     def set_address(self, address:Address):
         self._address = address
+        self.invalidate()
+
+    def has_meta(self) -> bool:
+        return self._meta is not None
 
     def meta(self) -> MetaInformation:
+        if self._meta is None:
+            self._meta = MetaInformation(self)
         return self._meta
 
+    def get_parent(self):
+        return self._parent
+
+    def set_parent(self, parent):
+        self._parent = parent
+
+    def invalidate(self):
+        """ Drops the cached fingerprint of this pattern and all its ancestors. """
+        node = self
+        while node is not None and node._hash is not None:
+            node._hash = None
+            node = node.get_parent()
+
+    def get_fingerprint(self) -> bytes:
+        """ Structural hash of this pattern, covering its layout, meta information and children but not
+            its own address. Hence, equal fingerprints identify equal subtrees, even if relocated. The
+            fingerprint is computed bottom-up once and cached until the subtree changes. """
+        if self._hash is None:
+            digest = blake2b(digest_size=16)
+            self.hash_into(digest)
+            self._hash = digest.digest()
+        return self._hash
+
+    def hash_into(self, digest):
+        digest.update(type(self).__name__.encode())
+        digest.update(EMPTY_META if self._meta is None else self._meta.canonical())
+
+
+def hash_child(digest, child: AbstractPattern):
+    """ Adds the relative address and the fingerprint of a child to the digest of its parent. """
+    if child is None:
+        digest.update(b"\0")
+        return
+    digest.update(repr(child.get_address().bits() if child.has_address() else None).encode())
+    digest.update(child.get_fingerprint())
+
 
 class StructuredPatternInterface(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def add(self, child:AbstractPattern):
         pass
 
 
 class DensePattern(AbstractPattern):
+    __slots__ = ()
+
     def __init__(self, address:Address=None):
         super().__init__(address)
 
 
 class FixedPattern(DensePattern, ABC):
+    __slots__ = ("_size",)
+
     def __init__(self, size=Size(0), address:Address=None):
         super().__init__(address)
         self._size : Size = size
@@ -206,18 +394,26 @@ class FixedPattern(DensePattern, ABC):
     def is_byte_sized(self) -> bool:
         return self._size.is_byte_sized()
 
+    def hash_into(self, digest):
+        super().hash_into(digest)
+        digest.update(self._size.bits().to_bytes(8, "little"))
+
     @abstractmethod
     def update(self):
         pass
 
 
 class SparseRepeat(AbstractPattern, StructuredPatternInterface):
+    __slots__ = ("_child", "_offset", "_min", "_max")
+
     def __init__(self, offset: Size, address:Address=None, child: AbstractPattern = None, min: int = 0, max: int = None):
         super().__init__(address)
         self._child = child
         self._offset = offset
         self._min = int(min)
         self._max = max
+        if child is not None:
+            child.set_parent(self)
 
     def add(self, child:AbstractPattern):
         self.set_child(child)
@@ -228,6 +424,8 @@ class SparseRepeat(AbstractPattern, StructuredPatternInterface):
     def set_child(self, child:AbstractPattern):
         assert self._child is None
         self._child = child
+        child.set_parent(self)
+        self.invalidate()
 
     def get_min(self) -> int:
         return self._min
@@ -238,8 +436,15 @@ class SparseRepeat(AbstractPattern, StructuredPatternInterface):
     def get_offset(self):
         return self._offset
 
+    def hash_into(self, digest):
+        super().hash_into(digest)
+        digest.update(repr((self._offset.bits(), self._min, self._max)).encode())
+        hash_child(digest, self._child)
+
 
 class BlockRepeat(DensePattern, StructuredPatternInterface):
+    __slots__ = ("_child", "_min", "_max")
+
     def __init__(self, address:Address=None, child: DensePattern = None, min: int = 0, max: int = None):
         super(DensePattern, self).__init__(address)
         super(StructuredPatternInterface, self).__init__()
@@ -248,6 +453,8 @@ class BlockRepeat(DensePattern, StructuredPatternInterface):
         self._child = child
         self._min = int(min)
         self._max = max
+        if child is not None:
+            child.set_parent(self)
 
     def add(self, child:AbstractPattern):
         self.set_child(child)
@@ -259,6 +466,8 @@ class BlockRepeat(DensePattern, StructuredPatternInterface):
         if not isinstance(child, DensePattern):
             raise TypeError("Cannot add a sparse pattern to a dense one.")
         self._child = child
+        child.set_parent(self)
+        self.invalidate()
 
     def get_min(self) -> int:
         return self._min
@@ -266,8 +475,15 @@ class BlockRepeat(DensePattern, StructuredPatternInterface):
     def get_max(self) -> int:
         return self._max
 
+    def hash_into(self, digest):
+        super().hash_into(digest)
+        digest.update(repr((self._min, self._max)).encode())
+        hash_child(digest, self._child)
+
 
 class FixedRepeat(FixedPattern, StructuredPatternInterface):
+    __slots__ = ("_n", "_child")
+
     def __init__(self, n:int, child:FixedPattern = None, address:Address = None):
         super(StructuredPatternInterface, self).__init__()
         self._n = int(n)
@@ -277,6 +493,7 @@ class FixedRepeat(FixedPattern, StructuredPatternInterface):
         size = Size()
         if child is not None:
             size = child.get_size()*self._n
+            child.set_parent(self)
         super().__init__(size, address)
 
     def get_child(self):
@@ -289,7 +506,9 @@ class FixedRepeat(FixedPattern, StructuredPatternInterface):
         if not isinstance(child, FixedPattern):
             raise TypeError("Cannot add a variable-sized pattern to a fixed one.")
         self._child = child
+        child.set_parent(self)
         self._size = child.get_size()*self._n
+        self.invalidate()
 
     def get_n(self):
         return self._n
@@ -297,9 +516,17 @@ class FixedRepeat(FixedPattern, StructuredPatternInterface):
     def update(self):
         if self._child:
             self._size = self._child.get_size() * self._n
+            self.invalidate()
+
+    def hash_into(self, digest):
+        super().hash_into(digest)
+        digest.update(repr(self._n).encode())
+        hash_child(digest, self._child)
 
 
 class ElementPattern(FixedPattern, StructuredPatternInterface):
+    __slots__ = ("_children",)
+
     def __init__(self, address: Address = None):
         super().__init__(Size(0), address)
         self._children = []
@@ -316,22 +543,30 @@ class ElementPattern(FixedPattern, StructuredPatternInterface):
     def add(self, child: FixedPattern):
         if not isinstance(child, FixedPattern):
             raise TypeError("Cannot add a variable-sized pattern to a fixed one.")
-        offset = Address(0)
-        if len(self._children):
-            offset = self._children[-1].get_address() + self._children[-1].get_size()
+        # Children are contiguous, hence the next offset is the current size.
+        child.set_parent(self)
+        child.set_address(Address.from_bits(self._size.bits()))
         self._children.append(child)
-        child.set_address(offset)
         self._size = self._size + child.get_size()
+        self.invalidate()
 
     def update(self):
-        offset, size = Address(0), Size(0)
+        offset = 0
         for child in self._children:
-            child.set_address(offset)
-            offset = offset + child.get_size()
-            size   = size + child.get_size()
-        self._size = size
+            child.set_address(Address.from_bits(offset))
+            offset += child.get_size().bits()
+        self._size = Size.from_bits(offset)
+        self.invalidate()
+
+    def hash_into(self, digest):
+        super().hash_into(digest)
+        for child in self._children:
+            hash_child(digest, child)
+
 
 class UnionPattern(FixedPattern, StructuredPatternInterface):
+    __slots__ = ("_children",)
+
     def __init__(self, address: Address = None):
         super().__init__(Size(0), address)
         self._children = []
@@ -349,19 +584,29 @@ class UnionPattern(FixedPattern, StructuredPatternInterface):
         if not isinstance(child, FixedPattern):
             raise TypeError("Cannot add a variable-sized pattern to a fixed one.")
         self._children.append(child)
-        child.set_address(Address(0))
+        child.set_parent(self)
+        child.set_address(Address.from_bits(0))
         if self._size <= child.get_size():
             self._size = child.get_size()
+        self.invalidate()
 
     def update(self):
-        size = Size(0)
+        size = Size.from_bits(0)
         for child in self._children:
             if size <= child.get_size():
-                size = Size(0) + child.get_size()
+                size = child.get_size()
         self._size = size
+        self.invalidate()
+
+    def hash_into(self, digest):
+        super().hash_into(digest)
+        for child in self._children:
+            hash_child(digest, child)
 
 
 class FieldPattern(FixedPattern):
+    __slots__ = ()
+
     def __init__(self, size:Size = Size(), address:Address = None):
         super().__init__(size, address)
 
@@ -370,6 +615,8 @@ class FieldPattern(FixedPattern):
 
 
 class EnumValue(MetaInformation):
+    __slots__ = ("_value",)
+
     def __init__(self, value: int):
         super().__init__()
         self._value = int(value)
@@ -378,8 +625,14 @@ class EnumValue(MetaInformation):
     def value(self):
         return self._value
 
+    def hash_into(self, digest):
+        super().hash_into(digest)
+        digest.update(repr(self._value).encode())
+
 
 class EnumPattern(FieldPattern):
+    __slots__ = ("_default", "_items")
+
     def __init__(self, width: Size, default: int = None, address: Address = None):
         super().__init__(width, address)
         self._default = default
@@ -396,6 +649,8 @@ class EnumPattern(FieldPattern):
 
     def add(self, item: EnumValue):
         self._items.append(item)
+        item.set_owner(self)
+        self.invalidate()
 
     def has_default_value(self):
         return self._default is not None
@@ -403,6 +658,12 @@ class EnumPattern(FieldPattern):
     def get_default_value(self):
         return self._default
 
+    def hash_into(self, digest):
+        super().hash_into(digest)
+        digest.update(repr(self._default).encode())
+        for item in self._items:
+            item.hash_into(digest)
+
 
 class IntegerPattern(FieldPattern):
     UNSIGNED = 0
@@ -411,6 +672,8 @@ class IntegerPattern(FieldPattern):
     LITTLE = 0
     BIG = 1
 
+    __slots__ = ("_format", "_endian", "_range", "_default")
+
     def __init__(self, width:Size, format, endian, min = None, max = None, default = None, address: Address = None):
         super().__init__(width, address)
         self._format = format
@@ -453,11 +716,17 @@ class IntegerPattern(FieldPattern):
     def get_range(self):
         return self._range
 
+    def hash_into(self, digest):
+        super().hash_into(digest)
+        digest.update(repr((self._format, self._endian, self._range, self._default)).encode())
+
 
 class StringPattern(FieldPattern):
     ASCII = 0
     UNICODE = 1
 
+    __slots__ = ("_max_chars", "_format", "_fill")
+
     def __init__(self, maxchars:int, format:int, fill:int=0, address:Address = None):
         width = 1 if StringPattern.ASCII == format else 2
         super().__init__(Size(maxchars*width,0), address)
@@ -474,8 +743,14 @@ class StringPattern(FieldPattern):
     def get_chars(self):
         return self._max_chars
 
+    def hash_into(self, digest):
+        super().hash_into(digest)
+        digest.update(repr((self._max_chars, self._format, self._fill)).encode())
+
 
 class UnusedDataPattern(FieldPattern):
+    __slots__ = ("_data",)
+
     def __init__(self, data: bytearray = b"", size: Size = Size(), address: Address = None):
         super().__init__(size, address)
         self._data:bytearray = data
@@ -485,26 +760,45 @@ class UnusedDataPattern(FieldPattern):
 
     def add(self, data: bytearray):
         self._data += data
+        self.invalidate()
+
+    def hash_into(self, digest):
+        super().hash_into(digest)
+        digest.update(bytes(self._data))
 
 
 class UnknownDataPattern(FieldPattern):
+    __slots__ = ()
+
     def __init__(self, size: Size = Size(), address: Address = None):
         super().__init__(size, address)
 
 
+def address_bits(pattern: AbstractPattern) -> int:
+    return pattern.get_address().bits()
+
+
 class Codeplug(StructuredPatternInterface):
+    __slots__ = ("_meta", "_elements", "_deferred", "_hash")
+
     def __init__(self):
         super(StructuredPatternInterface, self).__init__()
-        self._meta = MetaInformation()
+        self._meta = MetaInformation(self)
         self._elements = []
+        self._deferred = False
+        self._hash = None
 
     def __len__(self):
         return len(self._elements)
 
     def __getitem__(self, item) -> AbstractPattern:
+        if self._deferred:
+            self.finalize()
         return self._elements[item]
 
     def __iter__(self):
+        if self._deferred:
+            self.finalize()
         return iter(self._elements)
 
     def add(self, pattern: AbstractPattern):
@@ -512,9 +806,38 @@ class Codeplug(StructuredPatternInterface):
             raise TypeError("Can only add AbstractPattern to codeplug.")
         if not pattern.has_address():
             raise ValueError("Pattern needs an address.")
-        self._elements.append(pattern)
-        self._elements.sort(key=lambda e: e.get_address().bits())
+        pattern.set_parent(self)
+        if self._deferred:
+            self._elements.append(pattern)
+        else:
+            insort(self._elements, pattern, key=address_bits)
+        self.invalidate()
+
+    def defer_sort(self):
+        """ Subsequently added elements are appended and sorted once by finalize(), or on first access. """
+        self._deferred = True
+
+    def finalize(self):
+        if self._deferred:
+            self._elements.sort(key=address_bits)
+            self._deferred = False
 
     def meta(self):
         return self._meta
 
+    def get_parent(self):
+        return None
+
+    def invalidate(self):
+        self._hash = None
+
+    def get_fingerprint(self) -> bytes:
+        """ Structural hash of the entire codeplug, see AbstractPattern.get_fingerprint. """
+        if self._hash is None:
+            self.finalize()
+            digest = blake2b(digest_size=16)
+            self._meta.hash_into(digest)
+            for pattern in self._elements:
+                hash_child(digest, pattern)
+            self._hash = digest.digest()
+        return self._hash
@@ -2,6 +2,11 @@ from cpdgen.pattern import AbstractPattern, MetaInformation, Size, Address, Code
     SparseRepeat, StructuredPatternInterface, ElementPattern, UnionPattern, IntegerPattern, StringPattern, EnumPattern, \
     EnumValue, UnusedDataPattern, UnknownDataPattern
 from xml.sax.handler import ContentHandler
+from xml.sax import parseString, SAXParseException
+try:
+    from xml.parsers import expat
+except ImportError:
+    expat = None
 
 
 class PatternHandler(ContentHandler):
@@ -27,20 +32,43 @@ class PatternHandler(ContentHandler):
 
     def startDocument(self):
         self._stack.clear()
-        self._stack.append(Codeplug())
+        codeplug = Codeplug()
+        codeplug.defer_sort()
+        self._stack.append(codeplug)
         super().startDocument()
 
     def endDocument(self):
         assert 1 == len(self._stack)
+        self._stack[-1].finalize()
         super().endDocument()
 
+    # Dispatch tables, mapping tag names to the start and end methods. These are populated once per
+    # class, as tags are encountered.
+    _startMethods = {}
+    _endMethods = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._startMethods, cls._endMethods = {}, {}
+
+    @classmethod
+    def resolve(cls, name: str):
+        normalized = cls.normalizeName(name)
+        start = cls._startMethods[name] = getattr(cls, "start{}Element".format(normalized))
+        end = cls._endMethods[name] = getattr(cls, "end{}Element".format(normalized))
+        return start, end
+
     def startElement(self, name:str, attrs):
-        meth = getattr(self, "start{}Element".format(PatternHandler.normalizeName(name)))
-        meth(attrs)
+        meth = self._startMethods.get(name)
+        if meth is None:
+            meth, _ = self.resolve(name)
+        meth(self, attrs)
 
     def endElement(self, name:str):
-        meth = getattr(self, "end{}Element".format(PatternHandler.normalizeName(name)))
-        meth()
+        meth = self._endMethods.get(name)
+        if meth is None:
+            _, meth = self.resolve(name)
+        meth(self)
 
     def characters(self, content):
         if isinstance(self._stack[-1], UnusedDataPattern):
@@ -256,3 +284,61 @@ class PatternHandler(ContentHandler):
     def endUnknownElement(self):
         pattern = self._stack.pop()
         self._stack[-1].add(pattern)
+
+
+def parse_codeplug_sax(content: bytes) -> Codeplug:
+    handler = PatternHandler()
+    parseString(content, handler)
+    return handler.pop()
+
+
+def parse_codeplug_expat(content: bytes) -> Codeplug:
+    """ Drives the PatternHandler directly from expat, skipping the SAX driver layer. Text is buffered by
+        expat, such that character data is passed in one piece. """
+    handler = PatternHandler()
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    # Attributes are kept as the dict built by expat. The start handlers look attributes up by name, and
+    # pairing the flat lists of ordered_attributes in Python is slower than expat building the dict in C.
+    parser.ordered_attributes = False
+    parser.buffer_size = 1 << 16
+    parser.StartElementHandler = handler.startElement
+    parser.EndElementHandler = handler.endElement
+    parser.CharacterDataHandler = handler.characters
+    handler.startDocument()
+    parser.Parse(content, True)
+    handler.endDocument()
+    return handler.pop()
+
+
+PARSERS = ("expat", "sax")
+PARSE_ERRORS = (SAXParseException, expat.ExpatError) if expat is not None else (SAXParseException,)
+
+
+def load_codeplug(filepath: str, cache=None, parser: str = "expat", content: bytes = None) -> Codeplug|None:
+    """ Parses the codeplug definition at the given path. Returns None if the file is not a valid
+        codeplug definition. If a CodeplugCache is given, it is consulted first. The parser is either
+        "expat" or "sax", where the former falls back to the latter if expat is not available. If the
+        content of the file has already been read, it can be passed along. This is a module-level
+        function, such that it can be dispatched to worker processes. """
+    if parser not in PARSERS:
+        raise ValueError("Unknown parser '{}', expected one of {}.".format(parser, ", ".join(PARSERS)))
+    if content is None:
+        with open(filepath, "rb") as file:
+            content = file.read()
+    key = None
+    if cache is not None:
+        key = cache.key(filepath, content)
+        codeplug = cache.get(key)
+        if codeplug is not None:
+            return codeplug
+    try:
+        if "expat" == parser and expat is not None:
+            codeplug = parse_codeplug_expat(content)
+        else:
+            codeplug = parse_codeplug_sax(content)
+    except PARSE_ERRORS:
+        return None
+    if cache is not None:
+        cache.put(key, codeplug)
+    return codeplug
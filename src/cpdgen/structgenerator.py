@@ -0,0 +1,206 @@
+import ctypes
+import re
+from cpdgen.pattern import AbstractPattern, Codeplug, SparseRepeat, BlockRepeat, FixedRepeat, ElementPattern, \
+    FieldPattern, IntegerPattern, EnumPattern, StringPattern, address_bits
+from cpdgen.layout import repeat_limit, repeat_stride, pattern_size, unique_keys, child_limit, top_level_limits
+
+
+UNSIGNED_TYPES = {1: ctypes.c_uint8, 2: ctypes.c_uint16, 4: ctypes.c_uint32, 8: ctypes.c_uint64}
+SIGNED_TYPES = {1: ctypes.c_int8, 2: ctypes.c_int16, 4: ctypes.c_int32, 8: ctypes.c_int64}
+
+
+def identifier(key: str) -> str:
+    """ Turns a pattern key into a valid Python identifier, e.g., 'Radio ID' into 'radio_id'. """
+    name = re.sub(r"\W+", "_", key.lower()).strip("_") or "field"
+    return "_" + name if name[0].isdigit() else name
+
+
+def class_name(key: str) -> str:
+    return "".join(part.capitalize() for part in identifier(key).split("_")) or "Struct"
+
+
+def identifiers(keys) -> list[str]:
+    """ Identifiers of the given sibling keys, where duplicates get numbered. """
+    names, seen = [], {}
+    for key in keys:
+        name = identifier(key)
+        if name in seen:
+            seen[name] += 1
+            name = "{}_{}".format(name, seen[name])
+        else:
+            seen[name] = 1
+        names.append(name)
+    return names
+
+
+def prefers_big_endian(pattern: AbstractPattern) -> bool:
+    """ Structures have a single byte order. Picks the one of the majority of multi-byte integers. """
+    counts = [0, 0]
+
+    def count(p):
+        if isinstance(p, IntegerPattern) and IntegerPattern.BCD != p.get_format() and p.get_size().bits() > 8:
+            counts[IntegerPattern.BIG == p.get_endian()] += 1
+        elif isinstance(p, ElementPattern):
+            for child in p:
+                count(child)
+        elif isinstance(p, (SparseRepeat, BlockRepeat, FixedRepeat)):
+            count(p.get_child())
+    count(pattern)
+    return counts[1] > counts[0]
+
+
+def field_type(pattern: AbstractPattern, big_endian: bool, key: str, limit: int|None = None):
+    """ C type of a byte-aligned field, whose size is a multiple of bytes. Fields without a C equivalent,
+        like BCD numbers, unions, integers of the other byte order or unusual widths, are byte arrays. The
+        limit bounds unbounded repeats. """
+    if isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+        return repeat_type(pattern, big_endian, limit)
+    n = pattern_size(pattern) >> 3
+    raw = ctypes.c_uint8 * n
+    if isinstance(pattern, IntegerPattern):
+        if IntegerPattern.BCD == pattern.get_format() or n not in UNSIGNED_TYPES:
+            return raw
+        if n > 1 and big_endian != (IntegerPattern.BIG == pattern.get_endian()):
+            return raw
+        return (SIGNED_TYPES if IntegerPattern.SIGNED == pattern.get_format() else UNSIGNED_TYPES)[n]
+    if isinstance(pattern, EnumPattern):
+        # Enums are little endian, see ENUM_ENDIAN
+        return UNSIGNED_TYPES[n] if n in UNSIGNED_TYPES and (1 == n or not big_endian) else raw
+    if isinstance(pattern, StringPattern):
+        return ctypes.c_char * n if StringPattern.ASCII == pattern.get_format() else raw
+    if isinstance(pattern, ElementPattern):
+        try:
+            return compile_struct(pattern, big_endian, key)
+        except ValueError:
+            return raw
+    return raw
+
+
+def repeat_type(pattern: SparseRepeat|BlockRepeat|FixedRepeat, big_endian: bool, limit: int|None):
+    """ Array type of a repeat. Sparse repeats with gaps between repetitions are byte arrays. Returns None
+        for unbounded repeats without limit. """
+    count, child = repeat_limit(pattern, limit), pattern.get_child()
+    if count is None:
+        return None
+    stride, size = repeat_stride(pattern), pattern_size(child)
+    if stride == size and 0 == size % 8:
+        ctype = field_type(child, big_endian, unique_keys([child])[0], child_limit(pattern))
+        if ctype is not None:
+            return ctype * count
+    return ctypes.c_uint8 * (((count - 1)*stride + size) >> 3)
+
+
+def bit_fields(group: list, start: int, end: int, big_endian: bool, prefix: str) -> list:
+    """ Bit-fields of the given sub-byte fields, spanning the bytes from start to end. Bits are counted from
+        the most significant bit, like ctypes does for big-endian structures. Little-endian structures
+        allocate bit-fields from the least significant bit, hence fields are reversed per byte there. Groups
+        that cannot be expressed are a byte array. """
+    n = (end - start) >> 3
+    fields, pos = [], start
+    for name, bits, size, signed in group:
+        if bits > pos:
+            fields.append(("_pad_{:x}_{}".format(pos >> 3, pos % 8), bits - pos, False))
+        fields.append((name, size, signed))
+        pos = bits + size
+    if pos < end:
+        fields.append(("_pad_{:x}_{}".format(pos >> 3, pos % 8), end - pos, False))
+    if big_endian and n in UNSIGNED_TYPES:
+        return [(name, (SIGNED_TYPES if signed else UNSIGNED_TYPES)[n], size) for name, size, signed in fields]
+    # Split into bytes, fields must not cross byte boundaries
+    result, byte, offset = [], [], 0
+    for name, size, signed in fields:
+        if offset % 8 + size > 8:
+            return [(prefix, ctypes.c_uint8 * n)]
+        byte.append((name, ctypes.c_int8 if signed else ctypes.c_uint8, size))
+        offset += size
+        if 0 == offset % 8:
+            result.extend(byte if big_endian else reversed(byte))
+            byte = []
+    return result
+
+
+def compile_struct(pattern: ElementPattern, big_endian: bool = None, key: str = None):
+    """ Compiles the given element into a ctypes structure class with the exact layout of the element. Fields
+        are named by their keys, turned into identifiers. Sub-byte fields become bit-fields, ASCII strings
+        char arrays and repeats arrays. Gaps are filled with padding. Raises a ValueError if the element is
+        not a multiple of bytes or has overlapping fields. """
+    size = pattern_size(pattern)
+    if size % 8:
+        raise ValueError("Element '{}' is not a multiple of bytes.".format(key))
+    if big_endian is None:
+        big_endian = prefers_big_endian(pattern)
+    children = sorted(zip(identifiers(unique_keys(pattern)), unique_keys(pattern), pattern),
+                      key=lambda item: address_bits(item[2]))
+    fields, group, pos = [], [], 0
+    for name, child_key, child in children:
+        bits, child_size = address_bits(child), pattern_size(child)
+        if bits < pos:
+            raise ValueError("Field '{}' of element '{}' overlaps.".format(child_key, key))
+        if group and bits >= ((pos + 7) & ~7):
+            end = (pos + 7) & ~7
+            fields.extend(bit_fields(group, group[0][1] & ~7, end, big_endian, "_bits_{:x}".format(end >> 3)))
+            group = []
+            pos = end
+        if not group and bits > pos:
+            aligned = bits & ~7
+            if aligned > pos:
+                fields.append(("_pad_{:x}".format(pos >> 3), ctypes.c_uint8 * ((aligned - pos) >> 3)))
+                pos = aligned
+        if group or bits % 8 or child_size % 8:
+            if isinstance(child, FieldPattern) and not isinstance(child, StringPattern) and child_size <= 64:
+                signed = isinstance(child, IntegerPattern) and IntegerPattern.SIGNED == child.get_format()
+                group.append((name, bits, child_size, signed))
+                pos = bits + child_size
+                continue
+            raise ValueError("Field '{}' of element '{}' is not byte-aligned.".format(child_key, key))
+        fields.append((name, field_type(child, big_endian, child_key)))
+        pos = bits + child_size
+    if group:
+        end = (pos + 7) & ~7
+        fields.extend(bit_fields(group, group[0][1] & ~7, end, big_endian, "_bits_{:x}".format(end >> 3)))
+        pos = end
+    if pos < size:
+        fields.append(("_pad_{:x}".format(pos >> 3), ctypes.c_uint8 * ((size - pos) >> 3)))
+    base = ctypes.BigEndianStructure if big_endian else ctypes.LittleEndianStructure
+    struct = type(class_name(key or pattern.meta().get_name() or "Element"), (base,),
+                  {"_pack_": 1, "_fields_": fields})
+    if ctypes.sizeof(struct) != size >> 3:
+        raise ValueError("Layout of element '{}' cannot be expressed as structure.".format(key))
+    return struct
+
+
+class StructGenerator:
+    """ Generates ctypes types for the top-level elements and repeats of a codeplug with fixed layout. The
+        types can be overlaid onto images via from_buffer(), giving direct access to the fields without
+        decoding. Repeats have their maximum number of repetitions, unbounded repeats extend up to the next
+        top-level element. The last one is skipped, as its length depends on the image. """
+
+    def __init__(self, codeplug: Codeplug):
+        self._codeplug = codeplug
+        self._types = {}
+        for key, pattern, limit in zip(unique_keys(codeplug), codeplug, top_level_limits(codeplug)):
+            if address_bits(pattern) % 8 or pattern_size(pattern) % 8:
+                continue
+            if isinstance(pattern, ElementPattern):
+                try:
+                    self._types[key] = (address_bits(pattern) >> 3, compile_struct(pattern, key=key))
+                except ValueError:
+                    continue
+            elif isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+                ctype = repeat_type(pattern, prefers_big_endian(pattern), limit)
+                # Skip repeats, that are just bytes
+                if ctype is not None and ctypes.c_uint8 != ctype._type_:
+                    self._types[key] = (address_bits(pattern) >> 3, ctype)
+
+    def get_codeplug(self) -> Codeplug:
+        return self._codeplug
+
+    def types(self) -> dict[str, type]:
+        """ The generated types, by the key of the top-level pattern. """
+        return {key: ctype for key, (_, ctype) in self._types.items()}
+
+    def overlay(self, buf) -> dict:
+        """ Overlays the generated types onto the image, without copying. The image must be writable, e.g., a
+            bytearray or a writable mmap. Elements not contained in the image are omitted. """
+        return {key: ctype.from_buffer(buf, offset) for key, (offset, ctype) in self._types.items()
+                if offset + ctypes.sizeof(ctype) <= len(buf)}
@@ -0,0 +1,207 @@
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from cpdgen.pattern import AbstractPattern, Address, Codeplug, SparseRepeat, BlockRepeat, FixedRepeat, \
+    ElementPattern, UnionPattern, IntegerPattern, EnumPattern, StringPattern, address_bits
+from cpdgen.layout import repeat_limit, repeat_stride, pattern_size, unique_keys, child_limit, repetitions, \
+    top_level_limits
+from cpdgen.decoder import compile_reader, bytes_reader, shift_phase, minimum_size, ENUM_ENDIAN
+from cpdgen.imageview import map_image
+
+
+class Violation:
+    """ A field of an image violating a constraint of its pattern. """
+
+    __slots__ = ("_bits", "_path", "_message")
+
+    def __init__(self, bits: int, path: tuple, message: str):
+        self._bits = bits
+        self._path = path
+        self._message = message
+
+    def __str__(self):
+        return "{} {}: {}".format(self.get_address(), self.get_path(), self._message)
+
+    def get_address(self) -> Address:
+        return Address.from_bits(self._bits)
+
+    def get_path(self) -> str:
+        return ".".join(self._path)
+
+    def get_message(self) -> str:
+        return self._message
+
+
+def integer_checker(pattern: IntegerPattern, phase: int|None):
+    lower, upper = pattern.get_range()
+    bcd = IntegerPattern.BCD == pattern.get_format()
+    if lower is None and upper is None and not bcd:
+        return None
+    read = compile_reader(pattern, phase)
+    lower = lower if lower is not None else -float("inf")
+    upper = upper if upper is not None else float("inf")
+
+    def check(buf, bits, path, out):
+        value = read(buf, bits)
+        if value is None:
+            out.append(Violation(bits, path, "invalid BCD digits"))
+        elif not lower <= value <= upper:
+            out.append(Violation(bits, path, "value {} out of range [{}, {}]".format(
+                value, *pattern.get_range())))
+    return check
+
+
+def enum_checker(pattern: EnumPattern, phase: int|None):
+    if not len(pattern):
+        return None
+    read = compile_reader(IntegerPattern(pattern.get_size(), IntegerPattern.UNSIGNED, ENUM_ENDIAN), phase)
+    values = frozenset(item.value for item in pattern)
+
+    def check(buf, bits, path, out):
+        value = read(buf, bits)
+        if value not in values:
+            out.append(Violation(bits, path, "value {} is not an enum item".format(value)))
+    return check
+
+
+def string_checker(pattern: StringPattern, phase: int|None):
+    """ Checks, that the string is only followed by fill characters. """
+    raw = bytes_reader(pattern.get_size().bits(), 0 == phase)
+    if StringPattern.UNICODE == pattern.get_format():
+        fill, step = pattern.get_fill().to_bytes(2, "little"), 2
+    else:
+        fill, step = bytes([pattern.get_fill() & 0xff]), 1
+
+    def check(buf, bits, path, out):
+        data = raw(buf, bits)
+        index = data.find(fill)
+        while index >= 0 and index % step:
+            index = data.find(fill, index + 1)
+        if index >= 0 and data[index:] != fill*((len(data) - index)//step):
+            out.append(Violation(bits, path, "characters after fill"))
+    return check
+
+
+def record_checker(pattern: ElementPattern|UnionPattern, phase: int|None, skip_empty: bool):
+    ops = []
+    for key, child in zip(unique_keys(pattern), pattern):
+        checker = compile_checker(child, shift_phase(phase, address_bits(child)), skip_empty)
+        if checker is not None:
+            ops.append((key, address_bits(child), checker))
+    if not ops:
+        return None
+
+    def check(buf, bits, path, out):
+        for key, offset, checker in ops:
+            checker(buf, bits + offset, path + (key,), out)
+    return check
+
+
+def repeat_checker(pattern: SparseRepeat|BlockRepeat|FixedRepeat, phase: int|None, skip_empty: bool,
+                   limit: int|None):
+    """ Checks all repetitions contained in the image. Erased repetitions (all 00h or FFh) are skipped. """
+    child = pattern.get_child()
+    count, stride, size = repeat_limit(pattern, limit), repeat_stride(pattern), pattern_size(child)
+    checker = compile_checker(child, phase if 0 == stride % 8 else None, skip_empty, child_limit(pattern))
+    if checker is None:
+        return None
+    key = unique_keys([child])[0]
+    nbytes = size >> 3
+    empty = (bytes(nbytes), b"\xff"*nbytes)
+    skip = skip_empty and 0 == phase and 0 == stride % 8 and 0 == size % 8
+
+    def check(buf, bits, path, out):
+        prefix = path[:-1]
+        for i in range(repetitions(count, stride, size, len(buf)*8 - bits)):
+            offset = bits + i*stride
+            if skip and buf[offset >> 3:(offset >> 3) + nbytes] in empty:
+                continue
+            checker(buf, offset, prefix + ("{}[{}]".format(path[-1], i), key), out)
+    return check
+
+
+def compile_checker(pattern: AbstractPattern, phase: int|None = 0, skip_empty: bool = True, limit: int|None = None):
+    """ Compiles the constraints of the pattern into a checker function taking the image, the absolute bit
+        offset, the path of the pattern and the list of violations to extend. Returns None, if there is
+        nothing to check. """
+    if isinstance(pattern, IntegerPattern):
+        return integer_checker(pattern, phase)
+    if isinstance(pattern, EnumPattern):
+        return enum_checker(pattern, phase)
+    if isinstance(pattern, StringPattern):
+        return string_checker(pattern, phase)
+    if isinstance(pattern, (ElementPattern, UnionPattern)):
+        return record_checker(pattern, phase, skip_empty)
+    if isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+        return repeat_checker(pattern, phase, skip_empty, limit)
+    return None
+
+
+class Validator:
+    """ Validates images against the constraints of a codeplug: integer ranges, enum items, BCD digits and
+        string fill. The constraints are compiled once into a plan of checker closures, fields without
+        constraints are dropped from the plan. """
+
+    def __init__(self, codeplug: Codeplug, skip_empty: bool = True):
+        self._codeplug = codeplug
+        self._plan = []
+        for key, pattern, limit in zip(unique_keys(codeplug), codeplug, top_level_limits(codeplug)):
+            checker = compile_checker(pattern, address_bits(pattern) % 8, skip_empty, limit)
+            if checker is not None:
+                self._plan.append((key, address_bits(pattern), minimum_size(pattern), checker))
+
+    def get_codeplug(self) -> Codeplug:
+        return self._codeplug
+
+    def validate(self, image: bytes|bytearray|memoryview) -> list[Violation]:
+        violations, length = [], len(image)*8
+        for key, offset, size, checker in self._plan:
+            if offset + size <= length:
+                checker(image, offset, (key,), violations)
+        return violations
+
+    def validate_file(self, filename: str) -> list[Violation]:
+        image = map_image(filename)
+        buf = memoryview(image)
+        try:
+            return self.validate(buf)
+        finally:
+            buf.release()
+            if isinstance(image, mmap.mmap):
+                image.close()
+
+
+def image_files(paths) -> list[str]:
+    """ Expands directories into the files they contain. """
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(sorted(entry.path for entry in os.scandir(path) if entry.is_file()))
+        else:
+            filenames.append(path)
+    return filenames
+
+
+# Validator of the worker processes, created once per process.
+worker_validator = None
+
+
+def init_worker(codeplug: Codeplug, skip_empty: bool):
+    global worker_validator
+    worker_validator = Validator(codeplug, skip_empty)
+
+
+def validate_worker(filename: str) -> list[Violation]:
+    return worker_validator.validate_file(filename)
+
+
+def validate_files(codeplug: Codeplug, filenames: list[str], jobs: int = 1, skip_empty: bool = True):
+    """ Validates the given image files, using the given number of worker processes. Yields each filename
+        together with its violations, in order. """
+    if jobs <= 1 or len(filenames) <= 1:
+        validator = Validator(codeplug, skip_empty)
+        for filename in filenames:
+            yield filename, validator.validate_file(filename)
+        return
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(codeplug, skip_empty)) as executor:
+        yield from zip(filenames, executor.map(validate_worker, filenames, chunksize=4))
@@ -0,0 +1,56 @@
+import os.path
+import unittest
+from cpdgen.patternparser import load_codeplug
+from cpdgen.addressindex import AddressIndex
+from cpdgen.pattern import Address, Size, IntegerPattern, EnumPattern
+
+
+class AddressIndexTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def setUp(self) -> None:
+        self._cp = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        self._index = AddressIndex(self._cp)
+
+    def test_lookup_field(self):
+        matches = self._index.lookup(Address(0x1000 + 3*0x100 + 2*0x10 + 9))
+        self.assertEqual(len(matches), 1)
+        match = matches[0]
+        self.assertTrue(isinstance(match.get_pattern(), IntegerPattern))
+        self.assertEqual(match.get_pattern().meta().get_name(), "RX Frequency")
+        self.assertEqual(match.get_indices(), (3, 2))
+        self.assertEqual(match.get_address(), Address(0x1000 + 3*0x100 + 2*0x10 + 8))
+        self.assertEqual(match.format_path(), "Channel Banks[3].Channel Bank[2].Channel Element.RX Frequency")
+
+    def test_lookup_bits(self):
+        match, = self._index.lookup(Address(3, 5))
+        self.assertTrue(isinstance(match.get_pattern(), EnumPattern))
+        self.assertEqual(match.get_address(), Address(3, 7))
+        match, = self._index.lookup(Address(3, 3))
+        self.assertEqual(match.get_pattern().meta().get_name(), "Beep")
+
+    def test_lookup_unmapped(self):
+        self.assertEqual(self._index.lookup(Address(0x10)), [])
+        self.assertEqual(self._index.lookup(Address(0x1000 + 128*0x100)), [])
+
+    def test_unbounded(self):
+        index = AddressIndex(load_codeplug(os.path.join(self._pwd, "unbounded_codeplug.xml")))
+        match, = index.lookup_bits(0x130*8)
+        self.assertEqual(match.format_path(), "Entries[3].Entry.Value")
+        # Unbounded repeats end at the next top-level element, the last one never ends
+        self.assertEqual(index.lookup(Address(0x170))[0].get_indices(), (7,))
+        self.assertEqual(index.lookup(Address(0x180))[0].format_path(), "Header.Count")
+        self.assertEqual(index.lookup(Address(0x10200))[0].get_indices(), (0x1000,))
+
+    def test_query(self):
+        matches = list(self._index.query(Address(0x1000 + 0x100 - 0x8), Size(0x10)))
+        self.assertEqual([m.get_indices() for m in matches], [(0, 15), (0, 15), (1, 0)])
+        self.assertEqual([m.get_pattern().meta().get_name() for m in matches],
+                         ["RX Frequency", "TX Frequency", "Channel name"])
+        self.assertEqual(len(list(self._index.query(Address(0), Size(5)))), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
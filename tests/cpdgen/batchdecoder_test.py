@@ -0,0 +1,136 @@
+import os.path
+import unittest
+from cpdgen.patternparser import load_codeplug, parse_codeplug_expat
+from cpdgen.decoder import Decoder
+from cpdgen.pattern import Address
+from fixtures import example_image, UNALIGNED_CODEPLUG
+
+try:
+    import numpy
+    from cpdgen.batchdecoder import BatchDecoder
+except ImportError:
+    numpy = None
+
+
+FIXED_CODEPLUG = b"""<?xml version="1.0" encoding="UTF-8"?>
+<codeplug>
+  <repeat at="10h" n="4">
+    <meta><name>Zones</name></meta>
+    <element>
+      <meta><name>Zone</name></meta>
+      <string format="ascii" width="6" pad="32"><meta><name>Name</name></meta></string>
+      <int width="2h" format="signed" endian="big"><meta><name>Offset</name></meta></int>
+      <int width="0:5" format="signed" endian="little"><meta><name>Delta</name></meta></int>
+      <int width="0:3" format="unsigned" endian="little"><meta><name>Flags</name></meta></int>
+      <unused width="1h">00</unused>
+    </element>
+  </repeat>
+</codeplug>
+"""
+
+PADDED_CODEPLUG = b"""<?xml version="1.0" encoding="UTF-8"?>
+<codeplug>
+  <element at="0h">
+    <meta><name>Names</name></meta>
+    <string format="ascii" width="6" pad="32"><meta><name>Name</name></meta></string>
+    <string format="unicode" width="3" pad="32"><meta><name>Label</name></meta></string>
+    <string format="ascii" width="4"><meta><name>Plain</name></meta></string>
+  </element>
+</codeplug>
+"""
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class BatchDecoderTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def test_element(self):
+        codeplug = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        images = [example_image(0x10), bytearray(0x10)]
+        result = BatchDecoder(codeplug[0]).decode(images)
+        self.assertEqual(result.shape, (2,))
+        self.assertEqual(list(result["Radio ID"]), [0x123456, 0])
+        self.assertEqual(list(result["Power"]), ["High", "Low"])
+        self.assertEqual(list(result["Beep"]), [1, 0])
+        self.assertNotIn("UnknownDataPattern at 3h:2", result.dtype.names)
+
+    def test_bcd(self):
+        codeplug = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        channel = codeplug[1].get_child().get_child()
+        images = [example_image(), example_image()]
+        images[1][0x1128:0x112c] = b"\xff\xff\xff\xff"
+        result = BatchDecoder(channel).decode(images, Address(0x1120))
+        self.assertEqual(list(result["Channel name"]), ["Test", "Test"])
+        self.assertEqual(result["RX Frequency"][0], 43812500)
+        self.assertTrue(numpy.isnan(result["RX Frequency"][1]))
+        self.assertEqual(list(result["TX Frequency"]), [44812500, 44812500])
+
+    def test_matches_decoder(self):
+        codeplug = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        images = [example_image(), example_image(), example_image()]
+        images[1][3] = 0xf0
+        images[2][0x1120:0x1130] = b"\xff"*16
+        decoder = Decoder(codeplug)
+        for pattern, address in ((codeplug[0], Address(0)), (codeplug[1].get_child().get_child(), Address(0x1120))):
+            result = BatchDecoder(pattern).decode(images, address)
+            for image, row in zip(images, result):
+                values = decoder.decode(image)
+                values = values["Settings"] if 0 == address.bits() else values["Channel Banks"][1][2]
+                for name in result.dtype.names:
+                    if values[name] is None:
+                        self.assertTrue(numpy.isnan(row[name]))
+                    else:
+                        self.assertEqual(values[name], row[name])
+        self.assertEqual(BatchDecoder(codeplug[0]).decode(images)["Power"][1], 15)
+
+    def test_fixed_repeat(self):
+        codeplug = parse_codeplug_expat(FIXED_CODEPLUG)
+        images = []
+        for i in range(3):
+            image = bytearray(0x40)
+            image[0x10 + 10*i:0x10 + 10*i + 10] = b"Zone " + bytes([0x30+i, 0xff, 0xfe - i, 0xf5 - 8*i, 0])
+            images.append(bytes(image))
+        decoder = BatchDecoder(codeplug[0])
+        result = decoder.decode(images)
+        self.assertEqual(result.shape, (3, 4))
+        # Compare with the scalar decoder
+        for image, row in zip(images, result):
+            zones = Decoder(codeplug).decode(image)["Zones"]
+            for zone, record in zip(zones, row):
+                self.assertEqual(zone["Name"], record["Name"])
+                self.assertEqual(zone["Offset"], record["Offset"])
+                self.assertEqual(zone["Delta"], record["Delta"])
+                self.assertEqual(zone["Flags"], record["Flags"])
+        self.assertEqual(result[1][1]["Name"], "Zone 1")
+        self.assertEqual(result[1][1]["Offset"], -3)
+
+    def test_string_fill(self):
+        codeplug = parse_codeplug_expat(PADDED_CODEPLUG)
+        images = [b"AB\0   " + "X\0 ".encode("utf-16-le") + b"CD\0\0",
+                  b"\0"*6 + "\0Y ".encode("utf-16-le") + b"\xff\xff\0\0",
+                  b"ABCDEF" + "XYZ".encode("utf-16-le") + b"\0E\0\0"]
+        result = BatchDecoder(codeplug[0]).decode(images)
+        # Only the fill character is stripped, NULs before the padding are kept like by the Decoder
+        for image, row in zip(images, result):
+            values = Decoder(codeplug).decode(image)["Names"]
+            for name in ("Name", "Label", "Plain"):
+                self.assertEqual(values[name], row[name])
+        self.assertEqual((result[0]["Name"], result[0]["Label"]), ("AB\0", "X\0"))
+        self.assertEqual((result[1]["Name"], result[1]["Plain"]), ("\0"*6, "\xff\xff"))
+        self.assertEqual(result[2]["Plain"], "\0E")
+
+    def test_unaligned(self):
+        codeplug = parse_codeplug_expat(UNALIGNED_CODEPLUG)
+        result = BatchDecoder(codeplug[0]).decode([bytes([0x01, 0x23, 0x45, 0x67, 0x89])])
+        self.assertEqual((result[0]["Little"], result[0]["Big"]), (0x3412, 0x5678))
+
+    def test_short_image(self):
+        codeplug = parse_codeplug_expat(FIXED_CODEPLUG)
+        with self.assertRaises(ValueError):
+            BatchDecoder(codeplug[0]).decode([bytes(0x20)])
+
+
+if __name__ == '__main__':
+    unittest.main()
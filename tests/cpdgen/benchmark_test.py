@@ -0,0 +1,247 @@
+import gc
+import logging
+import os
+import time
+import tracemalloc
+import unittest
+from xml.sax import parseString
+from cpdgen.patternparser import PatternHandler, parse_codeplug_sax, parse_codeplug_expat
+from cpdgen.catalogparser import load_catalog
+from cpdgen.pattern import SparseRepeat, BlockRepeat, FixedRepeat, ElementPattern, UnionPattern
+from cpdgen.decoder import Decoder
+from cpdgen.encoder import Encoder
+from cpdgen.differencegenerator import DifferenceGenerator
+from cpdgen.imagediff import ImageDiff
+
+
+# Benchmarks take a while and their time limits depend on the machine, hence they only run if
+# CPDGEN_BENCHMARKS is set. Results are logged, e.g., shown by pytest --log-cli-level=INFO.
+benchmark = unittest.skipUnless(os.environ.get("CPDGEN_BENCHMARKS"), "Set CPDGEN_BENCHMARKS=1 to run benchmarks.")
+log = logging.getLogger(__name__)
+
+
+def synthetic_codeplug(elements: int = 500, fields: int = 16) -> bytes:
+    """ Generates a large synthetic codeplug definition with the given number of top-level elements,
+        each holding the given number of integer fields. """
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<codeplug>',
+             '<meta><name>Synthetic</name><firmware>1.0</firmware></meta>']
+    for i in range(elements):
+        parts.append('<element at="{:x}h"><meta><name>Element {}</name><short-name>E{}</short-name>'
+                     '<description>Element number {}.</description><done/></meta>'.format(i*fields*2, i, i, i))
+        for j in range(fields):
+            parts.append('<int width="2h" format="unsigned" endian="little" min="0" max="1000">'
+                         '<meta><name>Field {}</name></meta></int>'.format(j))
+        parts.append('</element>')
+    parts.append('</codeplug>')
+    return "".join(parts).encode()
+
+
+class LegacyPatternHandler(PatternHandler):
+    """ Resolves the element methods for every event, as done before the dispatch tables. """
+
+    def startElement(self, name:str, attrs):
+        meth = getattr(self, "start{}Element".format(PatternHandler.normalizeName(name)))
+        meth(attrs)
+
+    def endElement(self, name:str):
+        meth = getattr(self, "end{}Element".format(PatternHandler.normalizeName(name)))
+        meth()
+
+
+class CountingHandlerMixin:
+    events = 0
+
+    def startElement(self, name:str, attrs):
+        CountingHandlerMixin.events += 1
+        super().startElement(name, attrs)
+
+    def endElement(self, name:str):
+        CountingHandlerMixin.events += 1
+        super().endElement(name)
+
+
+class CountingPatternHandler(CountingHandlerMixin, PatternHandler):
+    pass
+
+
+def count_events(content: bytes) -> int:
+    CountingHandlerMixin.events = 0
+    parseString(content, CountingPatternHandler())
+    return CountingHandlerMixin.events
+
+
+def measure(content: bytes, handler_class, repeat: int = 3):
+    best, codeplug = None, None
+    for i in range(repeat):
+        handler = handler_class()
+        start = time.perf_counter()
+        parseString(content, handler)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+        codeplug = handler.pop()
+    return best, codeplug
+
+
+@benchmark
+class ParserBenchmark(unittest.TestCase):
+    def test_dispatch(self):
+        content = synthetic_codeplug()
+        events = count_events(content)
+        legacy_time, legacy = measure(content, LegacyPatternHandler)
+        table_time, table = measure(content, PatternHandler)
+        log.info("SAX dispatch: %d events, getattr %.0f events/s, dispatch table %.0f events/s",
+                 events, events/legacy_time, events/table_time)
+        self.assertLess(table_time, legacy_time)
+        self.assertEqual(len(legacy), len(table))
+        for a, b in zip(legacy, table):
+            self.assertEqual(a.meta().get_name(), b.meta().get_name())
+            self.assertEqual(len(a), len(b))
+
+    def test_expat(self):
+        content = synthetic_codeplug()
+        events = count_events(content)
+        timings = {}
+        for name, parse in (("sax", parse_codeplug_sax), ("expat", parse_codeplug_expat)):
+            best = None
+            for i in range(3):
+                start = time.perf_counter()
+                codeplug = parse(content)
+                duration = time.perf_counter() - start
+                best = duration if best is None else min(best, duration)
+            timings[name] = best
+            self.assertEqual(len(codeplug), 500)
+        log.info("Parser: %d events, SAX %.0f events/s, expat %.0f events/s",
+                 events, events/timings["sax"], events/timings["expat"])
+        # Expat is not slower than SAX, allowing for noise
+        self.assertLess(timings["expat"], 1.1*timings["sax"])
+
+
+def catalog_patterns(catalog) -> list:
+    """ All patterns of the distinct codeplugs of the catalog. """
+    patterns, codeplugs = [], {}
+    for model in catalog:
+        for firmware in model:
+            codeplugs[id(firmware.get_codeplug())] = firmware.get_codeplug()
+
+    def collect(pattern):
+        patterns.append(pattern)
+        if isinstance(pattern, (ElementPattern, UnionPattern)):
+            for child in pattern:
+                collect(child)
+        elif isinstance(pattern, (SparseRepeat, BlockRepeat, FixedRepeat)):
+            collect(pattern.get_child())
+    for codeplug in codeplugs.values():
+        for pattern in codeplug:
+            collect(pattern)
+    return patterns
+
+
+@benchmark
+class MemoryBenchmark(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def test_catalog_memory(self):
+        # Load once to exclude one-time allocations, like dispatch tables and imports
+        load_catalog(os.path.join(self._pwd, "catalog.xml"))
+        gc.collect()
+        tracemalloc.start()
+        try:
+            catalog = load_catalog(os.path.join(self._pwd, "catalog.xml"))
+            gc.collect()
+            size, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        patterns = catalog_patterns(catalog)
+        without_meta = sum(not pattern.has_meta() for pattern in patterns)
+        log.info("Catalog: %d bytes for %d patterns, %.0f bytes per pattern, %d patterns without meta information",
+                 size, len(patterns), size/len(patterns), without_meta)
+        self.assertLess(size/len(patterns), 2048)
+        # All nodes are slotted
+        for pattern in patterns:
+            self.assertFalse(hasattr(pattern, "__dict__"))
+            self.assertFalse(hasattr(pattern.get_address(), "__dict__"))
+            if pattern.has_meta():
+                self.assertFalse(hasattr(pattern.meta(), "__dict__"))
+
+
+@benchmark
+class DecoderBenchmark(unittest.TestCase):
+    def test_decode(self):
+        elements, fields = 500, 16
+        codeplug = parse_codeplug_expat(synthetic_codeplug(elements, fields))
+        image = bytes(range(256))*(elements*fields*2//256 + 1)
+        start = time.perf_counter()
+        decoder = Decoder(codeplug)
+        compiled = time.perf_counter() - start
+        best = None
+        for i in range(3):
+            start = time.perf_counter()
+            result = decoder.decode(image)
+            duration = time.perf_counter() - start
+            best = duration if best is None else min(best, duration)
+        log.info("Decoder: compiled in %.1f ms, decoded %d fields in %.1f ms", compiled*1e3, elements*fields, best*1e3)
+        self.assertLess(compiled, 0.5)
+        self.assertLess(best, 0.05)
+        self.assertEqual(len(result), elements)
+        self.assertEqual(result["Element 0"]["Field 1"], 0x0302)
+
+
+@benchmark
+class EncoderBenchmark(unittest.TestCase):
+    def test_encode(self):
+        elements, fields, images = 50, 16, 1000
+        codeplug = parse_codeplug_expat(synthetic_codeplug(elements, fields))
+        encoder = Encoder(codeplug)
+        values = {"Element {}".format(i): {"Field {}".format(j): (i + j) % 1000 for j in range(fields)}
+                  for i in range(elements)}
+        start = time.perf_counter()
+        for i in range(images):
+            image = encoder.encode(values)
+        duration = time.perf_counter() - start
+        log.info("Encoder: %d images of %d fields in %.2f s", images, elements*fields, duration)
+        self.assertLess(duration, 5.0)
+        self.assertEqual(Decoder(codeplug).decode(image), values)
+
+
+@benchmark
+class DifferenceBenchmark(unittest.TestCase):
+    def test_diff(self):
+        content = synthetic_codeplug()
+        orig, dest = parse_codeplug_expat(content), parse_codeplug_expat(content)
+        dest[250][3].meta().set_name("Renamed")
+        start = time.perf_counter()
+        orig.get_fingerprint(), dest.get_fingerprint()
+        hashed = time.perf_counter() - start
+        start = time.perf_counter()
+        generator = DifferenceGenerator()
+        generator.process(orig, dest)
+        duration = time.perf_counter() - start
+        log.info("Difference: fingerprints in %.1f ms, diff of a single change in %.1f ms", hashed*1e3, duration*1e3)
+        self.assertLess(hashed, 1.0)
+        self.assertLess(duration, 0.05)
+        self.assertEqual(len(generator.documents()[0]), 1)
+
+
+@benchmark
+class ImageDiffBenchmark(unittest.TestCase):
+    def test_image_diff(self):
+        codeplug = parse_codeplug_expat(synthetic_codeplug())
+        orig = bytes(range(256))*(4 << 12)
+        dest = bytearray(orig)
+        dest[0x100] ^= 1
+        dest[0x2000] ^= 1
+        dest[len(dest) - 1] ^= 1
+        image_diff = ImageDiff(codeplug)
+        start = time.perf_counter()
+        changes = list(image_diff.compare(orig, dest))
+        duration = time.perf_counter() - start
+        log.info("Image diff: %d MB images in %.1f ms", len(orig) >> 20, duration*1e3)
+        self.assertLess(duration, 0.05)
+        self.assertEqual(len(changes), 3)
+        self.assertFalse(changes[2].has_match())
+
+
+if __name__ == '__main__':
+    unittest.main()
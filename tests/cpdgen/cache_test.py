@@ -0,0 +1,70 @@
+import os.path
+import shutil
+import tempfile
+import unittest
+from cpdgen.codeplugcache import CodeplugCache
+from cpdgen.patternparser import load_codeplug
+from cpdgen.pattern import Codeplug
+
+
+class CodeplugCacheTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.mkdtemp()
+        self._cache = CodeplugCache(os.path.join(self._tmpdir, "cache"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self._tmpdir)
+
+    def entries(self):
+        return [name for name in os.listdir(self._cache.get_path()) if name.endswith(CodeplugCache.SUFFIX)]
+
+    def test_hit(self):
+        filepath = os.path.join(self._pwd, "basic_codeplug.xml")
+        cp = load_codeplug(filepath, self._cache)
+        self.assertEqual(len(self.entries()), 1)
+        with open(filepath, "rb") as file:
+            cached = self._cache.get(CodeplugCache.key(filepath, file.read()))
+        self.assertTrue(isinstance(cached, Codeplug))
+        self.assertEqual(cached.meta().get_name(), cp.meta().get_name())
+        self.assertEqual(len(cached), len(cp))
+
+    def test_modified(self):
+        filepath = os.path.join(self._tmpdir, "codeplug.xml")
+        shutil.copy(os.path.join(self._pwd, "basic_codeplug.xml"), filepath)
+        self.assertEqual(load_codeplug(filepath, self._cache).meta().get_version(), "1.0.1")
+        shutil.copy(os.path.join(self._pwd, "basic_codeplug_v2.xml"), filepath)
+        self.assertEqual(load_codeplug(filepath, self._cache).meta().get_version(), "1.1.0")
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_invalid(self):
+        self.assertIsNone(load_codeplug(os.path.join(self._pwd, "invalid_codeplug.xml"), self._cache))
+        self.assertEqual(len(self.entries()), 0)
+
+    def test_eviction(self):
+        cache = CodeplugCache(self._cache.get_path(), max_size=1)
+        load_codeplug(os.path.join(self._pwd, "basic_codeplug.xml"), cache)
+        load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"), cache)
+        self.assertEqual(len(self.entries()), 0)
+
+    def test_size(self):
+        load_codeplug(os.path.join(self._pwd, "basic_codeplug.xml"), self._cache)
+        load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"), self._cache)
+        sizes = [os.path.getsize(os.path.join(self._cache.get_path(), name)) for name in self.entries()]
+        self.assertEqual(self._cache.get_size(), sum(sizes))
+        # Exceeding the limit rescans the directory and evicts the least recently used entry
+        cache = CodeplugCache(self._cache.get_path(), max_size=max(sizes) + 1)
+        filepath = os.path.join(self._tmpdir, "codeplug.xml")
+        shutil.copy(os.path.join(self._pwd, "basic_codeplug.xml"), filepath)
+        load_codeplug(filepath, cache)
+        self.assertEqual(len(self.entries()), 1)
+        self.assertEqual(cache.get_size(), os.path.getsize(os.path.join(cache.get_path(), self.entries()[0])))
+        cache.clear()
+        self.assertEqual(cache.get_size(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
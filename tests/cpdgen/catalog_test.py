@@ -0,0 +1,99 @@
+import os.path
+import shutil
+import tempfile
+import unittest
+import xml.sax.handler
+from xml.sax import make_parser
+from cpdgen.catalogparser import CatalogHandler
+from cpdgen.pattern import Codeplug
+
+
+class CatalogParserTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def parseCatalog(self, path=None, **kwargs):
+        path = path if path is not None else os.path.join(self._pwd, "catalog.xml")
+        handler = CatalogHandler(os.path.dirname(path), **kwargs)
+        parser = make_parser()
+        parser.setContentHandler(handler)
+        parser.setFeature(xml.sax.handler.feature_namespaces, True)
+        with open(path, "rb") as file:
+            parser.parse(file)
+        return handler.pop()
+
+    def test_models(self):
+        catalog = self.parseCatalog()
+        self.assertEqual(len(catalog), 2)
+        self.assertEqual(catalog[0].get_id(), "example")
+        self.assertEqual(catalog[0].get_name(), "Example Radio")
+        self.assertEqual(catalog[1].get_id(), "other")
+        self.assertEqual(catalog[1].get_manufacturer(), "Other Inc.")
+
+    def test_firmwares(self):
+        catalog = self.parseCatalog()
+        # invalid codeplug is skipped
+        self.assertEqual([fw.get_name() for fw in catalog["example"]], ["1.0.1", "1.0.2", "1.1.0"])
+        for firmware in catalog["example"]:
+            self.assertTrue(isinstance(firmware.get_codeplug(), Codeplug))
+        self.assertEqual(catalog["example"]["1.1.0"].get_codeplug().meta().get_version(), "1.1.0")
+
+    def test_parallel(self):
+        catalog = self.parseCatalog(jobs=2)
+        self.assertEqual([fw.get_name() for fw in catalog["example"]], ["1.0.1", "1.0.2", "1.1.0"])
+        self.assertEqual([fw.get_name() for fw in catalog["other"]], ["2.0"])
+        self.assertEqual(catalog["example"]["1.0.1"].get_codeplug().meta().get_version(), "1.0.1")
+        self.assertEqual(catalog["example"]["1.1.0"].get_codeplug().meta().get_version(), "1.1.0")
+        self.assertEqual(len(catalog["other"]["2.0"].get_codeplug()), 2)
+
+    def test_lazy(self):
+        catalog = self.parseCatalog(lazy=True)
+        # invalid codeplug is kept until loaded
+        self.assertEqual([fw.get_name() for fw in catalog["example"]], ["0.9.0", "1.0.1", "1.0.2", "1.1.0"])
+        for firmware in catalog["example"]:
+            self.assertFalse(firmware.is_loaded())
+        firmware = catalog["example"]["1.1.0"]
+        self.assertEqual(firmware.get_codeplug().meta().get_version(), "1.1.0")
+        self.assertTrue(firmware.is_loaded())
+        self.assertFalse(catalog["example"]["1.0.1"].is_loaded())
+        self.assertFalse(catalog["example"]["0.9.0"].is_valid())
+        self.assertTrue(catalog["example"]["0.9.0"].is_loaded())
+
+    def test_shared_codeplugs(self):
+        for kwargs in ({}, {"jobs": 2}, {"lazy": True}):
+            catalog = self.parseCatalog(**kwargs)
+            example, other = catalog["example"], catalog["other"]
+            self.assertIs(example["1.0.1"].get_codeplug(), example["1.0.2"].get_codeplug())
+            self.assertIs(example["1.1.0"].get_codeplug(), other["2.0"].get_codeplug())
+            self.assertIsNot(example["1.0.1"].get_codeplug(), example["1.1.0"].get_codeplug())
+
+    def test_include(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            shutil.copy(os.path.join(self._pwd, "other_model.xml"), tmpdir)
+            shutil.copy(os.path.join(self._pwd, "basic_codeplug_v2.xml"), tmpdir)
+            with open(os.path.join(tmpdir, "cycle.xml"), "w") as file:
+                file.write('<catalog xmlns="https://static.dm3mat.de/schema/anytone-emu-catalog.dtd" '
+                           'xmlns:xi="http://www.w3.org/2001/XInclude">'
+                           '<xi:include href="other_model.xml"/><xi:include href="cycle.xml"/></catalog>')
+            with open(os.path.join(tmpdir, "catalog.xml"), "w") as file:
+                file.write('<catalog xmlns="https://static.dm3mat.de/schema/anytone-emu-catalog.dtd" '
+                           'xmlns:xi="http://www.w3.org/2001/XInclude">'
+                           '<xi:include href="cycle.xml"/><xi:include href="other_model.xml"/></catalog>')
+            with self.assertLogs(level="ERROR") as logs:
+                catalog = self.parseCatalog(os.path.join(tmpdir, "catalog.xml"))
+            self.assertEqual(len(logs.records), 1)
+            self.assertIn("Include cycle", logs.output[0])
+            # Model is included from the cycle and once more directly
+            self.assertEqual(len(catalog), 2)
+            for model in catalog:
+                self.assertEqual(model.get_id(), "other")
+                self.assertEqual(model.get_name(), "Other Radio")
+                self.assertEqual([fw.get_name() for fw in model], ["2.0"])
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os.path
+import unittest
+from cpdgen.patternparser import load_codeplug, parse_codeplug_expat
+from cpdgen.decoder import Decoder
+from fixtures import example_image, UNALIGNED_CODEPLUG
+
+
+class DecoderTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def setUp(self) -> None:
+        self._decoder = Decoder(load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml")))
+
+    def test_fields(self):
+        result = self._decoder.decode(example_image())
+        settings = result["Settings"]
+        self.assertEqual(settings["Radio ID"], 0x123456)
+        self.assertEqual(settings["Power"], "High")
+        self.assertEqual(settings["Beep"], 1)
+        self.assertEqual(settings["UnknownDataPattern at 3h:2"], 5)
+        self.assertEqual(settings["UnusedDataPattern at 4h"], b"\x00")
+
+    def test_repeats(self):
+        banks = self._decoder.decode(memoryview(bytes(example_image())))["Channel Banks"]
+        self.assertEqual(len(banks), 128)
+        self.assertEqual(len(banks[1]), 16)
+        channel = banks[1][2]
+        self.assertEqual(channel["Channel name"], "Test")
+        self.assertEqual(channel["RX Frequency"], 43812500)
+        self.assertEqual(channel["TX Frequency"], 44812500)
+        self.assertEqual(banks[0][0], {"Channel name": "", "RX Frequency": 0, "TX Frequency": 0})
+
+    def test_erased_bcd(self):
+        image = example_image()
+        image[0x1008:0x100c] = b"\xff\xff\xff\xff"
+        self.assertIsNone(self._decoder.decode(image)["Channel Banks"][0][0]["RX Frequency"])
+
+    def test_unbounded(self):
+        decoder = Decoder(load_codeplug(os.path.join(self._pwd, "unbounded_codeplug.xml")))
+        image = bytearray(0x260)
+        image[0x130] = 3
+        result = decoder.decode(image)
+        # Up to the next top-level element, or to the end of the image
+        self.assertEqual(len(result["Entries"]), 8)
+        self.assertEqual(result["Entries"][3]["Value"], 3)
+        self.assertEqual(len(result["Tail"]), 6)
+
+    def test_unaligned(self):
+        settings = Decoder(parse_codeplug_expat(UNALIGNED_CODEPLUG)).decode(bytes([0x01, 0x23, 0x45, 0x67, 0x89]))
+        # Byte order does not depend on the alignment
+        self.assertEqual(settings["Settings"]["Little"], 0x3412)
+        self.assertEqual(settings["Settings"]["Big"], 0x5678)
+
+    def test_truncated(self):
+        result = self._decoder.decode(example_image(0x1000 + 0x100 + 0x10))
+        self.assertEqual(len(result["Channel Banks"]), 1)
+        self.assertEqual(self._decoder.decode(example_image()[:4]), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os.path
+import unittest
+from cpdgen.patternparser import load_codeplug, parse_codeplug_expat
+from cpdgen.differencegenerator import DifferenceGenerator
+from cpdgen.document import Section
+from cpdgen.pattern import Address, SparseRepeat
+
+
+class CountingDifferenceGenerator(DifferenceGenerator):
+    """ Counts the patterns compared in detail. """
+
+    def __init__(self):
+        super().__init__()
+        self.compared = 0
+
+    def _compare_common(self, left, right):
+        self.compared += 1
+        return super()._compare_common(left, right)
+
+
+def count_sections(segment) -> int:
+    return sum(1 + count_sections(sub) for sub in segment if isinstance(sub, Section))
+
+
+def section_titles(segment) -> list[str]:
+    titles = []
+    for sub in segment:
+        if isinstance(sub, Section):
+            titles.append(str(sub.get_title()))
+            titles.extend(section_titles(sub))
+    return titles
+
+
+def settings_codeplug(*fields) -> bytes:
+    ints = "".join('<int width="{}h"><meta><name>{}</name></meta></int>'.format(width, name) for name, width in fields)
+    return '<?xml version="1.0" encoding="UTF-8"?><codeplug><meta><name>Test</name></meta><element at="0h">' \
+           '<meta><name>Settings</name></meta>{}</element></codeplug>'.format(ints).encode()
+
+
+class DifferenceTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def load(self):
+        return load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+
+    def test_identical(self):
+        generator = CountingDifferenceGenerator()
+        generator.process(self.load(), self.load())
+        self.assertEqual(generator.compared, 0)
+        self.assertEqual(count_sections(generator.documents()[0]), 0)
+
+    def test_pruned(self):
+        orig, dest = self.load(), self.load()
+        dest[1].get_child().get_child()[1].meta().set_name("RX")
+        generator = CountingDifferenceGenerator()
+        generator.process(orig, dest)
+        # Only the path down to the renamed field is compared, settings are skipped
+        self.assertEqual(generator.compared, 4)
+        self.assertEqual(count_sections(generator.documents()[0]), 4)
+
+    def test_move(self):
+        orig, dest = self.load(), self.load()
+        dest[0].set_address(Address(0x800))
+        generator = CountingDifferenceGenerator()
+        generator.process(orig, dest)
+        document = generator.documents()[0]
+        self.assertEqual(len(document), 1)
+        self.assertEqual(count_sections(document), 1)
+        self.assertEqual(generator.compared, 0)
+
+    def test_move_modified(self):
+        orig, dest = self.load(), self.load()
+        banks = dest[1]
+        moved = SparseRepeat(banks.get_offset(), Address(0x2000), None, banks.get_min(), 64)
+        moved.meta().set_name(banks.meta().get_name())
+        moved.meta().set_description(banks.meta().get_description())
+        moved.set_child(banks.get_child())
+        dest = type(dest)()
+        dest.add(self.load()[0])
+        dest.add(moved)
+        generator = CountingDifferenceGenerator()
+        generator.process(orig, dest)
+        document = generator.documents()[0]
+        # Reported as a single move, with the changed maximum compared within
+        self.assertEqual(len(document), 1)
+        self.assertEqual(generator.compared, 1)
+        self.assertEqual(count_sections(document), 2)
+
+    def test_inserted_field(self):
+        orig = parse_codeplug_expat(settings_codeplug(("A", 1), ("B", 1), ("C", 1), ("D", 1)))
+        dest = parse_codeplug_expat(settings_codeplug(("A", 1), ("X", 2), ("B", 1), ("C", 1), ("D", 1)))
+        generator = DifferenceGenerator()
+        generator.process(orig, dest)
+        # Shifted siblings are not reported as moves
+        titles = section_titles(generator.documents()[0])
+        self.assertFalse([title for title in titles if title.startswith("Move")])
+        self.assertIn("In element Settings", titles)
+
+
+if __name__ == '__main__':
+    unittest.main()
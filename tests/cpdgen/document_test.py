@@ -2,7 +2,10 @@ import unittest
 import os.path
 from cpdgen.patternparser import PatternHandler
 from cpdgen.documentgenerator import DocumentGenerator
-from xml.sax import parse
+from xml.sax import parse, make_parser
+import xml.sax.handler
+from cpdgen.catalogparser import CatalogHandler
+from cpdgen.document import Section
 
 
 
@@ -34,6 +37,21 @@ class DocumentTest(unittest.TestCase):
         # One section for "Description, Image, Name, RX, TX"
         self.assertEqual(len(ch), 5)
 
+    def test_shared_codeplugs(self):
+        handler = CatalogHandler(self._pwd)
+        parser = make_parser()
+        parser.setContentHandler(handler)
+        parser.setFeature(xml.sax.handler.feature_namespaces, True)
+        with open(os.path.join(self._pwd, "catalog.xml"), "rb") as file:
+            parser.parse(file)
+        generator = DocumentGenerator()
+        generator.processCatalog(handler.pop())
+        document = generator.document()
+        codeplugs = [sec for model in document if isinstance(model, Section)
+                     for sec in model if isinstance(sec, Section)]
+        # Four firmwares referencing two distinct codeplug files
+        self.assertEqual(len(codeplugs), 2)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,74 @@
+import os.path
+import unittest
+from cpdgen.patternparser import load_codeplug, parse_codeplug_expat
+from cpdgen.decoder import Decoder
+from cpdgen.encoder import Encoder
+from fixtures import example_image, UNALIGNED_CODEPLUG
+
+
+class EncoderTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def setUp(self) -> None:
+        self._cp = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        self._encoder = Encoder(self._cp)
+
+    def test_encode(self):
+        image = self._encoder.encode({
+            "Settings": {"Radio ID": 0x123456, "Power": "High", "Beep": 1, "UnknownDataPattern at 3h:2": 5},
+            "Channel Banks": {1: {2: {"Channel name": "Test", "RX Frequency": 43812500,
+                                      "TX Frequency": 44812500}}}})
+        self.assertEqual(len(image), 0x9000)
+        self.assertEqual(image, example_image())
+
+    def test_roundtrip(self):
+        decoder = Decoder(self._cp)
+        values = decoder.decode(example_image())
+        self.assertEqual(self._encoder.encode(values), example_image())
+        # Setting a bit-field preserves its neighbours
+        image = self._encoder.encode({"Settings": {"Power": 1}}, example_image())
+        self.assertEqual(image[3], 0x1d)
+        self.assertEqual(decoder.decode(image)["Settings"]["Power"], "Mid")
+
+    def test_roundtrip_erased(self):
+        image = example_image()
+        # Erased channel, non-ASCII name, enum value without item
+        image[0x1000:0x1010] = b"\xff"*16
+        image[0x1010:0x1014] = b"T\xe9st"
+        image[3] = (image[3] & 0x0f) | 0xf0
+        values = Decoder(self._cp).decode(image)
+        self.assertIsNone(values["Channel Banks"][0][0]["RX Frequency"])
+        self.assertEqual(values["Settings"]["Power"], 15)
+        self.assertEqual(self._encoder.encode(values), image)
+
+    def test_unaligned(self):
+        encoder = Encoder(parse_codeplug_expat(UNALIGNED_CODEPLUG))
+        image = encoder.encode({"Settings": {"Little": 0x3412, "Big": 0x5678}})
+        self.assertEqual(image, bytes([0x01, 0x23, 0x45, 0x67, 0x80]))
+
+    def test_validation(self):
+        image = self._encoder.create()
+        with self.assertRaises(ValueError):
+            self._encoder.encode({"Settings": {"Radio ID": 0}}, image)
+        with self.assertRaises(ValueError):
+            self._encoder.encode({"Settings": {"Power": "Max"}}, image)
+        with self.assertRaises(ValueError):
+            self._encoder.encode({"Channel Banks": {0: {0: {"Channel name": "Too long name"}}}}, image)
+        with self.assertRaises(IndexError):
+            self._encoder.encode({"Channel Banks": {0: {16: {"RX Frequency": 0}}}}, image)
+        with self.assertRaises(KeyError):
+            self._encoder.encode({"Settings": {"Volume": 1}}, image)
+        # Nothing is written, if any value is invalid
+        with self.assertRaises(ValueError):
+            self._encoder.encode({"Settings": {"Beep": 1, "Power": 16}}, image)
+        short = bytearray(0x10)
+        with self.assertRaises(IndexError):
+            self._encoder.encode({"Settings": {"Beep": 1}, "Channel Banks": {0: {0: {"RX Frequency": 0}}}}, short)
+        self.assertEqual(short, bytearray(0x10))
+        self.assertEqual(image, self._encoder.create())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import io
+import json
+import os.path
+import tempfile
+import unittest
+from cpdgen.patternparser import load_codeplug
+from cpdgen.exporter import record_tables, export_records, write_jsonl, write_csv
+from fixtures import example_image
+
+
+class ExporterTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def setUp(self) -> None:
+        self._cp = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        self._dir = tempfile.TemporaryDirectory()
+        self._images = []
+        for i in range(3):
+            filename = os.path.join(self._dir.name, "image{}.bin".format(i))
+            with open(filename, "wb") as file:
+                file.write(example_image())
+            self._images.append(filename)
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def test_tables(self):
+        tables = record_tables(self._cp)
+        self.assertEqual([table.get_path() for table in tables],
+                         ["Settings", "Channel Banks.Channel Bank.Channel Element"])
+        self.assertEqual(tables[1].columns(), ["Channel name", "RX Frequency", "TX Frequency"])
+        self.assertEqual(record_tables(self._cp, True)[0].columns()[0], "ID")
+
+    def test_jsonl(self):
+        buffer = io.StringIO()
+        write_jsonl(export_records(record_tables(self._cp), self._images), buffer)
+        rows = [json.loads(line) for line in buffer.getvalue().splitlines()]
+        # Settings and the single non-empty channel of each image
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1]["record"], "Channel Banks.Channel Bank.Channel Element")
+        self.assertEqual(rows[1]["index"], [1, 2])
+        self.assertEqual(rows[1]["RX Frequency"], 43812500)
+        self.assertEqual(rows[0]["Power"], "High")
+
+    def test_csv(self):
+        table = record_tables(self._cp)[1]
+        buffer = io.StringIO()
+        write_csv(export_records([table], self._images[:1], skip_empty=False), table, buffer)
+        lines = buffer.getvalue().splitlines()
+        self.assertEqual(lines[0], "image,index,Channel name,RX Frequency,TX Frequency")
+        self.assertEqual(len(lines), 1 + 128*16)
+        self.assertIn("{},1.2,Test,43812500,44812500".format(self._images[0]), lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,20 @@
+def example_image(size: int = 0x9000) -> bytearray:
+    """ Image of the basic_codeplug_v2.xml layout with settings and a single channel set. """
+    image = bytearray(size)
+    image[0:5] = bytes([0x12, 0x34, 0x56, 0x2d, 0x00])
+    channel = 0x1000 + 1*0x100 + 2*0x10
+    image[channel:channel+16] = b"Test\0\0\0\0" + bytes([0x00, 0x25, 0x81, 0x43, 0x00, 0x25, 0x81, 0x44])
+    return image
+
+
+UNALIGNED_CODEPLUG = b"""<?xml version="1.0" encoding="UTF-8"?>
+<codeplug>
+  <element at="0h">
+    <meta><name>Settings</name></meta>
+    <unknown width="0:4"/>
+    <int width="2h" format="unsigned" endian="little"><meta><name>Little</name></meta></int>
+    <int width="2h" format="unsigned" endian="big"><meta><name>Big</name></meta></int>
+    <unknown width="0:4"/>
+  </element>
+</codeplug>
+"""
@@ -0,0 +1,66 @@
+import io
+import os.path
+import unittest
+from cpdgen.patternparser import load_codeplug
+from cpdgen.hexdump import HexDump, Span
+from fixtures import example_image
+
+
+class HexDumpTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def setUp(self) -> None:
+        self._dump = HexDump(load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml")))
+        self._image = example_image()
+        self._image[0x1000:0x1120] = b"\xff"*0x120
+
+    def test_lines(self):
+        lines = list(self._dump.lines(self._image))
+        self.assertEqual(lines[0].labels[:3], ["Settings.Radio ID", "Settings.Power", "Settings.Beep"])
+        self.assertEqual([(count, span.kind) for count, span in lines[0].runs],
+                         [(3, Span.FIELD), (1, Span.FIELD), (1, Span.UNUSED), (11, Span.UNMAPPED)])
+        # Unmapped zeros up to the channel banks are collapsed
+        self.assertEqual((lines[2].address, lines[2].skipped), (0x20, 254))
+        self.assertEqual(lines[2].span.kind, Span.UNMAPPED)
+        # Empty channels are merged and collapsed
+        self.assertEqual(lines[3].address, 0x1000)
+        self.assertEqual(lines[3].labels, ["Channel Banks[0] (empty) and 2 more"])
+        self.assertEqual((lines[5].address, lines[5].skipped), (0x1020, 16))
+        self.assertEqual(lines[6].address, 0x1120)
+        self.assertEqual(len(lines[6].labels), 3)
+        # Each line shows all bytes, unless skipped
+        self.assertEqual(sum(len(line.data) + 16*line.skipped for line in lines), len(self._image))
+
+    def test_unmapped_runs(self):
+        # A stray byte splits the unmapped zeros, the lines before and after it still collapse
+        self._image[0x800] = 0x42
+        lines = list(self._dump.lines(self._image))
+        self.assertEqual((lines[2].address, lines[2].skipped), (0x20, 126))
+        self.assertEqual(lines[3].address, 0x800)
+        self.assertEqual(lines[3].data[:1], b"\x42")
+        self.assertEqual((lines[5].address, lines[5].skipped), (0x820, 126))
+        self.assertEqual(lines[5].span.kind, Span.UNMAPPED)
+        self.assertEqual(sum(len(line.data) + 16*line.skipped for line in lines), len(self._image))
+
+    def test_text(self):
+        buffer = io.StringIO()
+        self._dump.write_text(self._image, buffer)
+        lines = buffer.getvalue().splitlines()
+        self.assertTrue(lines[6].startswith("00001120  54 65 73 74 00 00 00 00 00 25 81 43 00 25 81 44  "
+                                            "Test.....%.C.%.D  Channel Banks[1].Channel Bank[2]"))
+        self.assertEqual(lines[2], "*         254 lines of (unmapped)")
+
+    def test_html(self):
+        buffer = io.StringIO()
+        self._dump.write_html(self._image, buffer, title="Example")
+        content = buffer.getvalue()
+        self.assertIn("<title>Example</title>", content)
+        self.assertIn('<span class="f1" title="Channel Banks[1].Channel Bank[2].Channel Element.RX Frequency">'
+                      '00 25 81 43</span>', content)
+        self.assertTrue(content.endswith("</html>\n"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import io
+import os.path
+import unittest
+from datetime import date
+from cpdgen.catalog import Model, Firmware
+from cpdgen.patternparser import load_codeplug
+from cpdgen.historygenerator import HistoryGenerator
+
+
+class HistoryTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def setUp(self) -> None:
+        v1 = load_codeplug(os.path.join(self._pwd, "basic_codeplug.xml"))
+        v2 = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        self._model = Model("example", "Example Radio")
+        self._model.add(Firmware("1.2.0", date(2026, 5, 1), v1))
+        self._model.add(Firmware("1.0.1", date(2025, 1, 19), v1))
+        self._model.add(Firmware("1.0.2", date(2025, 6, 1), v1))
+        self._model.add(Firmware("1.1.0", date(2026, 1, 31), v2))
+
+    def test_timeline(self):
+        generator = HistoryGenerator()
+        generator.process(self._model)
+        self.assertEqual(generator.versions(), ["1.0.1", "1.0.2", "1.1.0", "1.2.0"])
+        fields = {field.get_path(): field for field in generator.fields()}
+        name = fields["Channel Banks.Channel Bank.Channel Element.Channel name"]
+        self.assertEqual(name.introduced(), ["1.0.1"])
+        self.assertEqual(name.changed(), [])
+        rx = fields["Channel Banks.Channel Bank.Channel Element.RX Frequency"]
+        self.assertEqual(rx.changed(), ["1.1.0", "1.2.0"])
+        power = fields["Settings.Power"]
+        self.assertEqual(power.introduced(), ["1.1.0"])
+        self.assertEqual(power.removed(), ["1.2.0"])
+
+    def test_outputs(self):
+        generator = HistoryGenerator()
+        generator.process(self._model)
+        document, = generator.documents()
+        self.assertEqual(document.get_id(), "example_history")
+        table = document[0][1]
+        self.assertEqual(len(table), len(generator.fields()))
+        buffer = io.StringIO()
+        generator.write_table(buffer)
+        lines = buffer.getvalue().splitlines()
+        self.assertEqual(lines[0], "field,introduced,changed,removed")
+        self.assertIn("Settings.Power,1.1.0,,1.2.0", lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os.path
+import unittest
+from cpdgen.patternparser import load_codeplug
+from cpdgen.imagediff import changed_ranges, ImageDiff
+from fixtures import example_image
+
+
+class ImageDiffTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def test_ranges(self):
+        orig = bytes(64)
+        dest = bytearray(orig)
+        dest[3] = dest[14] = dest[15] = dest[16] = dest[40] = 1
+        self.assertEqual(list(changed_ranges(orig, dest, chunk=16)), [(3, 4), (14, 17), (40, 41)])
+        self.assertEqual(list(changed_ranges(orig, dest + b"\1", chunk=16)), [(3, 4), (14, 17), (40, 41), (64, 65)])
+        dest[63] = 1
+        self.assertEqual(list(changed_ranges(orig, dest + b"\1", chunk=16))[-1], (63, 65))
+        self.assertEqual(list(changed_ranges(orig, orig)), [])
+
+    def test_fields(self):
+        image_diff = ImageDiff(load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml")))
+        orig = example_image()
+        dest = bytearray(orig)
+        # Toggle beep only, power shares the byte but is unchanged
+        dest[3] ^= 0x08
+        dest[0x10] = 0xff
+        dest[0x1120:0x1124] = b"Rest"
+        dest[0x1128] = 0x50
+        changes = list(image_diff.compare(orig, dest))
+        self.assertEqual([str(change) for change in changes], [
+            "3h:3 Settings.Beep: 1 -> 0",
+            "10h (unmapped): b'\\x00' -> b'\\xff'",
+            "1120h Channel Banks[1].Channel Bank[2].Channel Element.Channel name: 'Test' -> 'Rest'",
+            "1128h Channel Banks[1].Channel Bank[2].Channel Element.RX Frequency: 43812500 -> 43812550"])
+        self.assertFalse(changes[1].has_match())
+        self.assertEqual(changes[2].get_match().get_indices(), (1, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
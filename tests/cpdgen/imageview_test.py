@@ -0,0 +1,63 @@
+import os.path
+import tempfile
+import unittest
+from cpdgen.patternparser import load_codeplug
+from cpdgen.decoder import Decoder
+from cpdgen.imageview import CodeplugImage
+from fixtures import example_image
+
+
+class CodeplugImageTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def setUp(self) -> None:
+        self._cp = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        self._dir = tempfile.TemporaryDirectory()
+        self._filename = os.path.join(self._dir.name, "image.bin")
+        with open(self._filename, "wb") as file:
+            file.write(example_image())
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def test_access(self):
+        with CodeplugImage.open(self._cp, self._filename) as image:
+            self.assertEqual(list(image), ["Settings", "Channel Banks"])
+            self.assertEqual(image["Settings"]["Power"], "High")
+            banks = image["Channel Banks"]
+            self.assertEqual(len(banks), 128)
+            self.assertEqual(len(banks[-1]), 16)
+            channel = banks[1][2]
+            self.assertEqual(channel["Channel name"], "Test")
+            self.assertEqual(channel["RX Frequency"], 43812500)
+            self.assertEqual(len(banks[1][1:4]), 3)
+            with self.assertRaises(IndexError):
+                banks[128]
+
+    def test_zero_copy(self):
+        with CodeplugImage.open(self._cp, self._filename) as image:
+            name = image["Channel Banks"][1][2].raw("Channel name")
+            self.assertIsInstance(name, memoryview)
+            self.assertEqual(name.tobytes(), b"Test\0\0\0\0")
+            name.release()
+            unused = image["Settings"]["UnusedDataPattern at 4h"]
+            self.assertIsInstance(unused, memoryview)
+            self.assertEqual(unused.tobytes(), b"\x00")
+            unused.release()
+
+    def test_decode(self):
+        data = example_image()
+        image = CodeplugImage(self._cp, data)
+        self.assertEqual(image["Channel Banks"].decode(), Decoder(self._cp).decode(data)["Channel Banks"])
+        self.assertEqual(dict(image["Channel Banks"][1][2]), image["Channel Banks"][1][2].decode())
+
+    def test_truncated(self):
+        image = CodeplugImage(self._cp, example_image()[:0x1100])
+        self.assertEqual(len(image["Channel Banks"]), 1)
+        self.assertEqual(len(CodeplugImage(self._cp, b"")), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
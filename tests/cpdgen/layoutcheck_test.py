@@ -0,0 +1,52 @@
+import os.path
+import unittest
+from cpdgen.patternparser import load_codeplug
+from cpdgen.layoutcheck import check_layout, LayoutIssue
+from cpdgen.pattern import Address, Size, Codeplug, UnknownDataPattern, IntegerPattern
+
+
+class LayoutCheckTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def test_valid_layout(self):
+        report = check_layout(load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml")))
+        self.assertFalse(report.has_overlaps())
+        gap, = report.gaps()
+        self.assertEqual(gap.get_address(), Address(5))
+        self.assertEqual(gap.get_size(), Size(0x1000-5))
+        self.assertEqual([(documented, total) for _, documented, total in report.coverage()],
+                         [(37, 40), (128*16*16*8, 128*16*16*8)])
+
+    def test_overlapping_repetitions(self):
+        # Channel elements exceed the step of the sparse repeat
+        report = check_layout(load_codeplug(os.path.join(self._pwd, "layout_codeplug.xml")))
+        self.assertEqual(len(report.overlaps()), 3)
+        self.assertEqual(report.overlaps()[0].get_address(), Address(0x110))
+        self.assertEqual(report.overlaps()[0].get_size(), Size(0x04))
+
+    def test_unions(self):
+        codeplug = load_codeplug(os.path.join(self._pwd, "layout_codeplug.xml"))
+        short, hole = [issue for issue in check_layout(codeplug) if issue.get_context() is codeplug[1]]
+        self.assertEqual(short.get_kind(), LayoutIssue.SHORT_MEMBER)
+        self.assertIs(short.get_first(), codeplug[1][1])
+        self.assertEqual((short.get_address(), short.get_size()), (Address(0x02), Size(0x06)))
+        # Covered by the short member only partially
+        self.assertEqual(hole.get_kind(), LayoutIssue.HOLE)
+        self.assertEqual((hole.get_address(), hole.get_size()), (Address(0x04), Size(0x02)))
+
+    def test_overlapping_elements(self):
+        codeplug = Codeplug()
+        codeplug.add(UnknownDataPattern(Size(0x10), Address(0x00)))
+        codeplug.add(IntegerPattern(Size(2), IntegerPattern.UNSIGNED, IntegerPattern.LITTLE, address=Address(0x0f)))
+        codeplug.add(UnknownDataPattern(Size(0x10), Address(0x20)))
+        overlap, gap = check_layout(codeplug)
+        self.assertEqual(overlap.get_kind(), LayoutIssue.OVERLAP)
+        self.assertEqual((overlap.get_address(), overlap.get_size()), (Address(0x0f), Size(1)))
+        self.assertEqual(gap.get_kind(), LayoutIssue.GAP)
+        self.assertEqual((gap.get_address(), gap.get_size()), (Address(0x11), Size(0x0f)))
+
+
+if __name__ == '__main__':
+    unittest.main()
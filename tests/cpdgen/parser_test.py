@@ -1,7 +1,7 @@
 import os.path
 import unittest
-from cpdgen.patternparser import PatternHandler
-from cpdgen.pattern import SparseRepeat, BlockRepeat, ElementPattern, StringPattern, IntegerPattern, Size
+from cpdgen.patternparser import PatternHandler, load_codeplug
+from cpdgen.pattern import SparseRepeat, BlockRepeat, ElementPattern, StringPattern, IntegerPattern, Size, EnumPattern
 from xml.sax import parse
 
 
@@ -44,6 +44,30 @@ class PatternParserTest(unittest.TestCase):
         self.assertTrue(isinstance(channel[2], IntegerPattern))
         self.assertEqual(channel.get_size(), Size(16))
 
+    def assertSamePattern(self, a, b):
+        self.assertEqual(type(a), type(b))
+        self.assertEqual(a.meta().get_name(), b.meta().get_name())
+        self.assertEqual(a.meta().get_description(), b.meta().get_description())
+        if hasattr(a, "get_size"):
+            self.assertEqual(a.get_size().bits(), b.get_size().bits())
+        if hasattr(a, "get_child"):
+            self.assertSamePattern(a.get_child(), b.get_child())
+        elif isinstance(a, EnumPattern):
+            self.assertEqual([(i.value, i.get_name()) for i in a], [(i.value, i.get_name()) for i in b])
+        elif hasattr(a, "__iter__"):
+            self.assertEqual(len(a), len(b))
+            for x, y in zip(a, b):
+                self.assertSamePattern(x, y)
+
+    def test_expat(self):
+        for filename in ("basic_codeplug.xml", "basic_codeplug_v2.xml"):
+            sax = load_codeplug(os.path.join(self._pwd, filename), parser="sax")
+            expat = load_codeplug(os.path.join(self._pwd, filename), parser="expat")
+            self.assertEqual(sax.meta().get_version(), expat.meta().get_version())
+            self.assertEqual(sax.meta().get_flag(), expat.meta().get_flag())
+            self.assertSamePattern(sax, expat)
+        self.assertIsNone(load_codeplug(os.path.join(self._pwd, "invalid_codeplug.xml"), parser="expat"))
+
 
 if __name__ == '__main__':
     unittest.main()
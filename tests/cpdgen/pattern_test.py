@@ -0,0 +1,112 @@
+import os.path
+import pickle
+import unittest
+from cpdgen.patternparser import load_codeplug
+from cpdgen.pattern import Address, Size, ElementPattern, IntegerPattern, UnknownDataPattern, Codeplug
+
+
+class AddressSizeTest(unittest.TestCase):
+    def test_address(self):
+        self.assertEqual(Address(1, 3).bits(), 12)
+        self.assertEqual(str(Address(1, 3)), "1h:3")
+        self.assertEqual(Address.parse("10h:0"), Address(0x10, 0))
+        self.assertEqual(Address(2) + Size(1, 4), Address.from_bits(28))
+        self.assertEqual(Address(3) - Address(1), Size(2))
+        self.assertTrue(Address(1) < Address(1, 6) <= Address(2))
+        self.assertNotEqual(Address(1), Size(1))
+
+    def test_size(self):
+        self.assertEqual(Size(2)*3, Size(6))
+        self.assertEqual(3*Size(2), Size(6))
+        self.assertEqual(Size(1) + Size(0, 4), Size.from_bits(12))
+        self.assertTrue(Size(1) < Size(1, 1))
+        self.assertEqual(str(Size(1, 4)), "1h:4")
+
+    def test_value_semantics(self):
+        self.assertIs(Address(0), Address.from_bits(0))
+        self.assertIs(Size(0), Size())
+        self.assertEqual({Address(0x1000): "a"}[Address(0x1000)], "a")
+        self.assertEqual(len({Size(1), Size(0, 8)}), 1)
+        with self.assertRaises(AttributeError):
+            Address(0)._bits = 1
+        self.assertIs(pickle.loads(pickle.dumps(Size(4))), Size(4))
+        self.assertEqual(pickle.loads(pickle.dumps(Address(0x12345))), Address(0x12345))
+
+    def test_element_layout(self):
+        element = ElementPattern()
+        element.add(IntegerPattern(Size(0, 4), IntegerPattern.UNSIGNED, IntegerPattern.LITTLE))
+        element.add(IntegerPattern(Size(0, 4), IntegerPattern.UNSIGNED, IntegerPattern.LITTLE))
+        element.add(IntegerPattern(Size(2), IntegerPattern.UNSIGNED, IntegerPattern.LITTLE))
+        self.assertEqual([child.get_address() for child in element], [Address(0), Address(0, 3), Address(1)])
+        self.assertEqual(element.get_size(), Size(3))
+        element.update()
+        self.assertEqual([child.get_address() for child in element], [Address(0), Address(0, 3), Address(1)])
+        self.assertEqual(element.get_size(), Size(3))
+
+
+class CodeplugTest(unittest.TestCase):
+    def test_sorted_add(self):
+        for deferred in (False, True):
+            codeplug = Codeplug()
+            if deferred:
+                codeplug.defer_sort()
+            for address in (0x300, 0x100, 0x200, 0x000, 0x100):
+                codeplug.add(UnknownDataPattern(Size(1), Address(address)))
+            self.assertEqual([el.get_address().bits()//8 for el in codeplug], [0x000, 0x100, 0x100, 0x200, 0x300])
+            codeplug.add(UnknownDataPattern(Size(1), Address(0x150)))
+            self.assertEqual(codeplug[3].get_address(), Address(0x150))
+
+
+class FingerprintTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def test_equal_structure(self):
+        a = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        b = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        self.assertEqual(a.get_fingerprint(), b.get_fingerprint())
+        self.assertEqual(a[1].get_fingerprint(), b[1].get_fingerprint())
+        self.assertNotEqual(a[0].get_fingerprint(), a[1].get_fingerprint())
+        other = load_codeplug(os.path.join(self._pwd, "basic_codeplug.xml"))
+        self.assertNotEqual(a.get_fingerprint(), other.get_fingerprint())
+        restored = pickle.loads(pickle.dumps(a))
+        self.assertEqual(restored.get_fingerprint(), a.get_fingerprint())
+
+    def test_relocation(self):
+        a, b = ElementPattern(Address(0x10)), ElementPattern(Address(0x20))
+        for element in (a, b):
+            element.add(IntegerPattern(Size(2), IntegerPattern.UNSIGNED, IntegerPattern.LITTLE))
+        self.assertEqual(a.get_fingerprint(), b.get_fingerprint())
+        codeplug = Codeplug()
+        codeplug.add(a)
+        before = codeplug.get_fingerprint()
+        a.set_address(Address(0x30))
+        self.assertNotEqual(codeplug.get_fingerprint(), before)
+
+    def test_lazy_meta(self):
+        a, b = ElementPattern(Address(0x10)), ElementPattern(Address(0x10))
+        for element in (a, b):
+            element.add(IntegerPattern(Size(2), IntegerPattern.UNSIGNED, IntegerPattern.LITTLE))
+        # Reading the meta information allocates it, without changing the fingerprint
+        a[0].meta().get_name()
+        self.assertTrue(a[0].has_meta())
+        self.assertFalse(b[0].has_meta())
+        self.assertEqual(a.get_fingerprint(), b.get_fingerprint())
+        self.assertEqual(a[0].get_fingerprint(), b[0].get_fingerprint())
+
+    def test_invalidation(self):
+        codeplug = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        before, bank = codeplug.get_fingerprint(), codeplug[1].get_fingerprint()
+        settings = codeplug[0].get_fingerprint()
+        field = codeplug[1].get_child().get_child()[1]
+        field.meta().set_name("RX")
+        self.assertNotEqual(codeplug.get_fingerprint(), before)
+        self.assertNotEqual(codeplug[1].get_fingerprint(), bank)
+        self.assertEqual(codeplug[0].get_fingerprint(), settings)
+        field.meta().set_name("RX Frequency")
+        self.assertEqual(codeplug.get_fingerprint(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
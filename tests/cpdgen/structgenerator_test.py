@@ -0,0 +1,81 @@
+import ctypes
+import os.path
+import unittest
+from cpdgen.patternparser import load_codeplug, parse_codeplug_expat
+from cpdgen.decoder import Decoder
+from cpdgen.structgenerator import StructGenerator, compile_struct, identifier
+from fixtures import example_image
+
+
+LITTLE_CODEPLUG = b"""<?xml version="1.0" encoding="UTF-8"?>
+<codeplug>
+  <repeat at="10h" n="4">
+    <meta><name>Zones</name></meta>
+    <element>
+      <meta><name>Zone</name></meta>
+      <string format="ascii" width="6"><meta><name>Name</name></meta></string>
+      <int width="2h" format="signed" endian="little"><meta><name>Offset</name></meta></int>
+      <int width="0:5" format="signed" endian="little"><meta><name>Delta</name></meta></int>
+      <int width="0:3" format="unsigned" endian="little"><meta><name>Flags</name></meta></int>
+      <int width="4h" format="unsigned" endian="big"><meta><name>Big</name></meta></int>
+      <unused width="1h">00</unused>
+    </element>
+  </repeat>
+</codeplug>
+"""
+
+
+class StructGeneratorTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def test_identifier(self):
+        self.assertEqual(identifier("Radio ID"), "radio_id")
+        self.assertEqual(identifier("2nd Name (2)"), "_2nd_name_2")
+
+    def test_big_endian(self):
+        codeplug = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        generator = StructGenerator(codeplug)
+        settings = generator.types()["Settings"]
+        self.assertTrue(issubclass(settings, ctypes.BigEndianStructure))
+        self.assertEqual(ctypes.sizeof(settings), 5)
+        image = example_image()
+        overlay = generator.overlay(image)
+        self.assertEqual(bytes(overlay["Settings"].radio_id), b"\x12\x34\x56")
+        self.assertEqual((overlay["Settings"].power, overlay["Settings"].beep), (2, 1))
+        channel = overlay["Channel Banks"][1][2]
+        self.assertEqual(channel.channel_name, b"Test")
+        # BCD numbers are bytes
+        self.assertEqual(bytes(channel.rx_frequency), b"\x00\x25\x81\x43")
+        # Fields are written into the image, without copying
+        overlay["Settings"].power = 1
+        overlay["Settings"].beep = 0
+        self.assertEqual(image[3], 0x15)
+        self.assertEqual(list(generator.overlay(bytearray(0x10)).keys()), ["Settings"])
+
+    def test_little_endian(self):
+        codeplug = parse_codeplug_expat(LITTLE_CODEPLUG)
+        zone = compile_struct(codeplug[0].get_child(), key="Zone")
+        self.assertTrue(issubclass(zone, ctypes.LittleEndianStructure))
+        self.assertEqual(ctypes.sizeof(zone), 14)
+        self.assertEqual(zone.big.size, 4)
+        image = bytearray(0x10 + 4*14)
+        for i in range(4):
+            offset = 0x10 + 14*i
+            image[offset:offset + 14] = b"Zone" + bytes([0x30 + i, 0]) + (-300*i).to_bytes(2, "little", signed=True) \
+                + bytes([0xf3 - i, 1, 2, 3, 4, 0])
+        zones = StructGenerator(codeplug).overlay(image)["Zones"]
+        decoded = Decoder(codeplug).decode(image)["Zones"]
+        self.assertEqual(len(zones), 4)
+        for i in range(4):
+            self.assertEqual(zones[i].name.decode(), decoded[i]["Name"])
+            self.assertEqual(zones[i].offset, decoded[i]["Offset"])
+            self.assertEqual(zones[i].delta, decoded[i]["Delta"])
+            self.assertEqual(zones[i].flags, decoded[i]["Flags"])
+            # Integers of the other byte order are bytes
+            self.assertEqual(bytes(zones[i].big), b"\x01\x02\x03\x04")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os.path
+import tempfile
+import unittest
+from cpdgen.patternparser import load_codeplug
+from cpdgen.validator import Validator, image_files, validate_files
+from fixtures import example_image
+
+
+class ValidatorTest(unittest.TestCase):
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+        self._pwd = os.path.join(os.path.abspath(os.path.dirname(__name__)), "data")
+
+    def setUp(self) -> None:
+        self._cp = load_codeplug(os.path.join(self._pwd, "basic_codeplug_v2.xml"))
+        self._validator = Validator(self._cp)
+
+    def test_valid(self):
+        self.assertEqual(self._validator.validate(example_image()), [])
+        # Erased channels are skipped
+        image = example_image()
+        image[0x1000:0x9000] = b"\xff"*0x8000
+        self.assertEqual(self._validator.validate(image), [])
+        self.assertNotEqual(Validator(self._cp, skip_empty=False).validate(image), [])
+
+    def test_violations(self):
+        image = example_image()
+        image[0:3] = bytes(3)
+        image[3] = 0xf0
+        image[0x1120:0x1128] = b"Te\0st\0\0\0"
+        image[0x112c] = 0xaa
+        violations = self._validator.validate(image)
+        self.assertEqual([str(violation) for violation in violations], [
+            "0h Settings.Radio ID: value 0 out of range [1, 16776415]",
+            "3h Settings.Power: value 15 is not an enum item",
+            "1120h Channel Banks[1].Channel Bank[2].Channel Element.Channel name: characters after fill",
+            "112ch Channel Banks[1].Channel Bank[2].Channel Element.TX Frequency: invalid BCD digits"])
+
+    def test_files(self):
+        with tempfile.TemporaryDirectory() as path:
+            for i in range(4):
+                image = example_image()
+                image[3] = 0xf0 if i % 2 else 0x2d
+                with open(os.path.join(path, "image{}.bin".format(i)), "wb") as file:
+                    file.write(image)
+            filenames = image_files([path])
+            self.assertEqual(len(filenames), 4)
+            results = list(validate_files(self._cp, filenames, jobs=2))
+            self.assertEqual([filename for filename, _ in results], filenames)
+            self.assertEqual([len(violations) for _, violations in results], [0, 1, 0, 1])
+            self.assertEqual(results[1][1][0].get_path(), "Settings.Power")
+
+
+if __name__ == '__main__':
+    unittest.main()